@@ -3,7 +3,10 @@ AI Animation Studio - Gemini动画生成器
 基于Google Gemini API的动画代码生成器
 """
 
-from typing import List
+import time
+import threading
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from typing import Iterator, List, Optional
 
 from core.logger import get_logger
 from core.data_structures import AnimationSolution, TechStack
@@ -32,6 +35,9 @@ except ImportError:
             def generate_content(self, model=None, contents=None, config=None):
                 return MockResponse()
 
+            def generate_content_stream(self, model=None, contents=None, config=None):
+                yield MockResponse()
+
     class MockTypes:
         class GenerateContentConfig:
             def __init__(self, **kwargs):
@@ -70,49 +76,89 @@ except ImportError:
         def emit(self, *args):
             pass
 
+def iter_response_text(client, model: str, contents: str, config) -> Iterator[str]:
+    """流式调用 generate_content_stream，逐段返回文本；客户端不支持流式时一次性返回"""
+    stream_method = getattr(client.models, "generate_content_stream", None)
+    if stream_method is None:
+        response = client.models.generate_content(model=model, contents=contents, config=config)
+        if response and response.text:
+            yield response.text
+        return
+
+    for chunk in stream_method(model=model, contents=contents, config=config):
+        text = getattr(chunk, "text", None)
+        if text:
+            yield text
+
+
+# 一轮生成的方案 (名称, 类型)，第一个为推荐方案
+SOLUTION_VARIANTS = [
+    ("标准方案", "standard"),
+    ("增强方案", "enhanced"),
+    ("写实方案", "realistic")
+]
+
+
 class GeminiGenerator(QThread):
     """Gemini HTML动画生成器"""
     
     result_ready = pyqtSignal(list)  # 生成的动画方案列表
+    solution_ready = pyqtSignal(object)  # 单个方案生成完成（AnimationSolution）
     error_occurred = pyqtSignal(str)  # 错误信息
     progress_update = pyqtSignal(str)  # 进度更新
     
-    def __init__(self, api_key: str = None, prompt: str = "", animation_type: str = "fade", model: str = "gemini-2.0-flash-exp", enable_thinking: bool = False):
+    def __init__(self, api_key: str = None, prompt: str = "", animation_type: str = "fade", model: str = "gemini-2.0-flash-exp", enable_thinking: bool = False,
+                 concurrent: bool = True, max_concurrency: int = 3, request_timeout: float = 120.0, client=None):
         super().__init__()
         self.api_key = api_key
         self.prompt = prompt
         self.animation_type = animation_type
         self.model = model
         self.enable_thinking = enable_thinking
+
+        # 并发生成设置
+        self.concurrent = concurrent
+        self.max_concurrency = max(1, max_concurrency)
+        self.request_timeout = request_timeout  # 单个请求超时（秒）
+        self.client = client  # 可注入客户端（如本地桩），默认按api_key创建
+
+        self._cancel_event = threading.Event()
         
+    def cancel(self):
+        """取消生成；尚未开始的请求不再发出，进行中的请求结果将被丢弃"""
+        self._cancel_event.set()
+
+    @property
+    def is_cancelled(self) -> bool:
+        return self._cancel_event.is_set()
+
     def run(self):
         """运行生成任务"""
         try:
             logger.info("开始AI生成任务")
+            self._cancel_event.clear()
 
             # 检查Gemini库
-            if not GEMINI_AVAILABLE:
+            if self.client is None and not GEMINI_AVAILABLE:
                 error_msg = "Gemini库未安装，请运行: pip install google-generativeai"
                 logger.error(error_msg)
                 self.error_occurred.emit(error_msg)
                 return
 
-            if not self.api_key:
+            if self.client is None and not self.api_key:
                 error_msg = "请先设置Gemini API Key"
                 logger.error(error_msg)
                 self.error_occurred.emit(error_msg)
                 return
 
             logger.info(f"使用模型: {self.model}")
-            logger.info(f"API Key长度: {len(self.api_key)}")
             logger.info(f"思考模式: {self.enable_thinking}")
 
             self.progress_update.emit(f"🤖 正在连接Gemini ({self.model})...")
 
             # 初始化Gemini客户端 - 使用新的google.genai客户端
             try:
-                # 创建客户端
-                client = genai.Client(api_key=self.api_key)
+                client = self.client or self._create_client()
                 logger.info("Gemini客户端初始化成功")
                 self.progress_update.emit("✅ 已连接到Gemini API")
             except Exception as e:
@@ -122,90 +168,19 @@ class GeminiGenerator(QThread):
                 return
             
             # 生成多个方案
-            solutions = []
-            
-            for i, (solution_name, solution_type) in enumerate([
-                ("标准方案", "standard"),
-                ("增强方案", "enhanced"),
-                ("写实方案", "realistic")
-            ]):
-                logger.info(f"开始生成方案 {i+1}/3: {solution_name}")
-                self.progress_update.emit(f"🎨 正在生成{solution_name}... ({i+1}/3)")
-
-                try:
-                    # 构建专用的系统指令
-                    system_instruction = self._get_system_instruction(solution_type)
-                    logger.info(f"系统指令长度: {len(system_instruction)}")
-
-                    # 构建完整提示词
-                    full_prompt = self._build_prompt(solution_type)
-                    logger.info(f"完整提示词长度: {len(full_prompt)}")
-
-                    thinking_status = "启用" if self.enable_thinking else "禁用"
-                    self.progress_update.emit(f"🎨 正在生成{solution_name}... (思考模式: {thinking_status})")
-
-                    # 按照官方文档的方式调用API
-                    try:
-                        logger.info("开始调用Gemini API...")
-                        self.progress_update.emit(f"📡 正在调用API生成{solution_name}...")
-
-                        # 配置生成参数 - 使用新的google.genai客户端方式
-                        config = types.GenerateContentConfig(
-                            temperature=0.7,
-                            max_output_tokens=8192,
-                        )
-
-                        # 如果启用思考模式，添加思考配置
-                        if self.enable_thinking:
-                            config.thinking_config = types.ThinkingConfig(thinking_budget=1024)
-
-                        # 调用Gemini API - 使用新的客户端方式
-                        response = client.models.generate_content(
-                            model=self.model,
-                            contents=full_prompt,
-                            config=config
-                        )
-
-                        logger.info("API调用完成，正在处理响应...")
-
-                    except Exception as api_error:
-                        error_msg = f"API调用失败: {str(api_error)}"
-                        logger.error(error_msg)
-                        self.progress_update.emit(f"❌ {solution_name}生成失败: {str(api_error)}")
-                        continue
-                    
-                    if response and response.text:
-                        logger.info(f"方案{i+1}生成成功，响应长度: {len(response.text)}")
-                        self.progress_update.emit(f"✅ {solution_name}生成成功")
-
-                        # 创建动画方案
-                        solution = AnimationSolution(
-                            name=solution_name,
-                            description=f"基于{self.animation_type}的{solution_name}",
-                            html_code=response.text,
-                            tech_stack=self._detect_tech_stack(response.text),
-                            complexity_level=self._get_complexity_level(solution_type),
-                            recommended=(i == 0)  # 第一个方案为推荐方案
-                        )
-                        solutions.append(solution)
-                        logger.info(f"方案{i+1}已添加到结果列表")
-
-                    elif response:
-                        logger.warning(f"方案{i+1}生成失败：响应为空")
-                        logger.warning(f"响应对象: {response}")
-                        self.progress_update.emit(f"⚠️ {solution_name}响应为空")
-                    else:
-                        logger.warning(f"方案{i+1}生成失败：无响应")
-                        self.progress_update.emit(f"❌ {solution_name}无响应")
-
-                except Exception as e:
-                    error_msg = f"生成方案{i+1}失败: {str(e)}"
-                    logger.error(error_msg)
-                    logger.error(f"错误详情: {type(e).__name__}: {e}")
-                    self.progress_update.emit(f"❌ {solution_name}失败: {str(e)}")
-                    continue
+            start_time = time.time()
+            if self.concurrent and self.max_concurrency > 1:
+                solutions = self._generate_concurrently(client)
+            else:
+                solutions = self._generate_sequentially(client)
             
-            logger.info(f"生成任务完成，共生成 {len(solutions)} 个方案")
+            logger.info(f"生成任务完成，共生成 {len(solutions)} 个方案，耗时 {time.time() - start_time:.2f}s")
+
+            if self.is_cancelled:
+                self.progress_update.emit("⏹️ 生成已取消")
+                if solutions:
+                    self.result_ready.emit(solutions)
+                return
 
             if solutions:
                 self.progress_update.emit(f"✅ 生成完成，共{len(solutions)}个方案")
@@ -223,7 +198,173 @@ class GeminiGenerator(QThread):
             import traceback
             logger.error(f"错误堆栈: {traceback.format_exc()}")
             self.error_occurred.emit(error_msg)
+
+    def _create_client(self):
+        """创建Gemini客户端；支持时把单请求超时下发到HTTP层"""
+        http_options_cls = getattr(types, "HttpOptions", None)
+        if http_options_cls is not None and self.request_timeout:
+            try:
+                return genai.Client(api_key=self.api_key,
+                                    http_options=http_options_cls(timeout=int(self.request_timeout * 1000)))
+            except TypeError:
+                pass
+        return genai.Client(api_key=self.api_key)
+
+    def _generate_sequentially(self, client) -> List[AnimationSolution]:
+        """依次生成各方案"""
+        solutions = []
+        for i, (solution_name, solution_type) in enumerate(SOLUTION_VARIANTS):
+            if self.is_cancelled:
+                break
+            solution = self._generate_solution(client, i, solution_name, solution_type)
+            if solution and not self.is_cancelled:
+                solutions.append(solution)
+                self.solution_ready.emit(solution)
+        return solutions
+
+    def _generate_concurrently(self, client) -> List[AnimationSolution]:
+        """并发生成各方案，每个方案完成后立即发送
+
+        总耗时约等于最慢的一个请求，而不是所有请求之和。超时或取消的请求
+        无法中断底层的阻塞调用，其线程会在后台自然结束，结果被丢弃。
+        """
+        results = {}
+        executor = ThreadPoolExecutor(max_workers=min(self.max_concurrency, len(SOLUTION_VARIANTS)),
+                                      thread_name_prefix="gemini")
+        started_at = {}
+        pending = {}
+
+        def task(index, solution_name, solution_type):
+            started_at[index] = time.monotonic()
+            if self.is_cancelled:
+                return None
+            return self._generate_solution(client, index, solution_name, solution_type)
+
+        try:
+            pending = {
+                executor.submit(task, i, name, solution_type): (i, name)
+                for i, (name, solution_type) in enumerate(SOLUTION_VARIANTS)
+            }
+            self.progress_update.emit(f"🎨 正在并发生成{len(pending)}个方案（并发数: {self.max_concurrency}）...")
+
+            while pending and not self.is_cancelled:
+                done, _ = wait(pending, timeout=0.1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    index, solution_name = pending.pop(future)
+                    try:
+                        solution = future.result()
+                    except Exception as e:
+                        logger.error(f"生成方案{index+1}失败: {type(e).__name__}: {e}")
+                        self.progress_update.emit(f"❌ {solution_name}失败: {str(e)}")
+                        continue
+
+                    if solution and not self.is_cancelled:
+                        results[index] = solution
+                        self.solution_ready.emit(solution)
+
+                # 检查超时（从请求真正开始执行时计时）
+                now = time.monotonic()
+                for future, (index, solution_name) in list(pending.items()):
+                    started = started_at.get(index)
+                    if self.request_timeout and started is not None and now - started > self.request_timeout:
+                        pending.pop(future)
+                        future.cancel()
+                        logger.warning(f"方案{index+1}请求超时（{self.request_timeout:.0f}s）")
+                        self.progress_update.emit(f"⏱️ {solution_name}请求超时")
+
+            if self.is_cancelled:
+                logger.info("生成任务已取消")
+
+        finally:
+            # 尚未开始的请求直接取消（Python 3.8 的 shutdown 不支持 cancel_futures）
+            for future in pending:
+                future.cancel()
+            executor.shutdown(wait=False)
+
+        return [results[index] for index in sorted(results)]
+
+    def _generate_solution(self, client, index: int, solution_name: str,
+                           solution_type: str) -> Optional[AnimationSolution]:
+        """生成单个方案（可在工作线程中调用）"""
+        total = len(SOLUTION_VARIANTS)
+        logger.info(f"开始生成方案 {index+1}/{total}: {solution_name}")
+        self.progress_update.emit(f"🎨 正在生成{solution_name}... ({index+1}/{total})")
+
+        try:
+            # 构建专用的系统指令
+            system_instruction = self._get_system_instruction(solution_type)
+            logger.info(f"系统指令长度: {len(system_instruction)}")
+
+            # 构建完整提示词
+            full_prompt = self._build_prompt(solution_type)
+            logger.info(f"完整提示词长度: {len(full_prompt)}")
+
+            # 按照官方文档的方式调用API
+            try:
+                logger.info("开始调用Gemini API...")
+                self.progress_update.emit(f"📡 正在调用API生成{solution_name}...")
+
+                config = self._build_config()
+
+                # 调用Gemini API - 使用新的客户端方式
+                response = client.models.generate_content(
+                    model=self.model,
+                    contents=full_prompt,
+                    config=config
+                )
+                text = response.text if response else None
+
+                logger.info("API调用完成，正在处理响应...")
+
+            except Exception as api_error:
+                error_msg = f"API调用失败: {str(api_error)}"
+                logger.error(error_msg)
+                self.progress_update.emit(f"❌ {solution_name}生成失败: {str(api_error)}")
+                return None
+
+            if text:
+                logger.info(f"方案{index+1}生成成功，响应长度: {len(text)}")
+                self.progress_update.emit(f"✅ {solution_name}生成成功")
+
+                # 创建动画方案
+                return AnimationSolution(
+                    name=solution_name,
+                    description=f"基于{self.animation_type}的{solution_name}",
+                    html_code=text,
+                    tech_stack=self._detect_tech_stack(text),
+                    complexity_level=self._get_complexity_level(solution_type),
+                    recommended=(index == 0)  # 第一个方案为推荐方案
+                )
+
+            elif text is not None:
+                logger.warning(f"方案{index+1}生成失败：响应为空")
+                self.progress_update.emit(f"⚠️ {solution_name}响应为空")
+            else:
+                logger.warning(f"方案{index+1}生成失败：无响应")
+                self.progress_update.emit(f"❌ {solution_name}无响应")
+
+        except Exception as e:
+            error_msg = f"生成方案{index+1}失败: {str(e)}"
+            logger.error(error_msg)
+            logger.error(f"错误详情: {type(e).__name__}: {e}")
+            self.progress_update.emit(f"❌ {solution_name}失败: {str(e)}")
+
+        return None
     
+    def _build_config(self):
+        """构建生成参数 - 使用新的google.genai客户端方式"""
+        config = types.GenerateContentConfig(
+            temperature=0.7,
+            max_output_tokens=8192,
+        )
+
+        # 如果启用思考模式，添加思考配置
+        if self.enable_thinking:
+            config.thinking_config = types.ThinkingConfig(thinking_budget=1024)
+
+        return config
+
     def _get_system_instruction(self, solution_type: str) -> str:
         """获取基于动画规范文档的系统指令"""
         base_instruction = """你是一个专业的网页动画开发专家，专门为动画录制工具生成HTML动画代码。
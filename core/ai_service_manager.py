@@ -5,14 +5,19 @@ AI Animation Studio - AI服务管理器
 
 import json
 import os
+import re
 import hashlib
 import time
+import queue
+import sqlite3
+import threading
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any, Tuple
+from typing import Callable, Dict, Iterator, List, Optional, Any, Tuple
 from dataclasses import dataclass
 from enum import Enum
 
 from core.logger import get_logger
+from core.usage_ledger import usage_ledger
 
 logger = get_logger("ai_service_manager")
 
@@ -50,117 +55,360 @@ class AIResponse:
     response_time: float
     timestamp: datetime = None
     cached: bool = False
+    fallback: bool = False  # 回退服务生成的模拟内容，不写入缓存
     
     def __post_init__(self):
         if self.timestamp is None:
             self.timestamp = datetime.now()
 
 
+class PartialStreamError(Exception):
+    """流式输出中途失败（已有片段交给调用方，不能再换用其他服务）"""
+    pass
+
+
+class PromptFingerprintIndex:
+    """近似提示词索引（语义缓存层）
+
+    把描述规范化（MultilingualDescriptionProcessor.normalize_description、小写、去标点）后
+    去掉停用词，得到实词序列作为指纹。只有作用域和指纹都相同的描述才视为近似——差别仅在
+    停用词、大小写或标点；颜色、数量、方向等只差一个词或词序不同的描述会生成不同的动画，不能复用。
+    指纹持久化在缓存数据库中，内存里维护 (作用域, 指纹) -> 缓存键 的字典，查询为一次字典查找。
+    """
+    
+    _PUNCTUATION_PATTERN = re.compile(r'[^\w\s]')
+    # 只包含不影响动画内容的虚词；介词、数词、方向词都是实词。
+    # 按整个词元匹配：中文没有分词，只有被标点隔开的独立虚词才会被去掉，词内的字（如"地球"的"地"）保留
+    _STOPWORDS = frozenset({
+        "a", "an", "the", "and", "then", "please", "is", "are", "be", "that", "this", "it", "its",
+        "的", "了", "请", "然后", "接着", "吧", "呢",
+    })
+    
+    def __init__(self, cache: "AICache"):
+        self.cache = cache
+        self._processor = None
+        self._keys: Dict[Tuple[str, Tuple[str, ...]], str] = {}  # (作用域, 指纹) -> 缓存键
+        self._entries: Dict[str, Tuple[str, Tuple[str, ...]]] = {}  # 缓存键 -> (作用域, 指纹)
+        self._lock = threading.Lock()
+        self._load()
+    
+    def _load(self):
+        """从数据库加载指纹"""
+        try:
+            connection = self.cache._connection()
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS prompt_signatures (
+                    cache_key TEXT PRIMARY KEY,
+                    scope TEXT NOT NULL,
+                    content TEXT NOT NULL
+                )
+            """)
+            self._migrate_legacy_fingerprints(connection)
+            
+            for cache_key, scope, content in connection.execute(
+                    "SELECT cache_key, scope, content FROM prompt_signatures ORDER BY rowid"):
+                self._add_entry(cache_key, scope, tuple(json.loads(content)))
+                
+        except Exception as e:
+            logger.error(f"加载提示词指纹失败: {e}")
+    
+    @staticmethod
+    def _migrate_legacy_fingerprints(connection: sqlite3.Connection):
+        """迁移旧版n-gram指纹表：保留带实词签名的条目"""
+        if connection.execute("SELECT name FROM sqlite_master WHERE type = 'table' "
+                              "AND name = 'prompt_fingerprints'").fetchone() is None:
+            return
+        
+        rows = []
+        for cache_key, scope, data in connection.execute(
+                "SELECT cache_key, scope, grams FROM prompt_fingerprints"):
+            data = json.loads(data)
+            if isinstance(data, dict):  # 更早的指纹没有实词签名，无法安全匹配
+                rows.append((cache_key, scope, json.dumps(data["content"], ensure_ascii=False)))
+        connection.executemany(
+            "INSERT OR IGNORE INTO prompt_signatures (cache_key, scope, content) VALUES (?, ?, ?)", rows)
+        connection.execute("DROP TABLE prompt_fingerprints")
+    
+    @property
+    def processor(self):
+        if self._processor is None:
+            from core.multilingual_description_processor import MultilingualDescriptionProcessor
+            self._processor = MultilingualDescriptionProcessor()
+        return self._processor
+    
+    def canonicalize(self, text: str) -> str:
+        """规范化描述文本"""
+        language, _ = self.processor.language_detector.detect_language(text)
+        normalized = self.processor.normalize_description(text, language).lower()
+        return self._PUNCTUATION_PATTERN.sub(' ', normalized)
+    
+    def fingerprint(self, text: str) -> Tuple[str, ...]:
+        """提取指纹：去掉停用词后的实词序列"""
+        return tuple(token for token in self.canonicalize(text).split() if token not in self._STOPWORDS)
+    
+    @staticmethod
+    def scope_for(request: AIRequest, description: Optional[str]) -> str:
+        """近似匹配的作用域：服务、模型、生成参数以及去掉描述后的提示词模板必须完全一致"""
+        template = request.prompt.replace(description, "") if description else ""
+        content = f"{request.service.value}_{request.model}_{request.temperature}_{request.max_tokens}_{template}"
+        return hashlib.md5(content.encode()).hexdigest()
+    
+    def _add_entry(self, cache_key: str, scope: str, content: Tuple[str, ...]):
+        self._remove_entry(cache_key)
+        self._entries[cache_key] = (scope, content)
+        self._keys[(scope, content)] = cache_key  # 同一指纹保留最近登记的响应
+    
+    def _remove_entry(self, cache_key: str):
+        entry = self._entries.pop(cache_key, None)
+        if entry is not None and self._keys.get(entry) == cache_key:
+            del self._keys[entry]
+    
+    def add(self, cache_key: str, request: AIRequest, description: Optional[str] = None):
+        """登记一条已缓存响应的指纹"""
+        try:
+            scope = self.scope_for(request, description)
+            content = self.fingerprint(description or request.prompt)
+            if not content:
+                return
+            
+            self.cache._connection().execute(
+                "INSERT OR REPLACE INTO prompt_signatures (cache_key, scope, content) VALUES (?, ?, ?)",
+                (cache_key, scope, json.dumps(content, ensure_ascii=False))
+            )
+            with self._lock:
+                self._add_entry(cache_key, scope, content)
+                
+        except Exception as e:
+            logger.error(f"登记提示词指纹失败: {e}")
+    
+    def find(self, request: AIRequest, description: Optional[str]) -> Optional[str]:
+        """查找作用域和指纹都相同的缓存键"""
+        content = self.fingerprint(description or request.prompt)
+        if not content:
+            return None
+        
+        with self._lock:
+            return self._keys.get((self.scope_for(request, description), content))
+    
+    def remove(self, cache_key: str):
+        """移除指纹"""
+        try:
+            self.cache._connection().execute(
+                "DELETE FROM prompt_signatures WHERE cache_key = ?", (cache_key,))
+            with self._lock:
+                self._remove_entry(cache_key)
+        except Exception as e:
+            logger.error(f"移除提示词指纹失败: {e}")
+    
+    def prune(self):
+        """删除响应已被淘汰的指纹"""
+        try:
+            connection = self.cache._connection()
+            orphaned = [row[0] for row in connection.execute(
+                "SELECT cache_key FROM prompt_signatures "
+                "WHERE cache_key NOT IN (SELECT cache_key FROM responses)")]
+            if not orphaned:
+                return
+            connection.executemany("DELETE FROM prompt_signatures WHERE cache_key = ?",
+                                   [(cache_key,) for cache_key in orphaned])
+            with self._lock:
+                for cache_key in orphaned:
+                    self._remove_entry(cache_key)
+                    
+        except Exception as e:
+            logger.error(f"清理提示词指纹失败: {e}")
+    
+    def clear(self):
+        self.cache._connection().execute("DELETE FROM prompt_signatures")
+        with self._lock:
+            self._keys.clear()
+            self._entries.clear()
+
+
 class AICache:
-    """AI响应缓存"""
+    """AI响应缓存
+
+    所有响应保存在单个SQLite数据库（WAL模式）中，按缓存键主键索引查找，
+    按创建时间索引批量淘汰过期和超出容量的条目。每个线程使用独立连接，可在多个QThread中并发使用。
+    """
+    
+    DB_FILE_NAME = "cache.db"
+    LEGACY_INDEX_FILE = "cache_index.json"
+    # 过期条目的批量清理间隔（秒）
+    EXPIRE_SWEEP_INTERVAL = 600
     
     def __init__(self, cache_dir: str = "ai_cache"):
         self.cache_dir = cache_dir
-        self.cache_file = os.path.join(cache_dir, "cache_index.json")
+        self.db_file = os.path.join(cache_dir, self.DB_FILE_NAME)
         self.max_size_mb = 100
         self.expire_hours = 24
         
+        # 命中统计（本次运行）
+        self.hits = 0
+        self.misses = 0
+        self.similar_hits = 0
+        
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._total_size = 0
+        self._last_sweep = 0.0
+        
         os.makedirs(cache_dir, exist_ok=True)
-        self.cache_index = self.load_cache_index()
+        self._init_database()
+        self._migrate_legacy_cache()
+        self.fingerprints = PromptFingerprintIndex(self)
     
-    def load_cache_index(self) -> Dict[str, Any]:
-        """加载缓存索引"""
+    def _connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_file, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+    
+    def _init_database(self):
+        """创建表结构并统计当前容量"""
         try:
-            if os.path.exists(self.cache_file):
-                with open(self.cache_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {}
+            connection = self._connection()
+            connection.execute("""
+                CREATE TABLE IF NOT EXISTS responses (
+                    cache_key TEXT PRIMARY KEY,
+                    content TEXT NOT NULL,
+                    service TEXT NOT NULL,
+                    model TEXT NOT NULL,
+                    tokens_used INTEGER NOT NULL,
+                    cost REAL NOT NULL,
+                    response_time REAL NOT NULL,
+                    created_at REAL NOT NULL,
+                    size INTEGER NOT NULL
+                )
+            """)
+            connection.execute("CREATE INDEX IF NOT EXISTS idx_responses_created ON responses(created_at)")
+            
+            row = connection.execute("SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()
+            self._total_size = row[0]
+            
         except Exception as e:
-            logger.error(f"加载缓存索引失败: {e}")
-            return {}
+            logger.error(f"初始化缓存数据库失败: {e}")
     
-    def save_cache_index(self):
-        """保存缓存索引"""
+    def _migrate_legacy_cache(self):
+        """导入旧版（每个响应一个JSON文件）的缓存，导入后删除旧文件"""
+        legacy_index = os.path.join(self.cache_dir, self.LEGACY_INDEX_FILE)
+        if not os.path.exists(legacy_index):
+            return
+        
         try:
-            with open(self.cache_file, 'w', encoding='utf-8') as f:
-                json.dump(self.cache_index, f, ensure_ascii=False, indent=2)
+            with open(legacy_index, 'r', encoding='utf-8') as f:
+                index = json.load(f)
+            
+            migrated = 0
+            for cache_key in index:
+                cache_file_path = os.path.join(self.cache_dir, f"{cache_key}.json")
+                try:
+                    with open(cache_file_path, 'r', encoding='utf-8') as f:
+                        data = json.load(f)
+                    response = AIResponse(
+                        content=data["content"],
+                        service=AIServiceType(data["service"]),
+                        model=data["model"],
+                        tokens_used=data["tokens_used"],
+                        cost=data["cost"],
+                        response_time=data["response_time"],
+                        timestamp=datetime.fromisoformat(data["timestamp"])
+                    )
+                    self._store(cache_key, response)
+                    migrated += 1
+                except (OSError, KeyError, ValueError):
+                    pass
+                finally:
+                    if os.path.exists(cache_file_path):
+                        os.remove(cache_file_path)
+            
+            os.remove(legacy_index)
+            logger.info(f"已迁移旧版缓存 {migrated} 条")
+            
         except Exception as e:
-            logger.error(f"保存缓存索引失败: {e}")
+            logger.error(f"迁移旧版缓存失败: {e}")
     
     def get_cache_key(self, request: AIRequest) -> str:
         """生成缓存键"""
         content = f"{request.prompt}_{request.service.value}_{request.model}_{request.temperature}_{request.max_tokens}"
         return hashlib.md5(content.encode()).hexdigest()
     
-    def get(self, request: AIRequest) -> Optional[AIResponse]:
-        """获取缓存的响应"""
+    def peek(self, cache_key: str) -> Optional[AIResponse]:
+        """读取缓存但不计入命中统计"""
+        try:
+            return self._load_response(cache_key)
+        except Exception as e:
+            logger.error(f"读取缓存失败: {e}")
+            return None
+    
+    def get(self, request: AIRequest, description: Optional[str] = None,
+            allow_similar: bool = False) -> Optional[AIResponse]:
+        """获取缓存的响应
+
+        Args:
+            request: AI请求
+            description: 提示词中的用户描述部分；近似匹配只比较这部分
+            allow_similar: 精确键未命中时，是否返回描述只差停用词、大小写或标点的缓存响应
+        """
         try:
             cache_key = self.get_cache_key(request)
+            response = self._load_response(cache_key)
             
-            if cache_key in self.cache_index:
-                cache_info = self.cache_index[cache_key]
-                
-                # 检查是否过期
-                cache_time = datetime.fromisoformat(cache_info["timestamp"])
-                if datetime.now() - cache_time > timedelta(hours=self.expire_hours):
-                    self.remove(cache_key)
-                    return None
-                
-                # 读取缓存文件
-                cache_file_path = os.path.join(self.cache_dir, f"{cache_key}.json")
-                if os.path.exists(cache_file_path):
-                    with open(cache_file_path, 'r', encoding='utf-8') as f:
-                        response_data = json.load(f)
-                    
-                    response = AIResponse(
-                        content=response_data["content"],
-                        service=AIServiceType(response_data["service"]),
-                        model=response_data["model"],
-                        tokens_used=response_data["tokens_used"],
-                        cost=response_data["cost"],
-                        response_time=response_data["response_time"],
-                        timestamp=datetime.fromisoformat(response_data["timestamp"]),
-                        cached=True
-                    )
-                    
-                    logger.debug(f"缓存命中: {cache_key}")
-                    return response
+            if response is None and allow_similar:
+                similar_key = self.fingerprints.find(request, description)
+                if similar_key is not None and similar_key != cache_key:
+                    response = self._load_response(similar_key)
+                    if response is not None:
+                        logger.debug(f"近似缓存命中: {similar_key}")
+                        with self._lock:
+                            self.similar_hits += 1
+                    else:
+                        self.fingerprints.remove(similar_key)
             
-            return None
+            self._count(hit=response is not None)
+            return response
             
         except Exception as e:
             logger.error(f"获取缓存失败: {e}")
             return None
     
-    def put(self, request: AIRequest, response: AIResponse):
+    def _load_response(self, cache_key: str) -> Optional[AIResponse]:
+        """按缓存键读取未过期的响应"""
+        row = self._connection().execute(
+            "SELECT content, service, model, tokens_used, cost, response_time, created_at "
+            "FROM responses WHERE cache_key = ?", (cache_key,)
+        ).fetchone()
+        
+        if row is None:
+            return None
+        
+        if row[6] < time.time() - self.expire_hours * 3600:
+            # 已过期
+            self.remove(cache_key)
+            return None
+        
+        logger.debug(f"缓存命中: {cache_key}")
+        return AIResponse(
+            content=row[0],
+            service=AIServiceType(row[1]),
+            model=row[2],
+            tokens_used=row[3],
+            cost=row[4],
+            response_time=row[5],
+            timestamp=datetime.fromtimestamp(row[6]),
+            cached=True
+        )
+    
+    def put(self, request: AIRequest, response: AIResponse, description: Optional[str] = None):
         """存储响应到缓存"""
         try:
             cache_key = self.get_cache_key(request)
-            
-            # 保存响应数据
-            cache_file_path = os.path.join(self.cache_dir, f"{cache_key}.json")
-            response_data = {
-                "content": response.content,
-                "service": response.service.value,
-                "model": response.model,
-                "tokens_used": response.tokens_used,
-                "cost": response.cost,
-                "response_time": response.response_time,
-                "timestamp": response.timestamp.isoformat()
-            }
-            
-            with open(cache_file_path, 'w', encoding='utf-8') as f:
-                json.dump(response_data, f, ensure_ascii=False, indent=2)
-            
-            # 更新缓存索引
-            self.cache_index[cache_key] = {
-                "timestamp": response.timestamp.isoformat(),
-                "size": os.path.getsize(cache_file_path),
-                "service": response.service.value,
-                "model": response.model
-            }
-            
-            self.save_cache_index()
+            self._store(cache_key, response)
+            self.fingerprints.add(cache_key, request, description)
             self.cleanup_cache()
             
             logger.debug(f"缓存已保存: {cache_key}")
@@ -168,63 +416,273 @@ class AICache:
         except Exception as e:
             logger.error(f"保存缓存失败: {e}")
     
+    def _store(self, cache_key: str, response: AIResponse):
+        """在一个事务中写入（或替换）一条响应"""
+        size = len(response.content.encode('utf-8'))
+        connection = self._connection()
+        with self._lock:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                old = connection.execute(
+                    "SELECT size FROM responses WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+                connection.execute(
+                    "INSERT OR REPLACE INTO responses "
+                    "(cache_key, content, service, model, tokens_used, cost, response_time, created_at, size) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                    (cache_key, response.content, response.service.value, response.model,
+                     response.tokens_used, response.cost, response.response_time,
+                     response.timestamp.timestamp(), size)
+                )
+                connection.execute("COMMIT")
+            except Exception:
+                connection.execute("ROLLBACK")
+                raise
+            self._total_size += size - (old[0] if old else 0)
+    
     def remove(self, cache_key: str):
         """移除缓存项"""
         try:
-            if cache_key in self.cache_index:
-                cache_file_path = os.path.join(self.cache_dir, f"{cache_key}.json")
-                if os.path.exists(cache_file_path):
-                    os.remove(cache_file_path)
-                
-                del self.cache_index[cache_key]
-                self.save_cache_index()
+            connection = self._connection()
+            with self._lock:
+                row = connection.execute(
+                    "SELECT size FROM responses WHERE cache_key = ?", (cache_key,)
+                ).fetchone()
+                if row:
+                    connection.execute("DELETE FROM responses WHERE cache_key = ?", (cache_key,))
+                    self._total_size -= row[0]
+            self.fingerprints.remove(cache_key)
                 
         except Exception as e:
             logger.error(f"移除缓存失败: {e}")
     
-    def cleanup_cache(self):
-        """清理过期和超大缓存"""
+    def cleanup_cache(self, force: bool = False):
+        """批量清理过期和超出容量的缓存"""
         try:
-            # 计算总缓存大小
-            total_size = sum(info.get("size", 0) for info in self.cache_index.values())
+            now = time.time()
             max_size_bytes = self.max_size_mb * 1024 * 1024
+            sweep_due = force or now - self._last_sweep >= self.EXPIRE_SWEEP_INTERVAL
+            if not sweep_due and self._total_size <= max_size_bytes:
+                return
             
-            # 如果超过大小限制，删除最旧的缓存
-            if total_size > max_size_bytes:
-                sorted_items = sorted(
-                    self.cache_index.items(),
-                    key=lambda x: x[1]["timestamp"]
-                )
-                
-                for cache_key, _ in sorted_items:
-                    self.remove(cache_key)
-                    total_size = sum(info.get("size", 0) for info in self.cache_index.values())
-                    if total_size <= max_size_bytes:
-                        break
-            
-            # 删除过期缓存
-            expired_keys = []
-            for cache_key, info in self.cache_index.items():
-                cache_time = datetime.fromisoformat(info["timestamp"])
-                if datetime.now() - cache_time > timedelta(hours=self.expire_hours):
-                    expired_keys.append(cache_key)
-            
-            for cache_key in expired_keys:
-                self.remove(cache_key)
+            connection = self._connection()
+            with self._lock:
+                connection.execute("BEGIN IMMEDIATE")
+                try:
+                    # 删除过期缓存（按创建时间索引范围删除）
+                    if sweep_due:
+                        connection.execute("DELETE FROM responses WHERE created_at < ?",
+                                           (now - self.expire_hours * 3600,))
+                        self._last_sweep = now
+                    
+                    total_size = connection.execute(
+                        "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                    
+                    # 超过大小限制时，按时间顺序找到需要淘汰的最旧条目，一次删除
+                    if total_size > max_size_bytes:
+                        excess = total_size - max_size_bytes
+                        cutoff = None
+                        freed = 0
+                        for created_at, size in connection.execute(
+                                "SELECT created_at, size FROM responses ORDER BY created_at"):
+                            freed += size
+                            cutoff = created_at
+                            if freed >= excess:
+                                break
+                        if cutoff is not None:
+                            connection.execute("DELETE FROM responses WHERE created_at <= ?", (cutoff,))
+                        total_size = connection.execute(
+                            "SELECT COALESCE(SUM(size), 0) FROM responses").fetchone()[0]
+                    
+                    connection.execute("COMMIT")
+                except Exception:
+                    connection.execute("ROLLBACK")
+                    raise
+                self._total_size = total_size
+            
+            self.fingerprints.prune()
                 
         except Exception as e:
             logger.error(f"清理缓存失败: {e}")
+    
+    def clear(self):
+        """清空缓存"""
+        try:
+            connection = self._connection()
+            with self._lock:
+                connection.execute("DELETE FROM responses")
+                self._total_size = 0
+            self.fingerprints.clear()
+            connection.execute("VACUUM")
+            
+        except Exception as e:
+            logger.error(f"清空缓存失败: {e}")
+    
+    def _count(self, hit: bool):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+    
+    def count(self) -> int:
+        """缓存条目数"""
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM responses").fetchone()[0]
+        except Exception as e:
+            logger.error(f"统计缓存条目失败: {e}")
+            return 0
+    
+    def get_stats(self) -> Dict[str, Any]:
+        """获取缓存统计"""
+        with self._lock:
+            hits, misses = self.hits, self.misses
+        lookups = hits + misses
+        return {
+            "cache_size": self.count(),
+            "cache_bytes": self._total_size,
+            "cache_hits": hits,
+            "cache_misses": misses,
+            "similar_hits": self.similar_hits,
+            "hit_rate": hits / lookups if lookups else 0.0
+        }
+
+
+class TokenBucket:
+    """令牌桶限流器
+
+    令牌按 rate（个/秒）持续补充，最多累积 capacity 个；每次上游调用消耗一个令牌。
+    """
+    
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def wait_time(self) -> float:
+        """获得下一个令牌还需等待的秒数（不消耗令牌）"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                return 0.0
+            return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+    
+    def try_acquire(self) -> float:
+        """尝试取得一个令牌；成功返回0，否则返回需要等待的秒数"""
+        with self._lock:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return 0.0
+            return (1 - self.tokens) / self.rate if self.rate > 0 else float("inf")
+    
+    def acquire(self, timeout: float = 0.0) -> bool:
+        """取得一个令牌，最多等待 timeout 秒"""
+        deadline = time.monotonic() + timeout
+        while True:
+            wait = self.try_acquire()
+            if wait == 0.0:
+                return True
+            remaining = deadline - time.monotonic()
+            if wait > remaining:
+                return False
+            time.sleep(wait)
+
+
+class InFlightCall:
+    """正在进行的上游调用
+
+    同一缓存键的后续请求附加到这里等待同一个响应；流式片段会先回放已到达的部分，再实时转发。
+    """
+    
+    def __init__(self):
+        self.response: Optional[AIResponse] = None
+        self.error: Optional[BaseException] = None
+        self._chunks: List[str] = []
+        self._listeners: List[Callable[[str], None]] = []
+        self._lock = threading.Lock()
+        self._done = threading.Event()
+    
+    def publish(self, chunk: str):
+        """转发一个流式片段给所有等待者"""
+        with self._lock:
+            self._chunks.append(chunk)
+            for listener in self._listeners:
+                listener(chunk)
+    
+    def subscribe(self, listener: Callable[[str], None]):
+        """订阅流式片段（先回放已到达的片段）"""
+        with self._lock:
+            for chunk in self._chunks:
+                listener(chunk)
+            self._listeners.append(listener)
+    
+    def resolve(self, response: Optional[AIResponse]):
+        self.response = response
+        self._done.set()
+    
+    def fail(self, error: BaseException):
+        self.error = error
+        self._done.set()
+    
+    def wait(self) -> Optional[AIResponse]:
+        self._done.wait()
+        if self.error is not None:
+            raise self.error
+        return self.response
+
+
+class SingleFlight:
+    """按缓存键合并并发的相同请求，只有第一个请求（leader）调用上游"""
+    
+    def __init__(self):
+        self._calls: Dict[str, InFlightCall] = {}
+        self._lock = threading.Lock()
+    
+    def join(self, key: str) -> Tuple[InFlightCall, bool]:
+        """加入对应键的调用，返回 (调用, 是否为leader)"""
+        with self._lock:
+            call = self._calls.get(key)
+            if call is not None:
+                return call, False
+            call = InFlightCall()
+            self._calls[key] = call
+            return call, True
+    
+    def finish(self, key: str, call: InFlightCall):
+        with self._lock:
+            if self._calls.get(key) is call:
+                del self._calls[key]
+    
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._calls)
 
 
 class AIServiceManager:
     """AI服务管理器"""
     
+    # 每个服务的默认限流：每分钟请求数与突发容量；可用 rate_limit / rate_limits.<服务> 配置覆盖
+    DEFAULT_RATE_LIMIT = {"requests_per_minute": 30, "burst": 5}
+    
     def __init__(self, config_file: str = "ai_config.json"):
         self.config_file = config_file
         self.config = self.load_config()
         self.cache = AICache()
         self.usage_stats = {}
         
+        # 合并相同的并发请求，并按服务限流
+        self.in_flight = SingleFlight()
+        self.rate_limiters: Dict[AIServiceType, TokenBucket] = {}
+        self._build_rate_limiters()
+        
         # 服务状态
         self.service_status = {
             AIServiceType.OPENAI: {"available": False, "last_check": None},
@@ -252,7 +710,10 @@ class AIServiceManager:
                 "max_retries": 3,
                 "enable_cache": True,
                 "cache_expire_hours": 24,
-                "cache_size_mb": 100
+                "cache_size_mb": 100,
+                "enable_semantic_cache": False,
+                "rate_limit": dict(self.DEFAULT_RATE_LIMIT),
+                "rate_limit_wait": 10
             }
             
         except Exception as e:
@@ -277,9 +738,23 @@ class AIServiceManager:
             self.cache.expire_hours = new_config["cache_expire_hours"]
         if "cache_size_mb" in new_config:
             self.cache.max_size_mb = new_config["cache_size_mb"]
+        if "rate_limit" in new_config or "rate_limits" in new_config:
+            self._build_rate_limiters()
         
         logger.info("AI配置已更新")
     
+    def _build_rate_limiters(self):
+        """按配置为每个服务创建令牌桶"""
+        default_limit = {**self.DEFAULT_RATE_LIMIT, **self.config.get("rate_limit", {})}
+        service_limits = self.config.get("rate_limits", {})
+        
+        for service in AIServiceType:
+            limit = {**default_limit, **service_limits.get(service.value, {})}
+            self.rate_limiters[service] = TokenBucket(
+                rate=limit["requests_per_minute"] / 60.0,
+                capacity=max(1, limit["burst"])
+            )
+    
     def get_available_services(self) -> List[AIServiceType]:
         """获取可用的服务列表"""
         available = []
@@ -307,8 +782,18 @@ class AIServiceManager:
         available = self.get_available_services()
         return available[0] if available else None
     
-    def generate_animation_code(self, prompt: str, service: AIServiceType = None) -> Optional[AIResponse]:
-        """生成动画代码"""
+    def generate_animation_code(self, prompt: str, service: AIServiceType = None,
+                                chunk_callback: Optional[Callable[[str], None]] = None,
+                                description: Optional[str] = None) -> Optional[AIResponse]:
+        """生成动画代码
+
+        Args:
+            prompt: 提示词
+            service: 使用的服务，默认为首选服务
+            chunk_callback: 流式输出回调，按到达顺序接收文本片段；
+                缓存命中或服务不支持流式时，整段内容作为一个片段回调
+            description: 提示词中的用户描述；提供时近似缓存只比较描述部分
+        """
         try:
             # 确定使用的服务
             if service is None:
@@ -328,23 +813,33 @@ class AIServiceManager:
             
             # 检查缓存
             if self.config.get("enable_cache", True):
-                cached_response = self.cache.get(request)
+                cached_response = self.cache.get(
+                    request, description,
+                    allow_similar=self.config.get("enable_semantic_cache", False)
+                )
                 if cached_response:
+                    if chunk_callback:
+                        chunk_callback(cached_response.content)
                     return cached_response
             
-            # 调用AI服务
-            response = self.call_ai_service(request)
-            
-            # 保存到缓存
-            if response and self.config.get("enable_cache", True):
-                self.cache.put(request, response)
+            # 相同的请求正在进行时，等待它的结果
+            cache_key = self.cache.get_cache_key(request)
+            call, is_leader = self.in_flight.join(cache_key)
+            if not is_leader:
+                return self._wait_in_flight(call, chunk_callback)
             
-            # 记录使用量
-            if response:
-                self.record_usage(service, response.tokens_used, response.cost)
-            
-            return response
+            try:
+                response = self._call_as_leader(call, cache_key, request, chunk_callback, description)
+                call.resolve(response)
+                return response
+            except BaseException as e:
+                call.fail(e)
+                raise
+            finally:
+                self.in_flight.finish(cache_key, call)
             
+        except PartialStreamError:
+            raise
         except Exception as e:
             logger.error(f"生成动画代码失败: {e}")
             
@@ -353,13 +848,60 @@ class AIServiceManager:
                 fallback_services = self.get_fallback_services(service)
                 for fallback_service in fallback_services:
                     try:
-                        return self.generate_animation_code(prompt, fallback_service)
+                        return self.generate_animation_code(prompt, fallback_service, chunk_callback, description)
                     except Exception as fallback_error:
                         logger.warning(f"备用服务 {fallback_service.value} 也失败: {fallback_error}")
                         continue
             
             return None
     
+    def _call_as_leader(self, call: InFlightCall, cache_key: str, request: AIRequest,
+                        chunk_callback: Optional[Callable[[str], None]],
+                        description: Optional[str]) -> Optional[AIResponse]:
+        """作为leader调用上游服务，并把流式片段转发给等待者"""
+        # 上一个leader可能刚好在检查缓存后完成
+        if self.config.get("enable_cache", True):
+            cached_response = self.cache.peek(cache_key)
+            if cached_response:
+                if chunk_callback:
+                    chunk_callback(cached_response.content)
+                return cached_response
+        
+        limiter = self.rate_limiters.get(request.service)
+        if limiter and not limiter.acquire(self.config.get("rate_limit_wait", 10)):
+            raise Exception(f"{request.service.value} 请求过于频繁，已超过限流")
+        
+        # 调用AI服务
+        streamed = []
+
+        def on_chunk(chunk: str):
+            streamed.append(chunk)
+            if chunk_callback:
+                chunk_callback(chunk)
+            call.publish(chunk)
+
+        response = self.call_ai_service(request, on_chunk)
+        if response and not streamed:
+            on_chunk(response.content)
+        
+        # 保存到缓存（回退服务的模拟内容不能占用真实请求的缓存）
+        if response and not response.fallback and self.config.get("enable_cache", True):
+            self.cache.put(request, response, description)
+        
+        # 记录使用量
+        if response:
+            self.record_usage(request.service, response.tokens_used, response.cost)
+        
+        return response
+    
+    def _wait_in_flight(self, call: InFlightCall,
+                        chunk_callback: Optional[Callable[[str], None]]) -> Optional[AIResponse]:
+        """等待进行中的相同请求"""
+        logger.debug("相同请求正在进行，等待其结果")
+        if chunk_callback:
+            call.subscribe(chunk_callback)
+        return call.wait()
+    
     def get_model_for_service(self, service: AIServiceType) -> str:
         """获取服务对应的模型"""
         model_map = {
@@ -394,22 +936,46 @@ class AIServiceManager:
         
         return ordered_services
     
-    def call_ai_service(self, request: AIRequest) -> Optional[AIResponse]:
+    def stream_animation_code(self, prompt: str, service: AIServiceType = None) -> Iterator[str]:
+        """以迭代器形式流式生成动画代码（在工作线程中逐段消费）"""
+        chunks: "queue.Queue" = queue.Queue()
+        end_of_stream = object()
+
+        def worker():
+            try:
+                self.generate_animation_code(prompt, service, chunks.put)
+            except PartialStreamError as e:
+                logger.error(f"流式生成中断: {e}")
+            finally:
+                chunks.put(end_of_stream)
+
+        threading.Thread(target=worker, daemon=True).start()
+
+        while True:
+            chunk = chunks.get()
+            if chunk is end_of_stream:
+                return
+            yield chunk
+
+    def call_ai_service(self, request: AIRequest,
+                        chunk_callback: Optional[Callable[[str], None]] = None) -> Optional[AIResponse]:
         """调用AI服务"""
         try:
             start_time = time.time()
 
             # 根据服务类型调用相应的AI服务
-            if request.service == "gemini":
-                return self._call_gemini_service(request, start_time)
-            elif request.service == "openai":
+            if request.service == AIServiceType.GEMINI:
+                return self._call_gemini_service(request, start_time, chunk_callback)
+            elif request.service == AIServiceType.OPENAI:
                 return self._call_openai_service(request, start_time)
-            elif request.service == "claude":
+            elif request.service == AIServiceType.CLAUDE:
                 return self._call_claude_service(request, start_time)
             else:
                 # 如果服务不支持，返回模拟响应
                 return self._call_fallback_service(request, start_time)
 
+        except PartialStreamError:
+            raise
         except Exception as e:
             logger.error(f"AI服务调用失败: {e}")
             # 返回错误响应
@@ -423,50 +989,52 @@ class AIServiceManager:
                 error=str(e)
             )
 
-    def _call_gemini_service(self, request: AIRequest, start_time: float) -> Optional[AIResponse]:
-        """调用Gemini服务"""
+    def _call_gemini_service(self, request: AIRequest, start_time: float,
+                             chunk_callback: Optional[Callable[[str], None]] = None) -> Optional[AIResponse]:
+        """调用Gemini服务（流式接收响应）"""
         try:
-            from ai.gemini_generator import GeminiGenerator
+            from ai.gemini_generator import GEMINI_AVAILABLE, genai, types, iter_response_text
 
-            # 创建Gemini生成器实例
-            generator = GeminiGenerator()
+            api_key = self.config.get("gemini_api_key")
+            if not GEMINI_AVAILABLE or not api_key:
+                raise Exception("Gemini不可用或未配置API Key")
 
-            # 调用生成方法
-            solutions = generator.generate_animation_solutions(
-                description=request.prompt,
-                num_solutions=1,
-                tech_stack=request.parameters.get('tech_stack', 'html_css_js')
+            client = genai.Client(api_key=api_key)
+            config = types.GenerateContentConfig(
+                temperature=request.temperature,
+                max_output_tokens=request.max_tokens,
             )
 
-            if solutions:
-                solution = solutions[0]
-                content = f"""
-                <!-- {solution.name} -->
-                {solution.html_content}
-
-                <style>
-                {solution.css_content}
-                </style>
-
-                <script>
-                {solution.js_content}
-                </script>
-                """
-
-                response_time = time.time() - start_time
-
-                return AIResponse(
-                    content=content.strip(),
-                    service=request.service,
-                    model=request.model,
-                    tokens_used=len(content) // 4,
-                    cost=self.calculate_cost(request.service, len(content) // 4),
-                    response_time=response_time
-                )
-            else:
-                # 如果没有生成解决方案，返回错误
+            parts = []
+            try:
+                for chunk in iter_response_text(client, request.model, request.prompt, config):
+                    parts.append(chunk)
+                    if chunk_callback:
+                        chunk_callback(chunk)
+            except Exception as e:
+                # 已经交付的片段无法撤回，不能再拼接回退内容
+                if parts:
+                    raise PartialStreamError(f"Gemini流式输出中断: {e}") from e
+                raise
+
+            content = "".join(parts)
+            if not content:
+                # 如果没有生成内容，返回回退结果
                 return self._call_fallback_service(request, start_time)
 
+            tokens_used = len(content) // 4
+            return AIResponse(
+                content=content,
+                service=request.service,
+                model=request.model,
+                tokens_used=tokens_used,
+                cost=self.calculate_cost(request.service, tokens_used),
+                response_time=time.time() - start_time
+            )
+
+        except PartialStreamError as e:
+            logger.error(str(e))
+            raise
         except Exception as e:
             logger.error(f"Gemini服务调用失败: {e}")
             return self._call_fallback_service(request, start_time)
@@ -571,7 +1139,8 @@ class AIServiceManager:
                 model=request.model or "fallback",
                 tokens_used=len(mock_content) // 4,
                 cost=0.0,  # 回退服务免费
-                response_time=response_time
+                response_time=response_time,
+                fallback=True
             )
             
             logger.info(f"AI服务调用成功: {request.service.value}")
@@ -596,41 +1165,22 @@ class AIServiceManager:
     def record_usage(self, service: AIServiceType, tokens: int, cost: float):
         """记录使用量"""
         try:
-            from ui.enhanced_ai_config_dialog import APIUsageMonitor
-            
-            monitor = APIUsageMonitor()
-            monitor.record_usage(service.value, tokens, cost)
+            usage_ledger.record_usage(service.value, tokens, cost)
             
         except Exception as e:
             logger.error(f"记录使用量失败: {e}")
     
     def check_usage_limits(self, service: AIServiceType) -> Tuple[bool, str]:
-        """检查使用量限制"""
+        """检查使用量限制（令牌桶限流与月费用限制）"""
         try:
-            from ui.enhanced_ai_config_dialog import APIUsageMonitor
-            
-            monitor = APIUsageMonitor()
-            
-            # 检查日限制
-            daily_usage = monitor.get_daily_usage()
-            service_daily = daily_usage.get(service.value, {})
-            daily_requests = service_daily.get("requests", 0)
-            daily_limit = self.config.get("daily_limit", 100)
-            
-            if daily_requests >= daily_limit:
-                return False, f"已达到日请求限制 ({daily_limit})"
-            
-            # 检查月限制
-            monthly_usage = monitor.get_monthly_usage()
-            service_monthly = monthly_usage.get(service.value, {})
-            monthly_requests = service_monthly.get("requests", 0)
-            monthly_limit = self.config.get("monthly_limit", 1000)
-            
-            if monthly_requests >= monthly_limit:
-                return False, f"已达到月请求限制 ({monthly_limit})"
+            limiter = self.rate_limiters.get(service)
+            if limiter:
+                wait = limiter.wait_time()
+                if wait > self.config.get("rate_limit_wait", 10):
+                    return False, f"请求过于频繁，请 {wait:.0f} 秒后重试"
             
             # 检查费用限制
-            monthly_cost = service_monthly.get("cost", 0.0)
+            monthly_cost = usage_ledger.get_service_usage(service.value, "monthly")["cost"]
             cost_limit = self.config.get("cost_limit", 50.0)
             
             if monthly_cost >= cost_limit:
@@ -645,20 +1195,12 @@ class AIServiceManager:
     def get_usage_summary(self) -> Dict[str, Any]:
         """获取使用量摘要"""
         try:
-            from ui.enhanced_ai_config_dialog import APIUsageMonitor
-            
-            monitor = APIUsageMonitor()
-            
             return {
-                "daily_usage": monitor.get_daily_usage(),
-                "monthly_usage": monitor.get_monthly_usage(),
-                "total_requests": monitor.usage_data.get("total_requests", 0),
-                "total_tokens": monitor.usage_data.get("total_tokens", 0),
-                "cache_stats": {
-                    "cache_size": len(self.cache.cache_index),
-                    "cache_hits": 0,  # TODO: 实现缓存命中统计
-                    "cache_misses": 0
-                }
+                "daily_usage": usage_ledger.get_daily_usage(),
+                "monthly_usage": usage_ledger.get_monthly_usage(),
+                "total_requests": usage_ledger.total_requests,
+                "total_tokens": usage_ledger.total_tokens,
+                "cache_stats": self.cache.get_stats()
             }
             
         except Exception as e:
@@ -668,13 +1210,7 @@ class AIServiceManager:
     def clear_cache(self):
         """清空缓存"""
         try:
-            import shutil
-            if os.path.exists(self.cache.cache_dir):
-                shutil.rmtree(self.cache.cache_dir)
-            
-            os.makedirs(self.cache.cache_dir, exist_ok=True)
-            self.cache.cache_index = {}
-            self.cache.save_cache_index()
+            self.cache.clear()
             
             logger.info("AI缓存已清空")
             
@@ -0,0 +1,236 @@
+"""
+AI Animation Studio - 批量素材导入
+流水线式导入：扫描目录 -> 线程池计算哈希和元数据 -> 进程池生成缩略图 -> 分批提交到素材管理器
+"""
+
+import os
+import multiprocessing
+from concurrent.futures import (
+    Future, ThreadPoolExecutor, ProcessPoolExecutor, FIRST_COMPLETED, wait
+)
+from pathlib import Path
+from typing import Callable, Dict, Iterator, List, Optional
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.logger import get_logger
+from core.asset_management import AssetManager, AssetType, EnhancedAsset
+from core.thumbnail_generator import generate_thumbnails_job
+
+logger = get_logger("asset_import")
+
+# 支持导入的文件扩展名
+SUPPORTED_EXTENSIONS = {
+    '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp',  # 图片
+    '.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv',           # 视频
+    '.mp3', '.wav', '.ogg', '.flac', '.aac',                  # 音频
+    '.ttf', '.otf', '.woff', '.woff2',                        # 字体
+    '.pdf', '.txt', '.md'                                     # 文档
+}
+
+# 每批提交的素材数
+COMMIT_BATCH_SIZE = 200
+# 文件数少于此值时缩略图在线程池中生成，省去启动进程的开销
+PROCESS_POOL_MIN_FILES = 64
+
+
+def scan_directory(directory: Path, recursive: bool = True) -> Iterator[Path]:
+    """用 os.scandir 遍历目录中支持的文件"""
+    stack = [directory]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        if recursive:
+                            stack.append(Path(entry.path))
+                    elif entry.is_file() and os.path.splitext(entry.name)[1].lower() in SUPPORTED_EXTENSIONS:
+                        yield Path(entry.path)
+        except OSError as e:
+            logger.warning(f"无法读取目录 {current}: {e}")
+
+
+class AssetImportPipeline:
+    """批量素材导入流水线"""
+
+    def __init__(self, manager: AssetManager, category: str = "导入",
+                 tags: Optional[List[str]] = None,
+                 hash_workers: Optional[int] = None,
+                 thumbnail_workers: Optional[int] = None,
+                 batch_size: int = COMMIT_BATCH_SIZE):
+        self.manager = manager
+        self.category = category
+        self.tags = tags
+        self.hash_workers = hash_workers or min(8, (os.cpu_count() or 1) * 2)
+        self.thumbnail_workers = thumbnail_workers or max(1, (os.cpu_count() or 2) - 1)
+        self.batch_size = batch_size
+
+    def _prepare_asset(self, file_path: str) -> Optional[EnhancedAsset]:
+        """哈希与元数据阶段（线程池）"""
+        try:
+            asset = EnhancedAsset(
+                asset_id="",
+                name=Path(file_path).name,
+                file_path=file_path,
+                asset_type=AssetType.UNKNOWN,
+                category=self.category,
+                tags=set(self.tags) if self.tags else set()
+            )
+            asset.metadata.hash_algorithm = self.manager.hash_algorithm
+            asset.update_metadata(self.manager.fingerprint_index)
+            return asset
+        except Exception as e:
+            logger.error(f"读取素材失败 {file_path}: {e}")
+            return None
+
+    def _create_thumbnail_pool(self, file_count: int):
+        if file_count >= PROCESS_POOL_MIN_FILES:
+            try:
+                # spawn 避免在已有Qt线程的进程中fork
+                return ProcessPoolExecutor(self.thumbnail_workers,
+                                           mp_context=multiprocessing.get_context("spawn"))
+            except (OSError, ValueError) as e:
+                logger.warning(f"无法创建缩略图进程池，改用线程池: {e}")
+        return ThreadPoolExecutor(self.thumbnail_workers)
+
+    def run(self, directory: str, recursive: bool = True,
+            progress_callback: Optional[Callable[[int, int], None]] = None,
+            batch_callback: Optional[Callable[[List[EnhancedAsset]], None]] = None,
+            should_stop: Optional[Callable[[], bool]] = None) -> List[EnhancedAsset]:
+        """执行导入，返回本次导入的素材"""
+        directory = Path(directory)
+        if not directory.exists():
+            logger.error(f"目录不存在: {directory}")
+            return []
+
+        # 阶段1：扫描，跳过已导入的文件
+        paths = [str(path.resolve()) for path in scan_directory(directory, recursive)]
+        paths = [path for path in dict.fromkeys(paths) if path not in self.manager.path_index]
+        total = len(paths)
+        if progress_callback:
+            progress_callback(0, total)
+        if not paths:
+            return []
+
+        imported: List[EnhancedAsset] = []
+        pending: List[EnhancedAsset] = []
+        completed = 0
+        # 同时在途的任务数上限，避免一次性为所有文件创建任务
+        window = (self.hash_workers + self.thumbnail_workers) * 4
+        thumbnail_dir = str(self.manager.thumbnail_dir)
+
+        def commit():
+            if not pending:
+                return
+            batch = list(pending)
+            pending.clear()
+            self.manager.commit_assets(batch)
+            imported.extend(batch)
+            if batch_callback:
+                batch_callback(batch)
+
+        hash_pool = ThreadPoolExecutor(self.hash_workers)
+        thumbnail_pool = self._create_thumbnail_pool(total)
+        hash_futures: Dict[Future, str] = {}
+        thumbnail_futures: Dict[Future, EnhancedAsset] = {}
+        next_path = 0
+        cancelled = False
+
+        try:
+            while True:
+                if should_stop and should_stop():
+                    cancelled = True
+                    break
+
+                # 阶段2：补充哈希与元数据任务
+                while next_path < total and len(hash_futures) + len(thumbnail_futures) < window:
+                    path = paths[next_path]
+                    next_path += 1
+                    hash_futures[hash_pool.submit(self._prepare_asset, path)] = path
+
+                if not hash_futures and not thumbnail_futures:
+                    break
+
+                done, _ = wait(list(hash_futures) + list(thumbnail_futures),
+                               timeout=0.1, return_when=FIRST_COMPLETED)
+
+                for future in done:
+                    if future in hash_futures:
+                        del hash_futures[future]
+                        asset = future.result()
+                        if asset is None:
+                            completed += 1
+                            continue
+                        # 阶段3：缩略图
+                        thumbnail_future = thumbnail_pool.submit(
+                            generate_thumbnails_job, thumbnail_dir, asset.file_path,
+                            asset.asset_type.value, asset.asset_id
+                        )
+                        thumbnail_futures[thumbnail_future] = asset
+                    else:
+                        asset = thumbnail_futures.pop(future)
+                        try:
+                            self.manager.apply_thumbnails(asset, future.result())
+                        except Exception as e:
+                            logger.error(f"生成缩略图失败 {asset.name}: {e}")
+                        pending.append(asset)
+                        completed += 1
+
+                if done and progress_callback:
+                    progress_callback(completed, total)
+
+                # 阶段4：分批提交
+                if len(pending) >= self.batch_size:
+                    commit()
+
+            commit()
+
+        finally:
+            # 取消尚未开始的任务（Python 3.8 的 shutdown 不支持 cancel_futures）
+            for future in list(hash_futures) + list(thumbnail_futures):
+                future.cancel()
+            hash_pool.shutdown(wait=not cancelled)
+            thumbnail_pool.shutdown(wait=not cancelled)
+
+        if cancelled:
+            logger.info(f"批量导入已取消，已导入 {len(imported)}/{total} 个素材")
+        else:
+            logger.info(f"批量导入完成，共导入 {len(imported)} 个素材")
+        return imported
+
+
+class BatchImportThread(QThread):
+    """批量导入线程"""
+
+    progress_changed = pyqtSignal(int, int)  # 已完成数, 总数
+    batch_imported = pyqtSignal(list)  # 本批导入的素材
+    import_finished = pyqtSignal(list)  # 全部导入的素材
+    import_failed = pyqtSignal(str)  # 错误信息
+
+    def __init__(self, manager: AssetManager, directory: str, recursive: bool = True,
+                 category: str = "导入", tags: Optional[List[str]] = None):
+        super().__init__()
+        self.manager = manager
+        self.directory = directory
+        self.recursive = recursive
+        self.category = category
+        self.tags = tags
+        self.should_stop = False
+
+    def run(self):
+        try:
+            imported = self.manager.batch_import(
+                self.directory, self.recursive, self.category, self.tags,
+                progress_callback=self.progress_changed.emit,
+                batch_callback=self.batch_imported.emit,
+                should_stop=lambda: self.should_stop
+            )
+            self.import_finished.emit(imported)
+        except Exception as e:
+            logger.error(f"批量导入失败 {self.directory}: {e}")
+            self.import_failed.emit(str(e))
+
+    def stop(self):
+        """取消导入"""
+        self.should_stop = True
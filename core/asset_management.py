@@ -14,6 +14,8 @@ from datetime import datetime
 from enum import Enum
 import logging
 
+from .file_fingerprint import FileFingerprintIndex, DEFAULT_HASH_ALGORITHM, hash_file
+
 logger = logging.getLogger(__name__)
 
 class AssetType(Enum):
@@ -42,6 +44,7 @@ class AssetMetadata:
     # 基本信息
     file_size: int = 0
     file_hash: str = ""
+    hash_algorithm: str = DEFAULT_HASH_ALGORITHM
     mime_type: str = ""
     
     # 媒体信息
@@ -161,22 +164,28 @@ class EnhancedAsset:
         else:
             return AssetType.UNKNOWN
     
-    def update_metadata(self):
-        """更新元数据"""
+    def update_metadata(self, fingerprint_index: Optional[FileFingerprintIndex] = None):
+        """更新元数据
+
+        Args:
+            fingerprint_index: 文件指纹索引；提供时未变化的文件不重新计算哈希
+        """
         try:
             if not Path(self.file_path).exists():
                 self.status = AssetStatus.MISSING
                 return
             
-            file_stat = Path(self.file_path).stat()
+            # 分块计算文件哈希
+            algorithm = self.metadata.hash_algorithm
+            if fingerprint_index:
+                self.metadata.file_hash, file_stat = fingerprint_index.digest(self.file_path, algorithm)
+            else:
+                file_stat = Path(self.file_path).stat()
+                self.metadata.file_hash = hash_file(self.file_path, algorithm)
+            
             self.metadata.file_size = file_stat.st_size
             self.modified_at = datetime.fromtimestamp(file_stat.st_mtime)
             
-            # 计算文件哈希
-            with open(self.file_path, 'rb') as f:
-                content = f.read()
-                self.metadata.file_hash = hashlib.md5(content).hexdigest()
-            
             # 获取MIME类型
             self.metadata.mime_type, _ = mimetypes.guess_type(self.file_path)
             
@@ -219,6 +228,7 @@ class EnhancedAsset:
             'metadata': {
                 'file_size': self.metadata.file_size,
                 'file_hash': self.metadata.file_hash,
+                'hash_algorithm': self.metadata.hash_algorithm,
                 'mime_type': self.metadata.mime_type,
                 'width': self.metadata.width,
                 'height': self.metadata.height,
@@ -282,6 +292,7 @@ class EnhancedAsset:
             asset.metadata = AssetMetadata(
                 file_size=meta.get('file_size', 0),
                 file_hash=meta.get('file_hash', ''),
+                hash_algorithm=meta.get('hash_algorithm', DEFAULT_HASH_ALGORITHM),
                 mime_type=meta.get('mime_type', ''),
                 width=meta.get('width'),
                 height=meta.get('height'),
@@ -389,7 +400,19 @@ class AssetSearchFilter:
 
 
 class AssetIndex:
-    """素材索引 - 用于快速搜索"""
+    """素材索引 - 用于快速搜索
+
+    名称词和标签组成词表，词表上建立1~3字符的n-gram倒排（n-gram -> 包含它的词），
+    子串查询先用n-gram定位候选词再合并这些词的素材集合，不再扫描整个词表。
+    每个素材记录自己被加入的词，移除时只触及这些词。
+    """
+
+    # 词表n-gram的最大长度；更长的查询词取其三元组的交集后再校验
+    GRAM_SIZE = 3
+    # 缓存最近查询词的候选词，逐字输入时在上一次结果中过滤
+    TERM_CACHE_SIZE = 64
+    # 候选素材超过此数量时不再排序，保持素材库顺序
+    RANK_MAX_RESULTS = 1000
 
     def __init__(self):
         self.name_index: Dict[str, Set[str]] = {}      # 名称索引
@@ -398,22 +421,73 @@ class AssetIndex:
         self.category_index: Dict[str, Set[str]] = {}   # 分类索引
         self.hash_index: Dict[str, str] = {}           # 哈希索引（去重）
 
+        self.term_index: Dict[str, Set[str]] = {}      # 词（名称词或标签） -> 素材ID
+        self.gram_index: Dict[str, Set[str]] = {}      # n-gram -> 词
+        self.asset_terms: Dict[str, Tuple] = {}        # 素材ID -> (名称词, 标签, 类型, 分类, 哈希)
+        self.asset_text: Dict[str, str] = {}           # 素材ID -> 换行分隔的名称词和标签
+        self._term_cache: Dict[str, Set[str]] = {}     # 查询词 -> 候选词
+
+    @classmethod
+    def _grams(cls, term: str) -> Set[str]:
+        """词的全部1~3字符子串"""
+        grams = set()
+        for n in range(1, cls.GRAM_SIZE + 1):
+            for i in range(len(term) - n + 1):
+                grams.add(term[i:i + n])
+        return grams
+
+    def _add_term(self, index: Dict[str, Set[str]], term: str, asset_id: str):
+        if term not in self.term_index:
+            self.term_index[term] = set()
+            for gram in self._grams(term):
+                self.gram_index.setdefault(gram, set()).add(term)
+            self._term_cache.clear()
+        self.term_index[term].add(asset_id)
+        index.setdefault(term, set()).add(asset_id)
+
+    def _remove_term(self, index: Dict[str, Set[str]], other: Dict[str, Set[str]],
+                     term: str, asset_id: str):
+        asset_ids = index.get(term)
+        if asset_ids is None:
+            return
+        asset_ids.discard(asset_id)
+        if not asset_ids:
+            del index[term]
+
+        # 同一个词可能既是名称词又是标签
+        if asset_id in other.get(term, ()):
+            return
+        asset_ids = self.term_index.get(term)
+        if asset_ids is None:
+            return
+        asset_ids.discard(asset_id)
+        if asset_ids:
+            return
+
+        del self.term_index[term]
+        for gram in self._grams(term):
+            terms = self.gram_index.get(gram)
+            if terms is not None:
+                terms.discard(term)
+                if not terms:
+                    del self.gram_index[gram]
+        self._term_cache.clear()
+
     def add_asset(self, asset: EnhancedAsset):
         """添加素材到索引"""
         asset_id = asset.asset_id
+        if asset_id in self.asset_terms:
+            self.remove_asset(asset)
 
         # 名称索引
-        name_words = asset.name.lower().split()
+        name_words = tuple(set(asset.name.lower().split()))
         for word in name_words:
-            if word not in self.name_index:
-                self.name_index[word] = set()
-            self.name_index[word].add(asset_id)
+            self._add_term(self.name_index, word, asset_id)
 
         # 标签索引
-        for tag in asset.tags:
-            if tag not in self.tag_index:
-                self.tag_index[tag] = set()
-            self.tag_index[tag].add(asset_id)
+        tags = tuple(asset.tags)
+        for tag in tags:
+            self._add_term(self.tag_index, tag, asset_id)
 
         # 类型索引
         if asset.asset_type not in self.type_index:
@@ -429,54 +503,139 @@ class AssetIndex:
         if asset.metadata.file_hash:
             self.hash_index[asset.metadata.file_hash] = asset_id
 
+        self.asset_terms[asset_id] = (name_words, tags, asset.asset_type,
+                                      asset.category, asset.metadata.file_hash)
+        self.asset_text[asset_id] = "\n".join(name_words + tags)
+
     def remove_asset(self, asset: EnhancedAsset):
         """从索引中移除素材"""
         asset_id = asset.asset_id
+        terms = self.asset_terms.pop(asset_id, None)
+        if terms is None:
+            return
+        name_words, tags, asset_type, category, file_hash = terms
+        del self.asset_text[asset_id]
 
-        # 从各个索引中移除
-        for word_set in self.name_index.values():
-            word_set.discard(asset_id)
+        # 只从该素材加入过的词中移除
+        for word in name_words:
+            self._remove_term(self.name_index, self.tag_index, word, asset_id)
 
-        for tag_set in self.tag_index.values():
-            tag_set.discard(asset_id)
+        for tag in tags:
+            self._remove_term(self.tag_index, self.name_index, tag, asset_id)
 
-        for type_set in self.type_index.values():
+        type_set = self.type_index.get(asset_type)
+        if type_set is not None:
             type_set.discard(asset_id)
 
-        for category_set in self.category_index.values():
+        category_set = self.category_index.get(category)
+        if category_set is not None:
             category_set.discard(asset_id)
+            if not category_set:
+                del self.category_index[category]
 
         # 从哈希索引中移除
-        if asset.metadata.file_hash in self.hash_index:
-            del self.hash_index[asset.metadata.file_hash]
+        if file_hash and self.hash_index.get(file_hash) == asset_id:
+            del self.hash_index[file_hash]
+
+    def _matching_terms(self, word: str) -> Set[str]:
+        """包含查询词的所有词"""
+        cached = self._term_cache.get(word)
+        if cached is not None:
+            return cached
+
+        # 逐字输入：新查询词包含上一个查询词时，候选词只可能在上一次的结果中
+        terms = None
+        for previous in (word[:-1], word[1:]):
+            previous_terms = self._term_cache.get(previous) if previous else None
+            if previous_terms is not None:
+                terms = {term for term in previous_terms if word in term}
+                break
+
+        if terms is None:
+            if len(word) <= self.GRAM_SIZE:
+                # 直接引用倒排中的集合；词表变化时缓存会被清空
+                terms = self.gram_index.get(word, set())
+            else:
+                gram_sets = []
+                for i in range(len(word) - self.GRAM_SIZE + 1):
+                    gram_terms = self.gram_index.get(word[i:i + self.GRAM_SIZE])
+                    if not gram_terms:
+                        gram_sets = []
+                        break
+                    gram_sets.append(gram_terms)
+                if gram_sets:
+                    gram_sets.sort(key=len)
+                    # 三元组都出现不代表连续出现，需要校验
+                    terms = {term for term in gram_sets[0].intersection(*gram_sets[1:])
+                             if word in term}
+                else:
+                    terms = set()
+
+        if len(self._term_cache) >= self.TERM_CACHE_SIZE:
+            self._term_cache.pop(next(iter(self._term_cache)))
+        self._term_cache[word] = terms
+        return terms
+
+    def _search_word(self, terms: Set[str]) -> Set[str]:
+        term_index = self.term_index
+        return set().union(*[term_index[term] for term in terms])
+
+    def _filter_by_word(self, asset_ids: Set[str], word: str) -> Set[str]:
+        """通过素材自己的检索文本筛选已有结果（查询词匹配的词比结果还多时更快）"""
+        # 检索文本以换行分隔各词，查询词不含空白，不会跨词匹配
+        asset_text = self.asset_text
+        return {asset_id for asset_id in asset_ids if word in asset_text[asset_id]}
 
     def search_by_text(self, query: str) -> Set[str]:
         """按文本搜索"""
         if not query:
             return set()
 
-        words = query.lower().split()
-        result_sets = []
-
-        for word in words:
-            word_results = set()
-
-            # 在名称索引中搜索
-            for indexed_word, asset_ids in self.name_index.items():
-                if word in indexed_word:
-                    word_results.update(asset_ids)
+        # 匹配词最少的查询词先算，后面的词再与之求交集（所有词都要匹配）
+        word_terms = sorted(((self._matching_terms(word), word) for word in set(query.lower().split())),
+                            key=lambda item: len(item[0]))
+        results = None
+        for terms, word in word_terms:
+            if not terms:
+                return set()
+            if results is None:
+                results = self._search_word(terms)
+            elif len(terms) > len(results):
+                results = self._filter_by_word(results, word)
+            else:
+                results &= self._search_word(terms)
+            if not results:
+                return set()
+
+        return results if results is not None else set()
+
+    @staticmethod
+    def _term_score(word: str, term: str) -> float:
+        if word not in term:
+            return 0.0
+        if term == word:
+            score = 3.0
+        elif term.startswith(word):
+            score = 2.0
+        else:
+            score = 1.0
+        # 匹配部分占词长的比例越高越相关
+        return score + len(word) / len(term)
 
-            # 在标签索引中搜索
-            for tag, asset_ids in self.tag_index.items():
-                if word in tag:
-                    word_results.update(asset_ids)
+    def rank_by_text(self, query: str, asset_ids: Set[str]) -> List[str]:
+        """按匹配程度排序：完全匹配 > 前缀匹配 > 子串匹配，名称优先于标签"""
+        words = set(query.lower().split())
 
-            result_sets.append(word_results)
+        def score(asset_id: str) -> float:
+            name_words, tags = self.asset_terms[asset_id][:2]
+            total = 0.0
+            for word in words:
+                total += max((self._term_score(word, term) for term in name_words), default=0.0)
+                total += 0.5 * max((self._term_score(word, tag) for tag in tags), default=0.0)
+            return total
 
-        # 取交集（所有词都要匹配）
-        if result_sets:
-            return set.intersection(*result_sets)
-        return set()
+        scores = {asset_id: score(asset_id) for asset_id in asset_ids}
+        return sorted(asset_ids, key=lambda asset_id: (-scores[asset_id], asset_id))
 
     def find_duplicates(self) -> Dict[str, List[str]]:
         """查找重复文件"""
@@ -498,11 +657,16 @@ class AssetIndex:
 class AssetManager:
     """专业素材管理器 - 核心管理类"""
 
-    def __init__(self, project_path: str = None):
+    def __init__(self, project_path: str = None, hash_algorithm: str = DEFAULT_HASH_ALGORITHM):
         self.project_path = Path(project_path) if project_path else None
         self.assets: Dict[str, EnhancedAsset] = {}
+        self.path_index: Dict[str, str] = {}  # 文件路径 -> 素材ID
         self.index = AssetIndex()
         self.cache_dir = self._setup_cache_dir()
+
+        # 文件指纹索引：未变化的文件跨会话复用哈希
+        self.hash_algorithm = hash_algorithm
+        self.fingerprint_index = FileFingerprintIndex(self.cache_dir / "fingerprints.db")
         self.thumbnail_dir = self.cache_dir / "thumbnails"
         self.thumbnail_dir.mkdir(exist_ok=True)
 
@@ -558,14 +722,14 @@ class AssetManager:
             )
 
             # 更新元数据
-            asset.update_metadata()
+            asset.metadata.hash_algorithm = self.hash_algorithm
+            asset.update_metadata(self.fingerprint_index)
 
             # 生成缩略图
             self._generate_thumbnails_for_asset(asset)
 
             # 添加到管理器
-            self.assets[asset.asset_id] = asset
-            self.index.add_asset(asset)
+            self._register_asset(asset)
             self._update_stats()
 
             logger.info(f"已添加素材: {asset.name} ({asset.asset_type.value})")
@@ -591,6 +755,8 @@ class AssetManager:
 
             # 从字典中移除
             del self.assets[asset_id]
+            if self.path_index.get(asset.file_path) == asset_id:
+                del self.path_index[asset.file_path]
 
             self._update_stats()
             logger.info(f"已移除素材: {asset.name}")
@@ -607,10 +773,21 @@ class AssetManager:
     def find_by_path(self, file_path: str) -> Optional[EnhancedAsset]:
         """根据文件路径查找素材"""
         file_path = str(Path(file_path).resolve())
-        for asset in self.assets.values():
-            if asset.file_path == file_path:
-                return asset
-        return None
+        asset_id = self.path_index.get(file_path)
+        return self.assets.get(asset_id) if asset_id else None
+
+    def _register_asset(self, asset: EnhancedAsset):
+        """把素材加入管理器和各个索引（不更新统计）"""
+        self.assets[asset.asset_id] = asset
+        self.path_index[asset.file_path] = asset.asset_id
+        self.index.add_asset(asset)
+
+    def commit_assets(self, assets: List[EnhancedAsset]):
+        """批量加入素材，整批只更新一次统计"""
+        for asset in assets:
+            self._register_asset(asset)
+        if assets:
+            self._update_stats()
 
     def search(self, filter_obj: AssetSearchFilter) -> List[EnhancedAsset]:
         """搜索素材"""
@@ -624,13 +801,18 @@ class AssetManager:
                 if not candidate_ids:
                     return []
 
-            # 遍历素材进行过滤
-            for asset_id, asset in self.assets.items():
-                # 如果有候选ID列表，只检查候选素材
-                if candidate_ids is not None and asset_id not in candidate_ids:
-                    continue
+            # 有候选ID时只检查候选素材，并按相关度排序
+            if candidate_ids is not None and len(candidate_ids) <= AssetIndex.RANK_MAX_RESULTS:
+                asset_ids = self.index.rank_by_text(filter_obj.text_query, candidate_ids)
+            elif candidate_ids is not None:
+                asset_ids = [asset_id for asset_id in self.assets if asset_id in candidate_ids]
+            else:
+                asset_ids = list(self.assets)
 
-                if filter_obj.matches(asset):
+            # 遍历素材进行过滤
+            for asset_id in asset_ids:
+                asset = self.assets.get(asset_id)
+                if asset is not None and filter_obj.matches(asset):
                     results.append(asset)
 
             return results
@@ -687,7 +869,10 @@ class AssetManager:
         return result
 
     def verify_assets(self) -> Dict[str, List[str]]:
-        """验证所有素材文件"""
+        """验证所有素材文件
+
+        只检查文件状态（大小和修改时间）；状态变化的文件才重新计算哈希并与记录比较
+        """
         results = {
             'missing': [],
             'corrupted': [],
@@ -696,20 +881,31 @@ class AssetManager:
 
         for asset in self.assets.values():
             try:
-                if not Path(asset.file_path).exists():
+                try:
+                    file_stat = os.stat(asset.file_path)
+                except FileNotFoundError:
                     asset.status = AssetStatus.MISSING
                     results['missing'].append(asset.asset_id)
-                else:
-                    # 验证文件完整性
-                    old_hash = asset.metadata.file_hash
-                    asset.update_metadata()
+                    continue
+
+                unchanged = (file_stat.st_size == asset.metadata.file_size
+                             and datetime.fromtimestamp(file_stat.st_mtime) == asset.modified_at)
+
+                if unchanged and asset.metadata.file_hash:
+                    asset.status = AssetStatus.AVAILABLE
+                    results['valid'].append(asset.asset_id)
+                    continue
+
+                # 验证文件完整性
+                old_hash = asset.metadata.file_hash
+                asset.update_metadata(self.fingerprint_index)
 
-                    if old_hash and old_hash != asset.metadata.file_hash:
-                        asset.status = AssetStatus.ERROR
-                        results['corrupted'].append(asset.asset_id)
-                    else:
-                        asset.status = AssetStatus.AVAILABLE
-                        results['valid'].append(asset.asset_id)
+                if old_hash and old_hash != asset.metadata.file_hash:
+                    asset.status = AssetStatus.ERROR
+                    results['corrupted'].append(asset.asset_id)
+                else:
+                    asset.status = AssetStatus.AVAILABLE
+                    results['valid'].append(asset.asset_id)
 
             except Exception as e:
                 logger.error(f"验证素材失败 {asset.name}: {e}")
@@ -720,34 +916,26 @@ class AssetManager:
         return results
 
     def batch_import(self, directory: str, recursive: bool = True,
-                    category: str = "导入", tags: List[str] = None) -> List[EnhancedAsset]:
-        """批量导入素材"""
-        imported_assets = []
-        directory = Path(directory)
-
-        if not directory.exists():
-            logger.error(f"目录不存在: {directory}")
-            return imported_assets
-
-        # 支持的文件扩展名
-        supported_extensions = {
-            '.png', '.jpg', '.jpeg', '.gif', '.bmp', '.svg', '.webp',  # 图片
-            '.mp4', '.avi', '.mov', '.mkv', '.wmv', '.flv',           # 视频
-            '.mp3', '.wav', '.ogg', '.flac', '.aac',                  # 音频
-            '.ttf', '.otf', '.woff', '.woff2',                        # 字体
-            '.pdf', '.txt', '.md'                                     # 文档
-        }
-
-        # 遍历文件
-        pattern = "**/*" if recursive else "*"
-        for file_path in directory.glob(pattern):
-            if file_path.is_file() and file_path.suffix.lower() in supported_extensions:
-                asset = self.add_asset(str(file_path), category, tags)
-                if asset:
-                    imported_assets.append(asset)
-
-        logger.info(f"批量导入完成，共导入 {len(imported_assets)} 个素材")
-        return imported_assets
+                    category: str = "导入", tags: List[str] = None,
+                    progress_callback=None, batch_callback=None,
+                    should_stop=None) -> List[EnhancedAsset]:
+        """批量导入素材
+
+        扫描目录后在线程池中计算哈希和元数据、在进程池中生成缩略图，结果分批提交，
+        每批只更新一次索引和统计。
+
+        Args:
+            progress_callback: 进度回调 (已完成数, 总数)
+            batch_callback: 每提交一批素材后回调，参数为该批素材列表
+            should_stop: 返回True时取消导入，已提交的素材保留
+        """
+        from .asset_import import AssetImportPipeline
+
+        pipeline = AssetImportPipeline(self, category=category, tags=tags)
+        return pipeline.run(directory, recursive,
+                            progress_callback=progress_callback,
+                            batch_callback=batch_callback,
+                            should_stop=should_stop)
 
     def export_catalog(self, output_path: str) -> bool:
         """导出素材目录"""
@@ -779,13 +967,9 @@ class AssetManager:
                 asset = EnhancedAsset.from_dict(asset_data)
 
                 # 验证文件是否存在
-                if Path(asset.file_path).exists():
-                    self.assets[asset.asset_id] = asset
-                    self.index.add_asset(asset)
-                else:
+                if not Path(asset.file_path).exists():
                     asset.status = AssetStatus.MISSING
-                    self.assets[asset.asset_id] = asset
-                    self.index.add_asset(asset)
+                self._register_asset(asset)
 
             self._update_stats()
             logger.info(f"素材目录已导入: {len(catalog_data.get('assets', []))} 个素材")
@@ -841,18 +1025,20 @@ class AssetManager:
                 asset.asset_type.value,
                 asset.asset_id
             )
-
-            # 更新素材的缩略图信息
-            asset.thumbnail.small_path = thumbnails.get('small_path')
-            asset.thumbnail.medium_path = thumbnails.get('medium_path')
-            asset.thumbnail.large_path = thumbnails.get('large_path')
-            asset.thumbnail.generated_at = datetime.now()
+            self.apply_thumbnails(asset, thumbnails)
 
             logger.debug(f"已生成缩略图: {asset.name}")
 
         except Exception as e:
             logger.error(f"生成缩略图失败 {asset.name}: {e}")
 
+    def apply_thumbnails(self, asset: EnhancedAsset, thumbnails: Dict[str, Optional[str]]):
+        """更新素材的缩略图信息"""
+        asset.thumbnail.small_path = thumbnails.get('small_path')
+        asset.thumbnail.medium_path = thumbnails.get('medium_path')
+        asset.thumbnail.large_path = thumbnails.get('large_path')
+        asset.thumbnail.generated_at = datetime.now()
+
     def regenerate_thumbnails(self, asset_id: str = None) -> bool:
         """重新生成缩略图"""
         try:
@@ -0,0 +1,113 @@
+"""
+AI Animation Studio - 批量音频分析
+基于跨步窗口视图的向量化STFT、RMS包络和峰值检测，按块处理以限制长音频的内存占用
+"""
+
+from typing import Callable, Optional, List
+
+import numpy as np
+
+# 每个处理块包含的帧数（STFT）或样本数（包络）
+STFT_CHUNK_FRAMES = 1024
+ENVELOPE_CHUNK_SAMPLES = 1 << 22
+
+
+def to_mono(samples: np.ndarray) -> np.ndarray:
+    """多声道音频混合为单声道"""
+    if samples.ndim == 1:
+        return samples
+    return samples.mean(axis=1)
+
+
+def frame_signal(samples: np.ndarray, frame_size: int, hop_size: int) -> np.ndarray:
+    """返回信号的分帧视图 (帧数, frame_size)，不复制数据"""
+    if len(samples) < frame_size:
+        return np.empty((0, frame_size), dtype=samples.dtype)
+    windows = np.lib.stride_tricks.sliding_window_view(samples, frame_size)
+    return windows[::hop_size]
+
+
+def stft_magnitude(samples: np.ndarray, window_size: int = 2048, hop_size: Optional[int] = None,
+                   max_frames: Optional[int] = None,
+                   should_stop: Optional[Callable[[], bool]] = None) -> np.ndarray:
+    """计算幅度谱
+
+    Args:
+        samples: 单声道样本
+        window_size: 窗口大小
+        hop_size: 帧移，默认 window_size // 4
+        max_frames: 最多输出的帧数；音频较长时自动增大帧移，使结果大小有界
+        should_stop: 返回True时提前结束
+
+    Returns:
+        形状为 (window_size // 2, 帧数) 的float32幅度谱
+    """
+    hop_size = hop_size or window_size // 4
+    # 与逐帧实现保持一致：最后一个起点严格小于 len - window_size
+    usable = len(samples) - window_size
+    if usable <= 0:
+        return np.empty((window_size // 2, 0), dtype=np.float32)
+
+    if max_frames:
+        hop_size = max(hop_size, -(-usable // max_frames))
+
+    frames = frame_signal(samples[:len(samples) - 1], window_size, hop_size)
+    frame_count = len(range(0, usable, hop_size))
+    frames = frames[:frame_count]
+
+    spectrogram = np.empty((frame_count, window_size // 2), dtype=np.float32)
+    for start in range(0, frame_count, STFT_CHUNK_FRAMES):
+        if should_stop and should_stop():
+            spectrogram = spectrogram[:start]
+            break
+        chunk = frames[start:start + STFT_CHUNK_FRAMES]
+        spectrum = np.fft.rfft(chunk, axis=1)[:, :window_size // 2]
+        spectrogram[start:start + len(chunk)] = np.abs(spectrum)
+
+    return spectrogram.T
+
+
+def rms_envelope(samples: np.ndarray, window_size: int,
+                 should_stop: Optional[Callable[[], bool]] = None) -> np.ndarray:
+    """计算不重叠窗口的RMS包络（最后一个不完整窗口按实际长度计算）"""
+    if window_size <= 0 or len(samples) == 0:
+        return np.array([])
+
+    full_windows = len(samples) // window_size
+    has_tail = len(samples) % window_size != 0
+    envelope = np.empty(full_windows + int(has_tail), dtype=np.float64)
+
+    windows_per_chunk = max(1, ENVELOPE_CHUNK_SAMPLES // window_size)
+    for start in range(0, full_windows, windows_per_chunk):
+        if should_stop and should_stop():
+            return envelope[:start]
+        end = min(full_windows, start + windows_per_chunk)
+        block = np.asarray(samples[start * window_size:end * window_size], dtype=np.float64)
+        block = block.reshape(end - start, window_size)
+        envelope[start:end] = np.sqrt(np.einsum('ij,ij->i', block, block) / window_size)
+
+    if has_tail:
+        tail = np.asarray(samples[full_windows * window_size:], dtype=np.float64)
+        envelope[-1] = np.sqrt(np.mean(tail ** 2))
+
+    return envelope
+
+
+def pick_peaks(values: np.ndarray, threshold: float) -> np.ndarray:
+    """返回严格局部极大且超过阈值的点的索引"""
+    if len(values) < 3:
+        return np.array([], dtype=np.int64)
+    slope = np.diff(values)
+    is_peak = (slope[:-1] > 0) & (slope[1:] < 0) & (values[1:-1] > threshold)
+    return np.flatnonzero(is_peak) + 1
+
+
+def detect_beats(envelope: np.ndarray, sample_count: int, sample_rate: int) -> List[float]:
+    """根据RMS包络检测节拍时间点（秒）"""
+    if len(envelope) == 0:
+        return []
+
+    threshold = np.mean(envelope) + np.std(envelope)
+    peaks = pick_peaks(envelope, threshold)
+    seconds_per_window = (sample_count / len(envelope)) / sample_rate
+    return (peaks * seconds_per_window).tolist()
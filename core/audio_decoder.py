@@ -0,0 +1,247 @@
+"""
+AI Animation Studio - 音频解码
+分块流式解码音频文件（WAV使用标准库wave，其他格式通过FFmpeg管道），
+边解码边构建波形峰值金字塔，并给出精确时长
+"""
+
+import json
+import wave
+import shutil
+import subprocess
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Iterator, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.logger import get_logger
+from core.waveform_peaks import WaveformPeaks, WaveformPeaksBuilder, load_peaks, store_peaks
+
+logger = get_logger("audio_decoder")
+
+# 每次解码的帧数（约1秒 @ 44.1kHz）
+DECODE_CHUNK_FRAMES = 65536
+DEFAULT_DECODE_SAMPLE_RATE = 44100
+
+
+class AudioDecodeError(Exception):
+    """音频解码错误"""
+    pass
+
+
+@dataclass
+class DecodedAudio:
+    """音频解码结果"""
+    file_path: str
+    sample_rate: int
+    channels: int
+    sample_count: int
+    peaks: WaveformPeaks
+    from_cache: bool = False
+
+    @property
+    def duration(self) -> float:
+        return self.sample_count / self.sample_rate if self.sample_rate else 0.0
+
+
+def _pcm_to_float(raw: bytes, sample_width: int, channels: int) -> np.ndarray:
+    """PCM字节转换为 (帧数, 声道数) 的float32数组"""
+    if sample_width == 1:
+        data = (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128.0) / 128.0
+    elif sample_width == 2:
+        data = np.frombuffer(raw, dtype='<i2').astype(np.float32) / 32768.0
+    elif sample_width == 3:
+        bytes_ = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3)
+        ints = (bytes_[:, 0].astype(np.int32)
+                | (bytes_[:, 1].astype(np.int32) << 8)
+                | (bytes_[:, 2].astype(np.int32) << 16))
+        ints = np.where(ints & 0x800000, ints - 0x1000000, ints)
+        data = ints.astype(np.float32) / 8388608.0
+    elif sample_width == 4:
+        data = np.frombuffer(raw, dtype='<i4').astype(np.float32) / 2147483648.0
+    else:
+        raise AudioDecodeError(f"不支持的采样位宽: {sample_width * 8}bit")
+    return data.reshape(-1, channels)
+
+
+def is_pcm_wave(file_path: str) -> bool:
+    """是否为标准库wave可直接读取的PCM WAV"""
+    try:
+        with wave.open(file_path, 'rb'):
+            return True
+    except (wave.Error, EOFError):
+        return False
+
+
+def ffmpeg_available() -> bool:
+    return shutil.which("ffmpeg") is not None
+
+
+def probe_audio(file_path: str) -> Tuple[int, int, float]:
+    """获取 (采样率, 声道数, 时长)；时长未知时为0"""
+    if is_pcm_wave(file_path):
+        with wave.open(file_path, 'rb') as wav:
+            rate = wav.getframerate()
+            return rate, wav.getnchannels(), wav.getnframes() / rate
+
+    if shutil.which("ffprobe") is None:
+        return DEFAULT_DECODE_SAMPLE_RATE, 1, 0.0
+
+    result = subprocess.run(
+        ["ffprobe", "-v", "error", "-select_streams", "a:0",
+         "-show_entries", "stream=sample_rate,channels:format=duration",
+         "-of", "json", file_path],
+        capture_output=True, text=True, timeout=30
+    )
+    if result.returncode != 0:
+        raise AudioDecodeError(f"无法识别音频文件: {result.stderr.strip()}")
+
+    info = json.loads(result.stdout or "{}")
+    streams = info.get("streams") or []
+    if not streams:
+        raise AudioDecodeError("文件中没有音频流")
+
+    rate = int(streams[0].get("sample_rate") or DEFAULT_DECODE_SAMPLE_RATE)
+    channels = int(streams[0].get("channels") or 1)
+    duration = float(info.get("format", {}).get("duration") or 0.0)
+    return rate, channels, duration
+
+
+def iter_wave_chunks(file_path: str, chunk_frames: int = DECODE_CHUNK_FRAMES) -> Iterator[np.ndarray]:
+    """用标准库wave分块读取PCM WAV"""
+    with wave.open(file_path, 'rb') as wav:
+        channels = wav.getnchannels()
+        sample_width = wav.getsampwidth()
+        while True:
+            raw = wav.readframes(chunk_frames)
+            if not raw:
+                break
+            yield _pcm_to_float(raw, sample_width, channels)
+
+
+def iter_ffmpeg_chunks(file_path: str, sample_rate: int, channels: int,
+                       chunk_frames: int = DECODE_CHUNK_FRAMES,
+                       should_stop: Optional[Callable[[], bool]] = None) -> Iterator[np.ndarray]:
+    """通过FFmpeg管道分块解码为float32 PCM"""
+    if not ffmpeg_available():
+        raise AudioDecodeError("未找到FFmpeg，无法解码该格式")
+
+    command = [
+        "ffmpeg", "-v", "error", "-nostdin",
+        "-i", file_path,
+        "-vn", "-f", "f32le", "-acodec", "pcm_f32le",
+        "-ac", str(channels), "-ar", str(sample_rate),
+        "-",
+    ]
+    process = subprocess.Popen(command, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
+    chunk_bytes = chunk_frames * channels * 4
+    try:
+        pending = b""
+        while True:
+            if should_stop and should_stop():
+                break
+            raw = process.stdout.read(chunk_bytes)
+            if not raw:
+                break
+            raw = pending + raw
+            usable = len(raw) - len(raw) % (channels * 4)
+            pending = raw[usable:]
+            if usable:
+                yield np.frombuffer(raw[:usable], dtype='<f4').reshape(-1, channels)
+
+        if not (should_stop and should_stop()):
+            process.wait()
+            if process.returncode != 0:
+                error = process.stderr.read().decode('utf-8', errors='replace').strip()
+                raise AudioDecodeError(f"FFmpeg解码失败: {error}")
+    finally:
+        if process.poll() is None:
+            process.kill()
+            process.wait()
+        process.stdout.close()
+        process.stderr.close()
+
+
+def decode_audio(file_path: str,
+                 progress_callback: Optional[Callable[[int], None]] = None,
+                 should_stop: Optional[Callable[[], bool]] = None,
+                 use_cache: bool = True) -> Optional[DecodedAudio]:
+    """分块解码音频并构建峰值金字塔
+
+    Returns:
+        解码结果；被取消时返回None
+    """
+    if use_cache:
+        peaks = load_peaks(file_path)
+        if peaks:
+            logger.info(f"使用已有波形峰值: {peaks.file_path}")
+            if progress_callback:
+                progress_callback(100)
+            return DecodedAudio(file_path, peaks.sample_rate, peaks.channels,
+                                peaks.sample_count, peaks, True)
+
+    sample_rate, channels, duration = probe_audio(file_path)
+    expected_frames = int(duration * sample_rate)
+
+    if is_pcm_wave(file_path):
+        chunks = iter_wave_chunks(file_path)
+    else:
+        chunks = iter_ffmpeg_chunks(file_path, sample_rate, channels, should_stop=should_stop)
+
+    builder = WaveformPeaksBuilder(sample_rate)
+    last_progress = -1
+    for chunk in chunks:
+        if should_stop and should_stop():
+            logger.info(f"音频解码已取消: {file_path}")
+            return None
+
+        builder.add_samples(chunk)
+
+        if progress_callback and expected_frames > 0:
+            progress = min(99, int(builder.sample_count * 100 / expected_frames))
+            if progress != last_progress:
+                progress_callback(progress)
+                last_progress = progress
+
+    if builder.sample_count == 0:
+        raise AudioDecodeError("音频文件中没有可解码的样本")
+
+    peaks = store_peaks(builder.finish(), file_path)
+    if progress_callback:
+        progress_callback(100)
+
+    decoded = DecodedAudio(file_path, sample_rate, channels, builder.sample_count, peaks)
+    logger.info(f"音频解码完成: {Path(file_path).name}, {decoded.duration:.3f}s, "
+                f"{sample_rate}Hz, {channels}声道")
+    return decoded
+
+
+class AudioDecodeThread(QThread):
+    """音频解码线程"""
+
+    progress_changed = pyqtSignal(int)  # 进度百分比
+    decode_finished = pyqtSignal(object)  # DecodedAudio
+    decode_failed = pyqtSignal(str)  # 错误信息
+
+    def __init__(self, file_path: str, use_cache: bool = True):
+        super().__init__()
+        self.file_path = file_path
+        self.use_cache = use_cache
+        self.should_stop = False
+
+    def run(self):
+        try:
+            decoded = decode_audio(self.file_path,
+                                   progress_callback=self.progress_changed.emit,
+                                   should_stop=lambda: self.should_stop,
+                                   use_cache=self.use_cache)
+            if decoded is not None:
+                self.decode_finished.emit(decoded)
+        except Exception as e:
+            logger.error(f"音频解码失败 {self.file_path}: {e}")
+            self.decode_failed.emit(str(e))
+
+    def stop(self):
+        """停止解码"""
+        self.should_stop = True
@@ -12,6 +12,7 @@ from PyQt6.QtCore import QObject, QTimer, pyqtSignal
 from PyQt6.QtWidgets import QMessageBox
 
 from core.logger import get_logger
+from core.project_store import ChunkedProjectStore
 
 logger = get_logger("auto_save_manager")
 
@@ -121,19 +122,29 @@ class AutoSaveManager(QObject):
             # 发出自动保存信号
             self.auto_save_triggered.emit()
             
-            # 生成自动保存文件名
+            # 每个项目增量保存到同一个工作清单，清单的保存令牌与项目变更日志的检查点对应，
+            # 只有自上次自动保存以来修改过的实体会被序列化
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             project_name = self.project_manager.current_project.name
+            working_file = self.auto_save_dir / f"{project_name}_autosave.aas"
             auto_save_file = self.auto_save_dir / f"{project_name}_auto_{timestamp}.aas"
-            
-            # 执行保存
-            success = self.project_manager.save_project(
-                file_path=auto_save_file,
-                create_backup=False,
-                incremental=True
-            )
-            
+
+            # 自动保存不改变项目的保存位置
+            project_file = self.project_manager.project_file
+            try:
+                success = self.project_manager.save_project(
+                    file_path=working_file,
+                    create_backup=False,
+                    incremental=True
+                )
+            finally:
+                self.project_manager.project_file = project_file
+
             if success:
+                # 历史快照只复制清单，数据块与工作清单共享
+                if not ChunkedProjectStore(working_file).copy_manifest(auto_save_file):
+                    shutil.copy2(working_file, auto_save_file)
+
                 self.last_auto_save = datetime.now()
                 self.operation_count = 0
                 self.has_unsaved_changes = False
@@ -164,6 +175,10 @@ class AutoSaveManager(QObject):
             for file_to_delete in auto_save_files[max_files:]:
                 file_to_delete.unlink()
                 logger.debug(f"删除旧的自动保存文件: {file_to_delete.name}")
+
+            # 自动保存共享数据块，删除清单后回收不再被引用的数据块
+            if len(auto_save_files) > max_files:
+                ChunkedProjectStore.collect_garbage(self.auto_save_dir)
                 
         except Exception as e:
             logger.error(f"清理自动保存文件失败: {e}")
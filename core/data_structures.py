@@ -4,11 +4,14 @@ AI Animation Studio - 核心数据结构
 """
 
 import uuid
+from bisect import bisect_right
 from dataclasses import dataclass, field
 from typing import Dict, List, Optional, Any, Tuple
 from enum import Enum
 from datetime import datetime
 
+from core.interval_index import IntervalIndex
+
 class ElementType(Enum):
     """元素类型"""
     TEXT = "text"
@@ -296,6 +299,84 @@ class AnimationSolution:
                 end_states[state.element_id] = state
         return end_states
 
+@dataclass
+class ChangeJournal:
+    """变更日志
+
+    每次修改都会递增全局代数（generation），并记录被修改实体的ID。
+    保存、自动保存、舞台重绘和撤销系统可以通过 changes_since(N)
+    以 O(变更数) 的代价得知自第 N 代以来哪些实体发生了变化。
+    """
+    generation: int = 0
+    max_log_size: int = 10000
+    # 追加式日志: (代数, 实体类别, 实体ID)，代数严格递增
+    log: List[Tuple[int, str, str]] = field(default_factory=list)
+    # 与 log 平行的代数列表，供二分查找使用
+    log_generations: List[int] = field(default_factory=list)
+    # 每个实体最后一次被修改时的代数
+    entity_generations: Dict[Tuple[str, str], int] = field(default_factory=dict)
+    # 日志被压缩后，早于此代数的变更只能从 entity_generations 中推算
+    floor_generation: int = 0
+    # 保存检查点: 保存令牌 -> 保存时的代数
+    checkpoints: Dict[str, int] = field(default_factory=dict)
+
+    def __setstate__(self, state):
+        """兼容缓存中没有平行代数列表的日志"""
+        if 'log_generations' not in state:
+            state['log_generations'] = [entry[0] for entry in state.get('log', [])]
+        self.__dict__.update(state)
+
+    def record(self, kind: str, entity_id: str) -> int:
+        """记录一次实体修改，返回新的代数"""
+        self.generation += 1
+        self.log.append((self.generation, kind, entity_id))
+        self.log_generations.append(self.generation)
+        self.entity_generations[(kind, entity_id)] = self.generation
+
+        if len(self.log) > self.max_log_size:
+            self._compact()
+
+        return self.generation
+
+    def _compact(self):
+        """丢弃较旧的一半日志"""
+        keep_from = len(self.log) // 2
+        self.floor_generation = self.log[keep_from - 1][0]
+        self.log = self.log[keep_from:]
+        self.log_generations = self.log_generations[keep_from:]
+
+    def changes_since(self, generation: int) -> Dict[str, set]:
+        """获取自指定代数以来被修改的实体ID，按实体类别分组"""
+        changes: Dict[str, set] = {}
+
+        if generation < self.floor_generation:
+            # 所需日志已被压缩，退化为扫描每个实体的最后修改代数
+            for (kind, entity_id), entity_generation in self.entity_generations.items():
+                if entity_generation > generation:
+                    changes.setdefault(kind, set()).add(entity_id)
+            return changes
+
+        start = bisect_right(self.log_generations, generation)
+        for _, kind, entity_id in self.log[start:]:
+            changes.setdefault(kind, set()).add(entity_id)
+        return changes
+
+    def entity_generation(self, kind: str, entity_id: str) -> int:
+        """获取实体最后一次被修改时的代数（从未修改过返回0）"""
+        return self.entity_generations.get((kind, entity_id), 0)
+
+    def add_checkpoint(self, token: str, max_checkpoints: int = 16):
+        """记录一个保存检查点（当前代数对应磁盘上的某个保存结果）"""
+        self.checkpoints[token] = self.generation
+        while len(self.checkpoints) > max_checkpoints:
+            self.checkpoints.pop(next(iter(self.checkpoints)))
+
+    def get_checkpoint(self, token: Optional[str]) -> Optional[int]:
+        """获取保存检查点对应的代数"""
+        if token is None:
+            return None
+        return self.checkpoints.get(token)
+
 @dataclass
 class Project:
     """项目数据"""
@@ -319,17 +400,49 @@ class Project:
     settings: Optional[Dict[str, Any]] = field(default_factory=dict)  # 项目设置
     saved_at: Optional[datetime] = None  # 最后保存时间
     assets: List['Asset'] = field(default_factory=list)  # 项目素材列表
-    
+
+    # 变更日志：记录每次修改的实体，供增量保存和局部重绘使用
+    journal: ChangeJournal = field(default_factory=ChangeJournal, repr=False, compare=False)
+
+    def __getstate__(self):
+        """时间段索引不随项目缓存，加载后按需重建"""
+        state = self.__dict__.copy()
+        state.pop('_segment_index', None)
+        return state
+
+    def __setstate__(self, state):
+        """兼容旧缓存中没有变更日志的项目"""
+        state.setdefault('journal', ChangeJournal())
+        self.__dict__.update(state)
+
+    def mark_dirty(self, kind: str, entity_id: str):
+        """记录实体已修改
+
+        kind 取值: "elements"、"time_segments"、"animation_solutions"
+        直接修改元素属性（如 element.position.x = ...）的代码应调用此方法
+        """
+        self.journal.record(kind, entity_id)
+        self.modified_at = datetime.now()
+
+    @property
+    def generation(self) -> int:
+        """当前变更代数"""
+        return self.journal.generation
+
+    def changes_since(self, generation: int) -> Dict[str, set]:
+        """获取自指定代数以来被修改的实体ID"""
+        return self.journal.changes_since(generation)
+
     def add_element(self, element: Element):
         """添加元素"""
         self.elements[element.element_id] = element
-        self.modified_at = datetime.now()
+        self.mark_dirty("elements", element.element_id)
 
     def remove_element(self, element_id: str):
         """移除元素"""
         if element_id in self.elements:
             del self.elements[element_id]
-            self.modified_at = datetime.now()
+            self.mark_dirty("elements", element_id)
 
     def add_asset(self, asset: 'Asset'):
         """添加素材"""
@@ -343,16 +456,45 @@ class Project:
     
     def add_time_segment(self, segment: TimeSegment):
         """添加时间段"""
+        # 已有时间段可能被原地修改过开始时间，列表不一定有序，追加后整体排序（近乎有序时为线性）；
+        # 区间索引在下次访问时按 mark_dirty 记录重建
         self.time_segments.append(segment)
         self.time_segments.sort(key=lambda s: s.start_time)
-        self.modified_at = datetime.now()
+        self.mark_dirty("time_segments", segment.segment_id)
+
+    def set_animation_solutions(self, segment_id: str, solutions: List[AnimationSolution]):
+        """设置时间段的动画方案列表"""
+        self.animation_solutions[segment_id] = solutions
+        self.mark_dirty("animation_solutions", segment_id)
     
+    @property
+    def segment_index(self) -> IntervalIndex:
+        """时间段区间索引
+
+        time_segments 被替换、增删或有时间段经 mark_dirty 记录修改后，下次访问时重建
+        """
+        cached = getattr(self, '_segment_index', None)
+        segments = self.time_segments
+        if cached is not None:
+            index, list_id, count, generation = cached
+            if list_id == id(segments) and count == len(segments):
+                if generation == self.generation:
+                    return index
+                if "time_segments" not in self.changes_since(generation):
+                    self._segment_index = (index, list_id, count, self.generation)
+                    return index
+
+        index = IntervalIndex(segments)
+        self._segment_index = (index, id(segments), len(segments), self.generation)
+        return index
+
     def get_segment_at_time(self, time: float) -> Optional[TimeSegment]:
         """获取指定时间的时间段"""
-        for segment in self.time_segments:
-            if segment.start_time <= time <= segment.end_time:
-                return segment
-        return None
+        return self.segment_index.first_at(time)
+
+    def get_segments_in_range(self, start_time: float, end_time: float) -> List[TimeSegment]:
+        """获取与时间范围相交的时间段"""
+        return self.segment_index.overlapping(start_time, end_time)
 
     # 增强的元素管理方法
     def get_element(self, element_id: str) -> Optional[Element]:
@@ -381,7 +523,7 @@ class Project:
         """更新元素"""
         if element.element_id in self.elements:
             self.elements[element.element_id] = element
-            self.modified_at = datetime.now()
+            self.mark_dirty("elements", element.element_id)
         else:
             raise ValueError(f"元素不存在: {element.element_id}")
 
@@ -389,7 +531,7 @@ class Project:
         """移动元素到新位置"""
         if element_id in self.elements:
             self.elements[element_id].position = new_position
-            self.modified_at = datetime.now()
+            self.mark_dirty("elements", element_id)
         else:
             raise ValueError(f"元素不存在: {element_id}")
 
@@ -397,12 +539,14 @@ class Project:
         """设置元素可见性"""
         if element_id in self.elements:
             self.elements[element_id].visible = visible
-            self.modified_at = datetime.now()
+            self.mark_dirty("elements", element_id)
         else:
             raise ValueError(f"元素不存在: {element_id}")
 
     def clear_elements(self):
         """清空所有元素"""
+        for element_id in list(self.elements):
+            self.mark_dirty("elements", element_id)
         self.elements.clear()
         self.modified_at = datetime.now()
 
@@ -0,0 +1,92 @@
+"""
+AI Animation Studio - 无界面导出工作进程
+由 ShardedExportThread 启动：python -m core.export_worker <spec.json>
+按虚拟时钟渲染指定帧区间，并把帧流式送入FFmpeg（spec 指定 frames_dir 时改为逐帧写PNG）；
+进度以JSON行输出到标准输出
+"""
+
+import os
+import sys
+import json
+
+os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+
+from PyQt6.QtCore import QUrl
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtWebEngineWidgets import QWebEngineView
+
+from core.frame_capture import VirtualClockFrameCapture
+from core.frame_stream import FFmpegFrameSink, qimage_to_rgba_bytes
+
+
+def emit(message_type: str, **payload):
+    """向父进程输出一行JSON消息"""
+    print(json.dumps({"type": message_type, **payload}, ensure_ascii=False), flush=True)
+
+
+def main(spec_file: str) -> int:
+    with open(spec_file, 'r', encoding='utf-8') as f:
+        spec = json.load(f)
+
+    app = QApplication.instance() or QApplication(sys.argv[:1])
+
+    width, height, fps = spec["width"], spec["height"], spec["fps"]
+    frames_dir = spec.get("frames_dir")
+    sink = None if frames_dir else FFmpegFrameSink(None, width, height, fps, codec_args=spec["codec_args"])
+    result = {"success": False}
+
+    view = QWebEngineView()
+    view.resize(width, height)
+    view.show()
+
+    def consume_frame(frame, t, pixmap):
+        if sink:
+            sink.push_frame(qimage_to_rgba_bytes(pixmap, width, height))
+        else:
+            pixmap.save(os.path.join(frames_dir, f"frame_{frame:06d}.png"), "PNG")
+
+    capture = VirtualClockFrameCapture(
+        view, fps, spec["duration"], consume_frame,
+        start_time=spec["start_frame"] / fps,
+        end_time=spec["end_frame"] / fps,
+    )
+
+    def on_frame(frame, t):
+        captured = frame - capture.first_frame + 1
+        if captured % 10 == 0 or captured == capture.total_frames:
+            emit("progress", frames=captured)
+
+    def on_finished(success, message):
+        if success:
+            result["success"] = sink.close() if sink else True
+            if not result["success"]:
+                emit("error", message=sink.error_output)
+        else:
+            if sink:
+                sink.abort()
+            emit("error", message=message)
+        app.quit()
+
+    def on_loaded(ok):
+        if not ok:
+            emit("error", message="页面加载失败")
+            if sink:
+                sink.abort()
+            app.quit()
+            return
+        capture.start()
+
+    capture.frame_captured.connect(on_frame)
+    capture.capture_finished.connect(on_finished)
+    view.loadFinished.connect(on_loaded)
+
+    if sink:
+        sink.start()
+    view.load(QUrl.fromLocalFile(os.path.abspath(spec["html_file"])))
+    app.exec()
+
+    return 0 if result["success"] else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1]))
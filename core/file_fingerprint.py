@@ -0,0 +1,166 @@
+"""
+AI Animation Studio - 文件指纹
+分块流式计算文件摘要（不把整个文件读入内存），并用持久化的 (路径, 大小, 修改时间) -> 摘要 索引
+避免跨会话重复计算未改动文件的哈希
+"""
+
+import os
+import sqlite3
+import hashlib
+import threading
+from pathlib import Path
+from typing import Callable, Optional, Tuple
+
+from core.logger import get_logger
+
+logger = get_logger("file_fingerprint")
+
+try:
+    import xxhash
+    XXHASH_AVAILABLE = True
+except ImportError:
+    XXHASH_AVAILABLE = False
+
+# 每次读取的字节数
+HASH_CHUNK_SIZE = 1 << 20
+
+# md5 与旧版素材目录兼容；blake2b 在标准库中更快；xxh3 为非加密哈希，需要安装 xxhash
+DEFAULT_HASH_ALGORITHM = "md5"
+FAST_HASH_ALGORITHM = "xxh3" if XXHASH_AVAILABLE else "blake2b"
+
+
+class HashCancelled(Exception):
+    """哈希计算被取消"""
+    pass
+
+
+def _new_hasher(algorithm: str):
+    if algorithm == "xxh3":
+        if not XXHASH_AVAILABLE:
+            raise ValueError("xxh3 需要安装 xxhash")
+        return xxhash.xxh3_128()
+    if algorithm == "blake2b":
+        return hashlib.blake2b(digest_size=20)
+    return hashlib.new(algorithm)
+
+
+def hash_file(file_path: str, algorithm: str = DEFAULT_HASH_ALGORITHM,
+              should_stop: Optional[Callable[[], bool]] = None) -> str:
+    """分块计算文件摘要，内存占用与文件大小无关"""
+    hasher = _new_hasher(algorithm)
+    buffer = bytearray(HASH_CHUNK_SIZE)
+    view = memoryview(buffer)
+
+    with open(file_path, 'rb', buffering=0) as f:
+        while True:
+            if should_stop and should_stop():
+                raise HashCancelled(file_path)
+            read = f.readinto(buffer)
+            if not read:
+                break
+            hasher.update(view[:read])
+
+    return hasher.hexdigest()
+
+
+class FileFingerprintIndex:
+    """持久化的文件摘要索引
+
+    以解析后的绝对路径为键记录文件大小、修改时间(ns)和摘要；大小和修改时间都未变化时直接复用摘要。
+    保存在SQLite数据库中（WAL模式，每个线程独立连接），可在导入线程池中并发使用。
+    """
+
+    def __init__(self, db_file: Path):
+        self.db_file = str(db_file)
+        self._local = threading.local()
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._init_database()
+
+    def _connection(self) -> sqlite3.Connection:
+        """获取当前线程的数据库连接"""
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_file, timeout=10, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _init_database(self):
+        try:
+            Path(self.db_file).parent.mkdir(parents=True, exist_ok=True)
+            self._connection().execute("""
+                CREATE TABLE IF NOT EXISTS fingerprints (
+                    path TEXT NOT NULL,
+                    algorithm TEXT NOT NULL,
+                    size INTEGER NOT NULL,
+                    mtime_ns INTEGER NOT NULL,
+                    digest TEXT NOT NULL,
+                    PRIMARY KEY (path, algorithm)
+                )
+            """)
+        except Exception as e:
+            logger.error(f"初始化文件指纹索引失败: {e}")
+
+    def lookup(self, file_path: str, stat: os.stat_result,
+               algorithm: str = DEFAULT_HASH_ALGORITHM) -> Optional[str]:
+        """文件未变化时返回已记录的摘要"""
+        try:
+            row = self._connection().execute(
+                "SELECT size, mtime_ns, digest FROM fingerprints WHERE path = ? AND algorithm = ?",
+                (file_path, algorithm)
+            ).fetchone()
+        except sqlite3.Error as e:
+            logger.warning(f"读取文件指纹失败 {file_path}: {e}")
+            return None
+
+        if row and row[0] == stat.st_size and row[1] == stat.st_mtime_ns:
+            return row[2]
+        return None
+
+    def store(self, file_path: str, stat: os.stat_result, digest: str,
+              algorithm: str = DEFAULT_HASH_ALGORITHM):
+        try:
+            self._connection().execute(
+                "INSERT OR REPLACE INTO fingerprints (path, algorithm, size, mtime_ns, digest) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (file_path, algorithm, stat.st_size, stat.st_mtime_ns, digest)
+            )
+        except sqlite3.Error as e:
+            logger.warning(f"保存文件指纹失败 {file_path}: {e}")
+
+    def digest(self, file_path: str, algorithm: str = DEFAULT_HASH_ALGORITHM,
+               stat: Optional[os.stat_result] = None,
+               should_stop: Optional[Callable[[], bool]] = None) -> Tuple[str, os.stat_result]:
+        """获取文件摘要，未变化的文件不重新计算
+
+        Returns:
+            (摘要, 计算时的文件状态)
+        """
+        file_path = str(file_path)
+        stat = stat or os.stat(file_path)
+
+        digest = self.lookup(file_path, stat, algorithm)
+        with self._lock:
+            if digest is not None:
+                self.hits += 1
+            else:
+                self.misses += 1
+        if digest is not None:
+            return digest, stat
+
+        digest = hash_file(file_path, algorithm, should_stop)
+
+        # 计算期间文件被修改时不记录，下次重新计算
+        after = os.stat(file_path)
+        if (after.st_size, after.st_mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+            self.store(file_path, stat, digest, algorithm)
+        return digest, after
+
+    def forget(self, file_path: str):
+        try:
+            self._connection().execute("DELETE FROM fingerprints WHERE path = ?", (str(file_path),))
+        except sqlite3.Error as e:
+            logger.warning(f"删除文件指纹失败 {file_path}: {e}")
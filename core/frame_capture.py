@@ -0,0 +1,217 @@
+"""
+AI Animation Studio - 虚拟时钟逐帧捕获
+通过 renderAtTime(t) 按虚拟时钟逐帧驱动页面并截图，输出与机器快慢无关、可重复的帧序列
+"""
+
+from typing import Callable, Optional
+
+from PyQt6.QtCore import QObject, QTimer, pyqtSignal
+
+from core.logger import get_logger
+
+logger = get_logger("frame_capture")
+
+
+# 注入页面的虚拟时间垫片：冻结 performance.now / Date.now / requestAnimationFrame
+# 和 Web Animations（含CSS动画），让页面中的一切时间都只由虚拟时钟决定
+VIRTUAL_TIME_SHIM = """
+(function() {
+    if (window.__aasVirtualTime) { return true; }
+
+    const nativeRaf = window.requestAnimationFrame.bind(window);
+    const nativeDateNow = Date.now.bind(Date);
+    const startEpoch = nativeDateNow();
+    const pending = [];
+
+    const clock = {
+        time: 0,
+        nativeRaf: nativeRaf,
+        ready: -1,
+        error: null
+    };
+
+    performance.now = function() { return clock.time * 1000; };
+    Date.now = function() { return startEpoch + Math.round(clock.time * 1000); };
+
+    // 页面自己的rAF回调只在虚拟时钟前进时执行
+    window.requestAnimationFrame = function(callback) {
+        pending.push(callback);
+        return pending.length;
+    };
+    window.cancelAnimationFrame = function(id) {
+        if (id > 0 && id <= pending.length) { pending[id - 1] = null; }
+    };
+
+    clock.step = function(t, token) {
+        clock.time = t;
+        clock.ready = -1;
+        clock.error = null;
+        try {
+            if (document.getAnimations) {
+                document.getAnimations().forEach(function(animation) {
+                    animation.pause();
+                    animation.currentTime = t * 1000;
+                });
+            }
+
+            const callbacks = pending.splice(0, pending.length);
+            callbacks.forEach(function(callback) {
+                if (callback) { callback(t * 1000); }
+            });
+
+            if (typeof window.renderAtTime === 'function') {
+                window.renderAtTime(t);
+            }
+        } catch (error) {
+            clock.error = error.message;
+        }
+
+        // 等待两次原生rAF，确保本帧已经提交合成
+        nativeRaf(function() { nativeRaf(function() { clock.ready = token; }); });
+        return true;
+    };
+
+    window.__aasVirtualTime = clock;
+    return true;
+})();
+"""
+
+
+class VirtualClockFrameCapture(QObject):
+    """虚拟时钟帧捕获器
+
+    每一帧依次执行：推进虚拟时钟并调用 renderAtTime(t) → 等待页面完成绘制 →
+    截图 → 交给帧消费者。下一帧紧接着开始，不按墙上时钟等待，
+    因此导出速度只取决于机器性能，且每一帧都精确对应 t = frame / fps。
+    """
+
+    frame_captured = pyqtSignal(int, float)  # 帧序号, 时间
+    progress_changed = pyqtSignal(int)  # 进度百分比
+    capture_finished = pyqtSignal(bool, str)  # 成功, 消息
+
+    # 等待页面绘制时的轮询间隔（毫秒）和单帧最长等待次数
+    POLL_INTERVAL_MS = 1
+    MAX_POLLS_PER_FRAME = 2000
+
+    def __init__(self, web_view, fps: int, duration: float,
+                 frame_consumer: Callable, start_time: float = 0.0,
+                 end_time: Optional[float] = None, parent=None):
+        """
+        Args:
+            web_view: 已加载完成的 QWebEngineView
+            fps: 帧率
+            duration: 动画总时长（秒）
+            frame_consumer: 接收 (帧序号, 时间, QPixmap) 的回调
+            start_time: 起始时间（用于分段导出）
+            end_time: 结束时间（不含），默认为 duration
+        """
+        super().__init__(parent)
+        self.web_view = web_view
+        self.fps = fps
+        self.duration = duration
+        self.frame_consumer = frame_consumer
+
+        end_time = duration if end_time is None else min(end_time, duration)
+        # 帧序号是全局的，分段导出时各段帧时间与整段导出完全一致
+        self.first_frame = int(round(start_time * fps))
+        self.end_frame = max(self.first_frame, int(round(end_time * fps)))
+
+        self.current_frame = self.first_frame
+        self._token = 0
+        self._polls = 0
+        self._cancelled = False
+        self._running = False
+
+    @property
+    def total_frames(self) -> int:
+        return self.end_frame - self.first_frame
+
+    def frame_time(self, frame: int) -> float:
+        """帧序号对应的时间"""
+        return frame / self.fps
+
+    def start(self):
+        """开始捕获"""
+        if self._running:
+            return
+
+        self._running = True
+        self._cancelled = False
+        self.current_frame = self.first_frame
+        logger.info(f"开始虚拟时钟捕获: 帧 {self.first_frame}-{self.end_frame}, {self.fps}fps")
+
+        self.web_view.page().runJavaScript(VIRTUAL_TIME_SHIM, lambda _: self._step())
+
+    def cancel(self):
+        """取消捕获"""
+        self._cancelled = True
+
+    def _step(self):
+        """推进到当前帧"""
+        if self._cancelled:
+            self._finish(False, "捕获已取消")
+            return
+
+        if self.current_frame >= self.end_frame:
+            self._finish(True, f"已捕获 {self.total_frames} 帧")
+            return
+
+        self._token += 1
+        self._polls = 0
+        t = self.frame_time(self.current_frame)
+        script = f"window.__aasVirtualTime.step({t!r}, {self._token});"
+        self.web_view.page().runJavaScript(script, lambda _: self._wait_for_paint())
+
+    def _wait_for_paint(self):
+        """轮询页面，直到本帧已绘制"""
+        token = self._token
+
+        def on_state(state):
+            if self._cancelled:
+                self._finish(False, "捕获已取消")
+                return
+
+            if state and state.get('ready') == token:
+                if state.get('error'):
+                    logger.warning(f"渲染帧 {self.current_frame} 出错: {state['error']}")
+                self._capture()
+                return
+
+            self._polls += 1
+            if self._polls > self.MAX_POLLS_PER_FRAME:
+                self._finish(False, f"等待帧 {self.current_frame} 绘制超时")
+                return
+
+            QTimer.singleShot(self.POLL_INTERVAL_MS, self._wait_for_paint)
+
+        self.web_view.page().runJavaScript(
+            "({ready: window.__aasVirtualTime.ready, error: window.__aasVirtualTime.error})",
+            on_state
+        )
+
+    def _capture(self):
+        """截取当前帧并交给消费者"""
+        frame = self.current_frame
+        t = self.frame_time(frame)
+
+        try:
+            self.frame_consumer(frame, t, self.web_view.grab())
+        except Exception as e:
+            logger.error(f"处理帧 {frame} 失败: {e}")
+            self._finish(False, f"处理帧失败: {e}")
+            return
+
+        self.frame_captured.emit(frame, t)
+        captured = frame - self.first_frame + 1
+        self.progress_changed.emit(int(captured * 100 / max(self.total_frames, 1)))
+
+        self.current_frame += 1
+        # 立即开始下一帧（回到事件循环以保持界面响应）
+        QTimer.singleShot(0, self._step)
+
+    def _finish(self, success: bool, message: str):
+        if not self._running:
+            return
+        self._running = False
+        logger.info(f"虚拟时钟捕获结束: {message}")
+        self.capture_finished.emit(success, message)
@@ -0,0 +1,229 @@
+"""
+AI Animation Studio - 帧流式编码
+将原始RGBA帧缓冲通过标准输入直接推送给常驻的FFmpeg进程，无需把每一帧写成PNG
+"""
+
+import queue
+import threading
+import subprocess
+from collections import deque
+from typing import Optional, List
+
+from core.logger import get_logger
+
+logger = get_logger("frame_stream")
+
+# 队列结束标记
+_END_OF_STREAM = object()
+
+
+class FrameStreamError(Exception):
+    """帧流编码错误"""
+    pass
+
+
+class FFmpegFrameSink:
+    """FFmpeg帧接收器
+
+    启动一个长期运行的 ffmpeg 进程（-f rawvideo -i -），由后台写线程从有界队列中
+    取出帧缓冲写入其标准输入。队列满时 push_frame 会阻塞，从而对截图端形成反压，
+    内存占用不超过 queue_size 帧。
+
+    output_path 为 None 时，输出文件由 codec_args 自行给出（用于一次编码多路输出）。
+    """
+
+    def __init__(self, output_path: Optional[str], width: int, height: int, fps: int,
+                 pix_fmt: str = "rgba", queue_size: int = 8,
+                 codec_args: Optional[List[str]] = None,
+                 input_args: Optional[List[str]] = None,
+                 ffmpeg_binary: str = "ffmpeg"):
+        self.output_path = output_path
+        self.width = width
+        self.height = height
+        self.fps = fps
+        self.pix_fmt = pix_fmt
+        self.frame_size = width * height * 4
+        self.codec_args = codec_args or [
+            "-c:v", "libx264",
+            "-pix_fmt", "yuv420p",
+            "-crf", "18",
+            "-preset", "medium",
+        ]
+        self.input_args = input_args or []
+        self.ffmpeg_binary = ffmpeg_binary
+
+        self.frames_written = 0
+        self._queue: "queue.Queue" = queue.Queue(maxsize=max(1, queue_size))
+        self._process: Optional[subprocess.Popen] = None
+        self._writer_thread: Optional[threading.Thread] = None
+        self._stderr_thread: Optional[threading.Thread] = None
+        self._stderr_tail: deque = deque(maxlen=50)
+        self._error: Optional[BaseException] = None
+
+    def build_command(self) -> List[str]:
+        """构建FFmpeg命令行"""
+        return [
+            self.ffmpeg_binary, "-y",
+            "-loglevel", "error",
+            "-f", "rawvideo",
+            "-pix_fmt", self.pix_fmt,
+            "-s", f"{self.width}x{self.height}",
+            "-r", str(self.fps),
+            *self.input_args,
+            "-i", "-",
+            *self.codec_args,
+            *([self.output_path] if self.output_path else []),
+        ]
+
+    def start(self):
+        """启动FFmpeg进程和写线程"""
+        if self._process is not None:
+            return
+
+        command = self.build_command()
+        logger.debug(f"启动FFmpeg帧流: {' '.join(command)}")
+
+        self._process = subprocess.Popen(
+            command,
+            stdin=subprocess.PIPE,
+            stdout=subprocess.DEVNULL,
+            stderr=subprocess.PIPE,
+        )
+
+        # stderr 必须持续读取，否则管道写满后 ffmpeg 会阻塞
+        self._stderr_thread = threading.Thread(target=self._drain_stderr, daemon=True)
+        self._stderr_thread.start()
+
+        self._writer_thread = threading.Thread(target=self._write_loop, daemon=True)
+        self._writer_thread.start()
+
+    def _drain_stderr(self):
+        for line in iter(self._process.stderr.readline, b""):
+            self._stderr_tail.append(line.decode("utf-8", errors="replace").rstrip())
+
+    def _write_loop(self):
+        stdin = self._process.stdin
+        try:
+            while True:
+                frame = self._queue.get()
+                if frame is _END_OF_STREAM:
+                    break
+                stdin.write(frame)
+                self.frames_written += 1
+        except BaseException as e:
+            self._error = e
+            # 清空队列，避免 push_frame 永久阻塞
+            while True:
+                try:
+                    self._queue.get_nowait()
+                except queue.Empty:
+                    break
+        finally:
+            try:
+                stdin.close()
+            except OSError:
+                pass
+
+    def push_frame(self, frame: bytes, timeout: Optional[float] = None):
+        """推送一帧原始像素数据（队列满时阻塞）"""
+        if self._process is None:
+            self.start()
+
+        if self._error is not None:
+            raise FrameStreamError(f"FFmpeg写入失败: {self._error}; {self.error_output}")
+
+        if len(frame) != self.frame_size:
+            raise FrameStreamError(
+                f"帧大小不匹配: {len(frame)} != {self.frame_size} ({self.width}x{self.height} {self.pix_fmt})"
+            )
+
+        try:
+            self._queue.put(frame, timeout=timeout)
+        except queue.Full:
+            raise FrameStreamError("FFmpeg编码跟不上，等待写入超时")
+
+    def close(self, timeout: Optional[float] = None) -> bool:
+        """结束输入并等待FFmpeg完成编码
+
+        Args:
+            timeout: 等待编码完成的最长时间，默认无限等待（编码时长与视频长度相关）
+
+        Returns:
+            是否编码成功
+        """
+        if self._process is None:
+            return False
+
+        self._queue.put(_END_OF_STREAM)
+        self._writer_thread.join(timeout)
+
+        try:
+            return_code = self._process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            logger.error("等待FFmpeg编码超时")
+            self.abort()
+            return False
+
+        if self._stderr_thread:
+            self._stderr_thread.join(1)
+
+        if return_code != 0 or self._error is not None:
+            logger.error(f"FFmpeg编码失败 (返回码 {return_code}): {self.error_output}")
+            return False
+
+        logger.info(f"FFmpeg帧流编码完成: {self.frames_written} 帧 -> {self.output_path or '多路输出'}")
+        return True
+
+    def abort(self):
+        """立即终止编码"""
+        if self._process and self._process.poll() is None:
+            self._process.kill()
+            self._process.wait()
+        # 让写线程退出
+        try:
+            self._queue.put_nowait(_END_OF_STREAM)
+        except queue.Full:
+            pass
+
+    @property
+    def error_output(self) -> str:
+        """FFmpeg最近的错误输出"""
+        return "\n".join(self._stderr_tail)
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if exc_type is not None:
+            self.abort()
+        else:
+            self.close()
+        return False
+
+
+def qimage_to_rgba_bytes(image, width: int, height: int) -> bytes:
+    """将QImage/QPixmap转换为指定尺寸的紧凑RGBA字节"""
+    from PyQt6.QtCore import Qt
+    from PyQt6.QtGui import QImage, QPixmap
+
+    if isinstance(image, QPixmap):
+        image = image.toImage()
+
+    if image.width() != width or image.height() != height:
+        image = image.scaled(width, height,
+                             Qt.AspectRatioMode.IgnoreAspectRatio,
+                             Qt.TransformationMode.SmoothTransformation)
+
+    image = image.convertToFormat(QImage.Format.Format_RGBA8888)
+    bits = image.constBits()
+    bits.setsize(image.sizeInBytes())
+    data = bytes(bits)
+
+    # RGBA8888每行字节数总是4的倍数，但仍兼容带行填充的图像
+    row_bytes = width * 4
+    if image.bytesPerLine() != row_bytes:
+        stride = image.bytesPerLine()
+        data = b"".join(data[y * stride:y * stride + row_bytes] for y in range(height))
+
+    return data
@@ -0,0 +1,64 @@
+"""
+AI Animation Studio - HTML流式缓冲
+累积AI流式输出的HTML片段，并在完整闭合的 </style>、</script> 等位置标记可预览边界
+"""
+
+import re
+
+# 到达这些闭合标签时，之前的内容可以安全地送去预览
+PREVIEW_BOUNDARY_PATTERN = re.compile(r'</(?:style|script|head|body|html)\s*>', re.IGNORECASE)
+# 闭合标签可能被拆分到两个片段中，重新扫描时回退的字符数
+_BOUNDARY_LOOKBEHIND = 16
+
+_CODE_FENCE_PATTERN = re.compile(r'^\s*```[a-zA-Z]*\s*\n|\n?```\s*$')
+
+
+def strip_code_fences(text: str) -> str:
+    """去掉模型输出外层的Markdown代码块标记"""
+    return _CODE_FENCE_PATTERN.sub('', text)
+
+
+class HTMLStreamBuffer:
+    """HTML流式缓冲区"""
+
+    def __init__(self):
+        self.text = ""
+        self.boundary = 0  # 最后一个可预览边界的位置
+        self._scan_from = 0
+
+    def feed(self, chunk: str) -> bool:
+        """追加一个片段
+
+        Returns:
+            是否越过了新的预览边界
+        """
+        if not chunk:
+            return False
+
+        self.text += chunk
+        start = max(self.boundary, self._scan_from - _BOUNDARY_LOOKBEHIND)
+        self._scan_from = len(self.text)
+
+        last_end = None
+        for match in PREVIEW_BOUNDARY_PATTERN.finditer(self.text, start):
+            last_end = match.end()
+
+        if last_end is not None and last_end > self.boundary:
+            self.boundary = last_end
+            return True
+        return False
+
+    @property
+    def preview_html(self) -> str:
+        """截至最后一个边界、可以安全渲染的HTML"""
+        return strip_code_fences(self.text[:self.boundary])
+
+    @property
+    def html(self) -> str:
+        """当前累积的完整HTML"""
+        return strip_code_fences(self.text)
+
+    def reset(self):
+        self.text = ""
+        self.boundary = 0
+        self._scan_from = 0
@@ -0,0 +1,129 @@
+"""
+AI Animation Studio - 区间索引
+按开始时间排序的时间段数组，附带结束时间的前缀最大值：
+时间点查询、时间范围查询的代价为 O(log n + 命中数)，重叠检测为 O(n log n + 重叠数)
+"""
+
+import heapq
+from bisect import bisect_left, bisect_right
+from operator import attrgetter
+from typing import Any, Callable, Iterable, Iterator, List, Tuple
+
+# 默认从时间段对象的 start_time / end_time 属性读取区间（闭区间）
+DEFAULT_START = attrgetter("start_time")
+DEFAULT_END = attrgetter("end_time")
+
+
+class IntervalIndex:
+    """时间段的排序数组索引
+
+    条目按开始时间排序（相同时保持插入顺序）；查询结果也按此顺序排列。
+    索引不感知条目的原地修改，修改开始或结束时间后需要 remove/insert 或 rebuild。
+    """
+
+    def __init__(self, items: Iterable[Any] = (), start: Callable[[Any], float] = DEFAULT_START,
+                 end: Callable[[Any], float] = DEFAULT_END):
+        self._start = start
+        self._end = end
+        self._items: List[Any] = []
+        self._starts: List[float] = []
+        self._ends: List[float] = []
+        # _max_ends[i] 为前 i+1 个条目结束时间的最大值，向前扫描时据此提前终止
+        self._max_ends: List[float] = []
+        self.rebuild(items)
+
+    def __len__(self) -> int:
+        return len(self._items)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._items)
+
+    def rebuild(self, items: Iterable[Any]):
+        """重新建立索引"""
+        self._items = sorted(items, key=self._start)
+        self._starts = [self._start(item) for item in self._items]
+        self._ends = [self._end(item) for item in self._items]
+        self._max_ends = []
+        self._update_max_ends(0)
+
+    def _update_max_ends(self, index: int):
+        del self._max_ends[index:]
+        current = self._max_ends[-1] if self._max_ends else float("-inf")
+        for end in self._ends[index:]:
+            current = max(current, end)
+            self._max_ends.append(current)
+
+    def insert(self, item: Any):
+        """插入条目（插到开始时间相同的条目之后）"""
+        start, end = self._start(item), self._end(item)
+        index = bisect_right(self._starts, start)
+        self._items.insert(index, item)
+        self._starts.insert(index, start)
+        self._ends.insert(index, end)
+
+        previous = self._max_ends[index - 1] if index > 0 else float("-inf")
+        self._max_ends.insert(index, max(previous, end))
+        # 前缀最大值单调不减，后续条目只需更新到不小于 end 的位置
+        for i in range(index + 1, len(self._max_ends)):
+            if self._max_ends[i] >= end:
+                break
+            self._max_ends[i] = end
+
+    def remove(self, item: Any) -> bool:
+        """移除条目（按对象身份匹配），不存在时返回False"""
+        start = self._start(item)
+        for index in range(bisect_left(self._starts, start), bisect_right(self._starts, start)):
+            if self._items[index] is item:
+                del self._items[index]
+                del self._starts[index]
+                del self._ends[index]
+                self._update_max_ends(index)
+                return True
+        return False
+
+    def _scan(self, upper: int, lower_bound: float) -> List[Any]:
+        """从 upper 向前收集结束时间不早于 lower_bound 的条目"""
+        hits = []
+        index = upper - 1
+        while index >= 0 and self._max_ends[index] >= lower_bound:
+            if self._ends[index] >= lower_bound:
+                hits.append(self._items[index])
+            index -= 1
+        hits.reverse()
+        return hits
+
+    def at(self, time: float) -> List[Any]:
+        """包含该时间点的条目"""
+        return self._scan(bisect_right(self._starts, time), time)
+
+    def first_at(self, time: float) -> Any:
+        """包含该时间点且开始最早的条目，没有时返回None"""
+        hits = self.at(time)
+        return hits[0] if hits else None
+
+    def overlapping(self, start: float, end: float) -> List[Any]:
+        """与 [start, end] 相交的条目"""
+        return self._scan(bisect_right(self._starts, end), start)
+
+    def overlapping_pairs(self, min_overlap: float = 0.0) -> List[Tuple[Any, Any, float]]:
+        """重叠时长大于 min_overlap 的条目对
+
+        Returns:
+            (先开始的条目, 后开始的条目, 重叠时长) 列表，按两个条目在索引中的顺序排列
+        """
+        pairs = []
+        active: List[Tuple[float, int]] = []  # (结束时间, 序号) 小顶堆
+        for index, start in enumerate(self._starts):
+            # 结束得早到无法再与当前及之后的条目重叠超过 min_overlap 的条目出堆
+            while active and active[0][0] <= start + min_overlap:
+                heapq.heappop(active)
+
+            end = self._ends[index]
+            for other_end, other in active:
+                overlap = min(end, other_end) - start
+                if overlap > min_overlap:
+                    pairs.append((other, index, overlap))
+            heapq.heappush(active, (end, index))
+
+        pairs.sort(key=lambda pair: (pair[0], pair[1]))
+        return [(self._items[i], self._items[j], overlap) for i, j, overlap in pairs]
@@ -3,29 +3,67 @@ AI Animation Studio - 项目缓存管理器
 实现项目创建缓存机制和性能监控
 """
 
+import os
+import json
 import time
+import atexit
 import hashlib
 import pickle
+import threading
+from collections import OrderedDict
 from typing import Dict, Any, Optional, List
 from pathlib import Path
 from datetime import datetime, timedelta
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 
 from core.logger import get_logger
 from core.data_structures import Project
 
 logger = get_logger("project_cache")
 
+DEFAULT_NAMESPACE = "default"
+
 
 @dataclass
 class CacheEntry:
-    """缓存条目"""
+    """缓存条目（磁盘层索引）"""
     key: str
-    data: Any
+    namespace: str
     created_at: datetime
     last_accessed: datetime
     access_count: int = 0
     size_bytes: int = 0
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "key": self.key,
+            "namespace": self.namespace,
+            "created_at": self.created_at.isoformat(),
+            "last_accessed": self.last_accessed.isoformat(),
+            "access_count": self.access_count,
+            "size_bytes": self.size_bytes
+        }
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "CacheEntry":
+        return cls(
+            key=data["key"],
+            namespace=data.get("namespace", DEFAULT_NAMESPACE),
+            created_at=datetime.fromisoformat(data["created_at"]),
+            last_accessed=datetime.fromisoformat(data["last_accessed"]),
+            access_count=data.get("access_count", 0),
+            size_bytes=data.get("size_bytes", 0)
+        )
+
+
+@dataclass
+class NamespaceStats:
+    """命名空间统计"""
+    memory_hits: int = 0
+    disk_hits: int = 0
+    misses: int = 0
+    puts: int = 0
+    evictions: int = 0
 
 
 @dataclass
@@ -42,17 +80,46 @@ class PerformanceMetrics:
 
 
 class ProjectCache:
-    """项目缓存管理器"""
+    """项目缓存管理器
+
+    两级缓存：内存层按字节预算保存最近使用条目的序列化数据，命中时不再读盘；
+    磁盘层每个条目一个 {key}.pkl 文件，索引按LRU顺序保存在 OrderedDict 中，淘汰为O(1)，
+    修改后延迟 INDEX_SAVE_DELAY 秒以原子替换的方式持久化为 cache_index.json（关闭和退出时立即写入）。
+    命中时总是从序列化数据还原出新对象，调用方可以放心修改返回值。
+    """
     
-    def __init__(self, cache_dir: Optional[Path] = None, max_size_mb: int = 100):
+    INDEX_FILE_NAME = "cache_index.json"
+    LEGACY_INDEX_FILE_NAME = "cache_index.pkl"
+    # 超出容量时清理到的比例
+    CLEANUP_TARGET_RATIO = 0.8
+    # 索引延迟保存的时间（秒），连续写入只重写一次索引
+    INDEX_SAVE_DELAY = 2.0
+    
+    def __init__(self, cache_dir: Optional[Path] = None, max_size_mb: int = 100,
+                 memory_size_mb: int = 16):
         self.cache_dir = cache_dir or Path.home() / ".ai_animation_studio" / "cache"
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
         self.max_size_bytes = max_size_mb * 1024 * 1024
-        self.cache_entries: Dict[str, CacheEntry] = {}
+        self.memory_max_bytes = memory_size_mb * 1024 * 1024
+        
+        # 磁盘层索引，按最近访问顺序排列（最旧的在前）
+        self.cache_entries: "OrderedDict[str, CacheEntry]" = OrderedDict()
+        self.total_size_bytes = 0
+        
+        # 内存层：key -> 序列化数据，按最近访问顺序排列
+        self.memory_cache: "OrderedDict[str, bytes]" = OrderedDict()
+        self.memory_size_bytes = 0
+        
+        self.namespace_stats: Dict[str, NamespaceStats] = {}
         self.performance_metrics: List[PerformanceMetrics] = []
         
+        self._lock = threading.RLock()
+        self._index_dirty = False
+        self._save_timer: Optional[threading.Timer] = None
+        
         self._load_cache_index()
+        atexit.register(self.flush)
         logger.info(f"项目缓存初始化完成，缓存目录: {self.cache_dir}")
     
     def _generate_cache_key(self, **kwargs) -> str:
@@ -65,130 +132,241 @@ class ProjectCache:
         key_string = "|".join(key_parts)
         return hashlib.md5(key_string.encode()).hexdigest()
     
+    def _cache_file(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.pkl"
+    
+    def _stats_for(self, namespace: str) -> NamespaceStats:
+        stats = self.namespace_stats.get(namespace)
+        if stats is None:
+            stats = self.namespace_stats[namespace] = NamespaceStats()
+        return stats
+    
     def _load_cache_index(self):
         """加载缓存索引"""
         try:
-            index_file = self.cache_dir / "cache_index.pkl"
+            index_file = self.cache_dir / self.INDEX_FILE_NAME
             if index_file.exists():
-                with open(index_file, 'rb') as f:
-                    self.cache_entries = pickle.load(f)
+                with open(index_file, 'r', encoding='utf-8') as f:
+                    entries = [CacheEntry.from_dict(item) for item in json.load(f)]
+            else:
+                entries = self._load_legacy_index()
+            
+            entries.sort(key=lambda entry: entry.last_accessed)
+            for entry in entries:
+                self.cache_entries[entry.key] = entry
+                self.total_size_bytes += entry.size_bytes
+            
+            if entries:
                 logger.info(f"加载缓存索引，共 {len(self.cache_entries)} 个条目")
+                
         except Exception as e:
             logger.warning(f"加载缓存索引失败: {e}")
-            self.cache_entries = {}
+            self.cache_entries = OrderedDict()
+            self.total_size_bytes = 0
+    
+    def _load_legacy_index(self) -> List[CacheEntry]:
+        """迁移旧版pickle索引"""
+        legacy_file = self.cache_dir / self.LEGACY_INDEX_FILE_NAME
+        if not legacy_file.exists():
+            return []
+        
+        entries = []
+        try:
+            with open(legacy_file, 'rb') as f:
+                legacy_entries = pickle.load(f)
+            for key, legacy in legacy_entries.items():
+                if self._cache_file(key).exists():
+                    entries.append(CacheEntry(
+                        key=key,
+                        namespace=DEFAULT_NAMESPACE,
+                        created_at=legacy.created_at,
+                        last_accessed=legacy.last_accessed,
+                        access_count=legacy.access_count,
+                        size_bytes=legacy.size_bytes
+                    ))
+        except Exception as e:
+            logger.warning(f"迁移旧版缓存索引失败: {e}")
+        
+        legacy_file.unlink(missing_ok=True)
+        self._index_dirty = True
+        return entries
     
     def _save_cache_index(self):
-        """保存缓存索引"""
+        """原子写入缓存索引"""
         try:
-            index_file = self.cache_dir / "cache_index.pkl"
-            with open(index_file, 'wb') as f:
-                pickle.dump(self.cache_entries, f)
+            index_file = self.cache_dir / self.INDEX_FILE_NAME
+            temp_file = index_file.with_name(index_file.name + ".tmp")
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump([entry.to_dict() for entry in self.cache_entries.values()], f)
+            os.replace(temp_file, index_file)
+            self._index_dirty = False
         except Exception as e:
             logger.error(f"保存缓存索引失败: {e}")
     
-    def get(self, key: str) -> Optional[Any]:
+    def _schedule_index_save(self):
+        """标记索引已修改，延迟保存（调用方需持有锁）"""
+        self._index_dirty = True
+        if self._save_timer is None:
+            self._save_timer = threading.Timer(self.INDEX_SAVE_DELAY, self.flush)
+            self._save_timer.daemon = True
+            self._save_timer.start()
+    
+    def flush(self):
+        """保存尚未持久化的索引修改和访问信息"""
+        with self._lock:
+            if self._save_timer is not None:
+                self._save_timer.cancel()
+                self._save_timer = None
+            if self._index_dirty:
+                self._save_cache_index()
+    
+    def close(self):
+        """关闭缓存：立即写入索引"""
+        self.flush()
+    
+    def get(self, key: str, namespace: str = DEFAULT_NAMESPACE) -> Optional[Any]:
         """获取缓存数据"""
-        if key not in self.cache_entries:
-            return None
-        
-        entry = self.cache_entries[key]
-        cache_file = self.cache_dir / f"{key}.pkl"
-        
-        if not cache_file.exists():
-            # 缓存文件不存在，删除索引条目
-            del self.cache_entries[key]
-            return None
-        
-        try:
-            with open(cache_file, 'rb') as f:
-                data = pickle.load(f)
-            
-            # 更新访问信息
-            entry.last_accessed = datetime.now()
-            entry.access_count += 1
-            
-            logger.debug(f"缓存命中: {key}")
-            return data
+        with self._lock:
+            stats = self._stats_for(namespace)
+            entry = self.cache_entries.get(key)
+            if entry is None:
+                stats.misses += 1
+                return None
             
-        except Exception as e:
-            logger.error(f"读取缓存失败: {e}")
-            return None
+            try:
+                payload = self.memory_cache.get(key)
+                if payload is not None:
+                    self.memory_cache.move_to_end(key)
+                    stats.memory_hits += 1
+                else:
+                    cache_file = self._cache_file(key)
+                    if not cache_file.exists():
+                        # 缓存文件不存在，删除索引条目
+                        self._remove_cache_entry(key)
+                        stats.misses += 1
+                        return None
+                    
+                    payload = cache_file.read_bytes()
+                    self._remember(key, payload)
+                    stats.disk_hits += 1
+                
+                # 更新访问信息
+                entry.last_accessed = datetime.now()
+                entry.access_count += 1
+                self.cache_entries.move_to_end(key)
+                self._index_dirty = True
+                
+                logger.debug(f"缓存命中: {key}")
+                return pickle.loads(payload)
+                
+            except Exception as e:
+                logger.error(f"读取缓存失败: {e}")
+                return None
     
-    def put(self, key: str, data: Any) -> bool:
+    def put(self, key: str, data: Any, namespace: str = DEFAULT_NAMESPACE) -> bool:
         """存储缓存数据"""
         try:
-            cache_file = self.cache_dir / f"{key}.pkl"
+            payload = pickle.dumps(data, protocol=pickle.HIGHEST_PROTOCOL)
             
-            # 序列化数据
-            with open(cache_file, 'wb') as f:
-                pickle.dump(data, f)
-            
-            # 计算文件大小
-            size_bytes = cache_file.stat().st_size
-            
-            # 创建缓存条目
-            entry = CacheEntry(
-                key=key,
-                data=None,  # 不在内存中保存数据
-                created_at=datetime.now(),
-                last_accessed=datetime.now(),
-                access_count=1,
-                size_bytes=size_bytes
-            )
-            
-            self.cache_entries[key] = entry
-            
-            # 检查缓存大小限制
-            self._cleanup_if_needed()
+            with self._lock:
+                cache_file = self._cache_file(key)
+                temp_file = cache_file.with_name(cache_file.name + ".tmp")
+                temp_file.write_bytes(payload)
+                os.replace(temp_file, cache_file)
+                
+                previous = self.cache_entries.pop(key, None)
+                if previous is not None:
+                    self.total_size_bytes -= previous.size_bytes
+                
+                now = datetime.now()
+                self.cache_entries[key] = CacheEntry(
+                    key=key,
+                    namespace=namespace,
+                    created_at=now,
+                    last_accessed=now,
+                    access_count=1,
+                    size_bytes=len(payload)
+                )
+                self.total_size_bytes += len(payload)
+                self._remember(key, payload)
+                self._stats_for(namespace).puts += 1
+                
+                # 检查缓存大小限制
+                self._cleanup_if_needed()
+                self._schedule_index_save()
             
-            logger.debug(f"缓存存储: {key}, 大小: {size_bytes} 字节")
+            logger.debug(f"缓存存储: {key}, 大小: {len(payload)} 字节")
             return True
             
         except Exception as e:
             logger.error(f"存储缓存失败: {e}")
             return False
     
+    def _remember(self, key: str, payload: bytes):
+        """放入内存层，超出预算时淘汰最久未用的条目"""
+        previous = self.memory_cache.pop(key, None)
+        if previous is not None:
+            self.memory_size_bytes -= len(previous)
+        
+        if len(payload) > self.memory_max_bytes:
+            return
+        
+        self.memory_cache[key] = payload
+        self.memory_size_bytes += len(payload)
+        while self.memory_size_bytes > self.memory_max_bytes:
+            _, evicted = self.memory_cache.popitem(last=False)
+            self.memory_size_bytes -= len(evicted)
+    
+    def _forget(self, key: str):
+        payload = self.memory_cache.pop(key, None)
+        if payload is not None:
+            self.memory_size_bytes -= len(payload)
+    
     def _cleanup_if_needed(self):
-        """如果需要，清理缓存"""
-        total_size = sum(entry.size_bytes for entry in self.cache_entries.values())
+        """如果需要，从最久未用的一端淘汰磁盘条目"""
+        if self.total_size_bytes <= self.max_size_bytes:
+            return
         
-        if total_size > self.max_size_bytes:
-            logger.info(f"缓存大小超限 ({total_size} > {self.max_size_bytes})，开始清理")
-            
-            # 按最后访问时间排序，删除最旧的条目
-            sorted_entries = sorted(
-                self.cache_entries.items(),
-                key=lambda x: x[1].last_accessed
-            )
-            
-            for key, entry in sorted_entries:
-                if total_size <= self.max_size_bytes * 0.8:  # 清理到80%
-                    break
-                
-                self._remove_cache_entry(key)
-                total_size -= entry.size_bytes
-                logger.debug(f"清理缓存条目: {key}")
+        logger.info(f"缓存大小超限 ({self.total_size_bytes} > {self.max_size_bytes})，开始清理")
+        target = self.max_size_bytes * self.CLEANUP_TARGET_RATIO
+        while self.cache_entries and self.total_size_bytes > target:
+            key, entry = next(iter(self.cache_entries.items()))
+            self._remove_cache_entry(key)
+            self._stats_for(entry.namespace).evictions += 1
+            logger.debug(f"清理缓存条目: {key}")
     
     def _remove_cache_entry(self, key: str):
         """删除缓存条目"""
         try:
-            cache_file = self.cache_dir / f"{key}.pkl"
-            if cache_file.exists():
-                cache_file.unlink()
+            self._forget(key)
+            entry = self.cache_entries.pop(key, None)
+            if entry is not None:
+                self.total_size_bytes -= entry.size_bytes
+                self._index_dirty = True
             
-            if key in self.cache_entries:
-                del self.cache_entries[key]
+            self._cache_file(key).unlink(missing_ok=True)
                 
         except Exception as e:
             logger.error(f"删除缓存条目失败: {e}")
     
+    def remove(self, key: str):
+        """删除指定条目"""
+        with self._lock:
+            self._remove_cache_entry(key)
+            self._schedule_index_save()
+    
     def clear(self):
         """清空缓存"""
         try:
-            for key in list(self.cache_entries.keys()):
-                self._remove_cache_entry(key)
-            
-            self.cache_entries.clear()
+            with self._lock:
+                for key in list(self.cache_entries.keys()):
+                    self._remove_cache_entry(key)
+                
+                self.cache_entries.clear()
+                self.memory_cache.clear()
+                self.total_size_bytes = 0
+                self.memory_size_bytes = 0
+                self._save_cache_index()
             logger.info("缓存已清空")
             
         except Exception as e:
@@ -196,18 +374,23 @@ class ProjectCache:
     
     def get_stats(self) -> Dict[str, Any]:
         """获取缓存统计信息"""
-        total_size = sum(entry.size_bytes for entry in self.cache_entries.values())
-        total_accesses = sum(entry.access_count for entry in self.cache_entries.values())
-        
-        return {
-            "entry_count": len(self.cache_entries),
-            "total_size_bytes": total_size,
-            "total_size_mb": total_size / (1024 * 1024),
-            "max_size_mb": self.max_size_bytes / (1024 * 1024),
-            "usage_percent": (total_size / self.max_size_bytes) * 100,
-            "total_accesses": total_accesses,
-            "avg_accesses_per_entry": total_accesses / len(self.cache_entries) if self.cache_entries else 0
-        }
+        with self._lock:
+            total_size = self.total_size_bytes
+            total_accesses = sum(entry.access_count for entry in self.cache_entries.values())
+            
+            return {
+                "entry_count": len(self.cache_entries),
+                "total_size_bytes": total_size,
+                "total_size_mb": total_size / (1024 * 1024),
+                "max_size_mb": self.max_size_bytes / (1024 * 1024),
+                "usage_percent": (total_size / self.max_size_bytes) * 100,
+                "total_accesses": total_accesses,
+                "avg_accesses_per_entry": total_accesses / len(self.cache_entries) if self.cache_entries else 0,
+                "memory_entry_count": len(self.memory_cache),
+                "memory_size_bytes": self.memory_size_bytes,
+                "memory_max_mb": self.memory_max_bytes / (1024 * 1024),
+                "namespaces": {name: asdict(stats) for name, stats in self.namespace_stats.items()}
+            }
 
 
 class PerformanceMonitor:
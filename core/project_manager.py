@@ -13,6 +13,7 @@ from datetime import datetime
 from .data_structures import Project, Element, TimeSegment, AnimationSolution
 from .logger import get_logger
 from .project_cache import project_cache, performance_monitor
+from .project_store import ChunkedProjectStore, CHUNKED_FORMAT_VERSION
 
 logger = get_logger("project_manager")
 
@@ -25,6 +26,9 @@ class ProjectManager:
         self.auto_save_enabled = True
         self.auto_save_interval = 300  # 5分钟
         self._auto_save_timer = None  # 自动保存定时器
+
+        # 存储格式: "chunked"（清单 + 内容寻址数据块）或 "json"（旧的单文件格式）
+        self.storage_format = "chunked"
         
         # 项目目录
         self.projects_dir = Path.home() / ".ai_animation_studio" / "projects"
@@ -47,7 +51,7 @@ class ProjectManager:
                 config_hash=hash(str(sorted(config.items()))) if config else 0
             )
 
-            cached_project = project_cache.get(cache_key)
+            cached_project = project_cache.get(cache_key, namespace="projects")
             if cached_project:
                 logger.info(f"从缓存创建项目: {name}")
                 cached_project.name = name  # 更新名称
@@ -81,7 +85,7 @@ class ProjectManager:
                 if config:
                     self._apply_config_to_project(cache_template, config)
                 self._setup_default_elements(cache_template)
-                project_cache.put(cache_key, cache_template)
+                project_cache.put(cache_key, cache_template, namespace="projects")
 
             self.current_project = project
             self.project_file = None
@@ -359,6 +363,17 @@ class ProjectManager:
             if create_backup and file_path.exists():
                 self._create_version_backup(file_path)
 
+            # 分块存储：只序列化和写入发生变化的数据块
+            if self.storage_format == "chunked":
+                success = self._save_chunked(file_path, incremental)
+                if success:
+                    self.project_file = file_path
+                    if not incremental:
+                        self._generate_project_thumbnail(file_path)
+                    logger.info(f"项目分块保存完成: {file_path}")
+                    return True
+                return False
+
             # 获取项目数据
             project_data = self._project_to_dict(self.current_project)
 
@@ -390,6 +405,29 @@ class ProjectManager:
             logger.error(f"保存项目失败: {e}")
             return False
 
+    def _save_chunked(self, file_path: Path, incremental: bool) -> bool:
+        """分块保存
+
+        增量保存时只序列化项目变更日志中自该文件上次保存以来记录过的实体；
+        完整保存会重新序列化所有实体（内容未变的数据块仍然不会重复写入），
+        可以捕获未通过 Project 的修改方法进行的原地修改。
+        保存到项目文件以外的位置（自动保存、另存为）时，以项目文件的清单为增量基准。
+        """
+        try:
+            store = ChunkedProjectStore(file_path)
+            base = None
+            if self.project_file and Path(self.project_file) != Path(file_path):
+                base = ChunkedProjectStore(self.project_file)
+            stats = store.save(self.current_project, self, incremental=incremental, base=base)
+
+            logger.debug(f"分块保存统计: 序列化 {stats['serialized']} 个实体, "
+                         f"写入 {stats['chunks_written']} 个数据块")
+            return True
+
+        except Exception as e:
+            logger.error(f"分块保存失败: {e}")
+            return False
+
     def _create_version_backup(self, file_path: Path):
         """创建版本历史备份"""
         try:
@@ -404,12 +442,17 @@ class ProjectManager:
                 for old_backup in existing_backups[:-9]:
                     old_backup.unlink()
 
+                # 回收只被已删除备份引用的数据块
+                ChunkedProjectStore.collect_garbage(file_path.parent)
+
             # 创建新备份
             timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
             backup_path = backup_dir / f"{file_path.stem}_v{timestamp}.aas"
 
-            import shutil
-            shutil.copy2(file_path, backup_path)
+            # 分块格式只需复制清单，数据块不可变且由备份共享
+            store = ChunkedProjectStore(file_path)
+            if not store.copy_manifest(backup_path):
+                shutil.copy2(file_path, backup_path)
 
             logger.debug(f"创建版本备份: {backup_path}")
 
@@ -482,15 +525,13 @@ class ProjectManager:
     def _generate_project_thumbnail(self, file_path: Path):
         """生成项目缩略图"""
         try:
-            # 这里可以实现缩略图生成逻辑
-            # 简化实现：创建一个占位符文件
-            thumbnail_path = file_path.parent / f"{file_path.stem}_thumbnail.png"
+            from core.scene_rasterizer import save_project_thumbnail
 
-            # 实际实现中，这里应该渲染项目的第一帧或关键帧
-            # 现在只创建一个标记文件
-            thumbnail_path.touch()
+            thumbnail_path = file_path.parent / f"{file_path.stem}_thumbnail.png"
 
-            logger.debug(f"生成项目缩略图: {thumbnail_path}")
+            # 渲染项目第一帧
+            if save_project_thumbnail(self.current_project, thumbnail_path):
+                logger.debug(f"生成项目缩略图: {thumbnail_path}")
 
         except Exception as e:
             logger.warning(f"生成缩略图失败: {e}")
@@ -708,71 +749,63 @@ class ProjectManager:
     
     def _project_to_dict(self, project: Project) -> Dict[str, Any]:
         """将项目转换为字典"""
+        project_data = self.project_meta_to_dict(project)
+        project_data.update({
+            "elements": {
+                element_id: self.element_to_dict(element)
+                for element_id, element in project.elements.items()
+            },
+            "time_segments": [self.segment_to_dict(segment) for segment in project.time_segments],
+            "animation_solutions": {
+                segment_id: self.solutions_to_list(solutions)
+                for segment_id, solutions in project.animation_solutions.items()
+            }
+        })
+        return project_data
+
+    def _dict_to_project(self, data: Dict[str, Any]) -> Project:
+        """从字典创建项目"""
+        project = self.project_meta_from_dict(data)
+
+        # 解析元素
+        for element_id, element_data in data.get("elements", {}).items():
+            project.elements[element_id] = self.element_from_dict(element_data)
+
+        # 解析时间段
+        for segment_data in data.get("time_segments", []):
+            project.time_segments.append(self.segment_from_dict(segment_data))
+
+        # 解析动画方案
+        for segment_id, solutions_data in data.get("animation_solutions", {}).items():
+            project.animation_solutions[segment_id] = self.solutions_from_list(solutions_data)
+
+        return project
+
+    # ==================== 序列化方法（单文件格式与分块存储共用） ====================
+
+    @staticmethod
+    def project_meta_to_dict(project: Project) -> Dict[str, Any]:
+        """将项目级属性（不含元素、时间段、方案）转换为字典"""
         return {
             "project_id": project.project_id,
             "name": project.name,
             "description": project.description,
             "canvas_width": project.canvas_width,
             "canvas_height": project.canvas_height,
-            "total_duration": project.total_duration,
+            "total_duration": project.duration,
+            "duration": project.duration,
+            "fps": project.fps,
+            "resolution": project.resolution,
+            "settings": project.settings,
             "audio_file": project.audio_file,
-            "elements": {
-                element_id: {
-                    "element_id": element.element_id,
-                    "name": element.name,
-                    "element_type": element.element_type.value,
-                    "content": element.content,
-                    "position": element.position.to_dict(),
-                    "transform": element.transform.__dict__,
-                    "style": element.style.__dict__,
-                    "visible": element.visible,
-                    "locked": element.locked,
-                    "parent_id": element.parent_id,
-                    "children_ids": element.children_ids,
-                    "custom_data": element.custom_data,
-                    "created_at": element.created_at.isoformat()
-                }
-                for element_id, element in project.elements.items()
-            },
-            "time_segments": [
-                {
-                    "segment_id": segment.segment_id,
-                    "start_time": segment.start_time,
-                    "end_time": segment.end_time,
-                    "description": segment.description,
-                    "narration_text": segment.narration_text,
-                    "animation_type": segment.animation_type.value,
-                    "elements": segment.elements
-                }
-                for segment in project.time_segments
-            ],
-            "animation_solutions": {
-                segment_id: [
-                    {
-                        "solution_id": solution.solution_id,
-                        "name": solution.name,
-                        "description": solution.description,
-                        "html_code": solution.html_code,
-                        "tech_stack": solution.tech_stack.value,
-                        "element_states": [state.to_dict() for state in solution.element_states],
-                        "applied_rules": solution.applied_rules,
-                        "complexity_level": solution.complexity_level,
-                        "recommended": solution.recommended,
-                        "generated_at": solution.generated_at.isoformat()
-                    }
-                    for solution in solutions
-                ]
-                for segment_id, solutions in project.animation_solutions.items()
-            },
             "animation_rules": project.animation_rules,
             "created_at": project.created_at.isoformat(),
             "modified_at": project.modified_at.isoformat()
         }
-    
-    def _dict_to_project(self, data: Dict[str, Any]) -> Project:
-        """从字典创建项目"""
-        from .data_structures import ElementType, AnimationType, TechStack, Point, Transform, ElementStyle
-        
+
+    @staticmethod
+    def project_meta_from_dict(data: Dict[str, Any]) -> Project:
+        """从字典创建只包含项目级属性的项目"""
         project = Project(
             project_id=data.get("project_id", ""),
             name=data.get("name", "未知项目"),
@@ -783,78 +816,144 @@ class ProjectManager:
             audio_file=data.get("audio_file"),
             animation_rules=data.get("animation_rules", "")
         )
-        
+
+        if "fps" in data:
+            project.fps = data["fps"]
+        if data.get("resolution"):
+            project.resolution = data["resolution"]
+        if data.get("settings"):
+            project.settings = data["settings"]
+
         # 解析创建和修改时间
         if "created_at" in data:
             project.created_at = datetime.fromisoformat(data["created_at"])
         if "modified_at" in data:
             project.modified_at = datetime.fromisoformat(data["modified_at"])
-        
-        # 解析元素
-        for element_id, element_data in data.get("elements", {}).items():
-            element = Element(
-                element_id=element_data["element_id"],
-                name=element_data["name"],
-                element_type=ElementType(element_data["element_type"]),
-                content=element_data["content"],
-                position=Point.from_dict(element_data["position"]),
-                visible=element_data.get("visible", True),
-                locked=element_data.get("locked", False),
-                parent_id=element_data.get("parent_id"),
-                children_ids=element_data.get("children_ids", []),
-                custom_data=element_data.get("custom_data", {})
-            )
-            
-            # 解析变换和样式
-            if "transform" in element_data:
-                element.transform = Transform(**element_data["transform"])
-            if "style" in element_data:
-                element.style = ElementStyle(**element_data["style"])
-            
-            # 解析创建时间
-            if "created_at" in element_data:
-                element.created_at = datetime.fromisoformat(element_data["created_at"])
-            
-            project.elements[element_id] = element
-        
-        # 解析时间段
-        for segment_data in data.get("time_segments", []):
-            segment = TimeSegment(
-                segment_id=segment_data["segment_id"],
-                start_time=segment_data["start_time"],
-                end_time=segment_data["end_time"],
-                description=segment_data.get("description", ""),
-                narration_text=segment_data.get("narration_text", ""),
-                animation_type=AnimationType(segment_data["animation_type"]),
-                elements=segment_data.get("elements", [])
-            )
-            project.time_segments.append(segment)
-        
-        # 解析动画方案
-        for segment_id, solutions_data in data.get("animation_solutions", {}).items():
-            solutions = []
-            for solution_data in solutions_data:
-                solution = AnimationSolution(
-                    solution_id=solution_data["solution_id"],
-                    name=solution_data["name"],
-                    description=solution_data.get("description", ""),
-                    html_code=solution_data.get("html_code", ""),
-                    tech_stack=TechStack(solution_data["tech_stack"]),
-                    applied_rules=solution_data.get("applied_rules", []),
-                    complexity_level=solution_data.get("complexity_level", "medium"),
-                    recommended=solution_data.get("recommended", False)
-                )
-                
-                # 解析生成时间
-                if "generated_at" in solution_data:
-                    solution.generated_at = datetime.fromisoformat(solution_data["generated_at"])
-                
-                solutions.append(solution)
-            
-            project.animation_solutions[segment_id] = solutions
-        
+
         return project
 
+    @staticmethod
+    def element_to_dict(element: Element) -> Dict[str, Any]:
+        """将元素转换为字典"""
+        return {
+            "element_id": element.element_id,
+            "name": element.name,
+            "element_type": element.element_type.value,
+            "content": element.content,
+            "position": element.position.to_dict(),
+            "transform": element.transform.__dict__,
+            "style": element.style.__dict__,
+            "visible": element.visible,
+            "locked": element.locked,
+            "parent_id": element.parent_id,
+            "children_ids": element.children_ids,
+            "custom_data": element.custom_data,
+            "created_at": element.created_at.isoformat()
+        }
+
+    @staticmethod
+    def element_from_dict(element_data: Dict[str, Any]) -> Element:
+        """从字典创建元素"""
+        from .data_structures import ElementType, Point, Transform, ElementStyle
+
+        element = Element(
+            element_id=element_data["element_id"],
+            name=element_data["name"],
+            element_type=ElementType(element_data["element_type"]),
+            content=element_data["content"],
+            position=Point.from_dict(element_data["position"]),
+            visible=element_data.get("visible", True),
+            locked=element_data.get("locked", False),
+            parent_id=element_data.get("parent_id"),
+            children_ids=element_data.get("children_ids", []),
+            custom_data=element_data.get("custom_data", {})
+        )
+
+        # 解析变换和样式
+        if "transform" in element_data:
+            element.transform = Transform(**element_data["transform"])
+        if "style" in element_data:
+            element.style = ElementStyle(**element_data["style"])
+
+        # 解析创建时间
+        if "created_at" in element_data:
+            element.created_at = datetime.fromisoformat(element_data["created_at"])
+
+        return element
+
+    @staticmethod
+    def segment_to_dict(segment: TimeSegment) -> Dict[str, Any]:
+        """将时间段转换为字典"""
+        return {
+            "segment_id": segment.segment_id,
+            "start_time": segment.start_time,
+            "end_time": segment.end_time,
+            "description": segment.description,
+            "narration_text": segment.narration_text,
+            "animation_type": segment.animation_type.value,
+            "elements": segment.elements
+        }
+
+    @staticmethod
+    def segment_from_dict(segment_data: Dict[str, Any]) -> TimeSegment:
+        """从字典创建时间段"""
+        from .data_structures import AnimationType
+
+        return TimeSegment(
+            segment_id=segment_data["segment_id"],
+            start_time=segment_data["start_time"],
+            end_time=segment_data["end_time"],
+            description=segment_data.get("description", ""),
+            narration_text=segment_data.get("narration_text", ""),
+            animation_type=AnimationType(segment_data["animation_type"]),
+            elements=segment_data.get("elements", [])
+        )
+
+    @staticmethod
+    def solutions_to_list(solutions: List[AnimationSolution]) -> List[Dict[str, Any]]:
+        """将方案列表转换为字典列表"""
+        return [
+            {
+                "solution_id": solution.solution_id,
+                "name": solution.name,
+                "description": solution.description,
+                "html_code": solution.html_code,
+                "tech_stack": solution.tech_stack.value,
+                "element_states": [state.to_dict() for state in solution.element_states],
+                "applied_rules": solution.applied_rules,
+                "complexity_level": solution.complexity_level,
+                "recommended": solution.recommended,
+                "generated_at": solution.generated_at.isoformat()
+            }
+            for solution in solutions
+        ]
+
+    @staticmethod
+    def solutions_from_list(solutions_data: List[Dict[str, Any]]) -> List[AnimationSolution]:
+        """从字典列表创建方案列表"""
+        from .data_structures import TechStack
+
+        solutions = []
+        for solution_data in solutions_data:
+            solution = AnimationSolution(
+                solution_id=solution_data["solution_id"],
+                name=solution_data["name"],
+                description=solution_data.get("description", ""),
+                html_code=solution_data.get("html_code", ""),
+                tech_stack=TechStack(solution_data["tech_stack"]),
+                applied_rules=solution_data.get("applied_rules", []),
+                complexity_level=solution_data.get("complexity_level", "medium"),
+                recommended=solution_data.get("recommended", False)
+            )
+
+            # 解析生成时间
+            if "generated_at" in solution_data:
+                solution.generated_at = datetime.fromisoformat(solution_data["generated_at"])
+
+            solutions.append(solution)
+
+        return solutions
+
     # ==================== 元素管理方法 ====================
 
     def add_element(self, element):
@@ -890,8 +989,7 @@ class ProjectManager:
             raise ValueError("没有打开的项目")
 
         if element.element_id in self.current_project.elements:
-            self.current_project.elements[element.element_id] = element
-            self.current_project.modified_at = datetime.now()
+            self.current_project.update_element(element)
             logger.info(f"更新元素: {element.name} ({element.element_id})")
         else:
             raise ValueError(f"元素不存在: {element.element_id}")
@@ -986,7 +1084,7 @@ class ProjectManager:
         for i, segment in enumerate(self.current_project.time_segments):
             if segment.segment_id == segment_id:
                 removed_segment = self.current_project.time_segments.pop(i)
-                self.current_project.modified_at = datetime.now()
+                self.current_project.mark_dirty("time_segments", segment_id)
                 logger.info(f"移除时间段: {removed_segment.start_time}s-{removed_segment.end_time}s")
                 return
 
@@ -1011,7 +1109,7 @@ class ProjectManager:
         for i, segment in enumerate(self.current_project.time_segments):
             if segment.segment_id == time_segment.segment_id:
                 self.current_project.time_segments[i] = time_segment
-                self.current_project.modified_at = datetime.now()
+                self.current_project.mark_dirty("time_segments", time_segment.segment_id)
                 logger.info(f"更新时间段: {time_segment.start_time}s-{time_segment.end_time}s")
                 return
 
@@ -1070,7 +1168,7 @@ class ProjectManager:
         """检查版本兼容性"""
         try:
             format_version = version_info.get("format_version", 1)
-            current_format_version = 1  # 当前支持的格式版本
+            current_format_version = CHUNKED_FORMAT_VERSION  # 当前支持的格式版本
 
             # 支持当前版本和之前的版本
             if format_version <= current_format_version:
@@ -1103,6 +1201,11 @@ class ProjectManager:
     def _load_project_safe(self, file_path: Path) -> Optional[Project]:
         """安全加载项目"""
         try:
+            # 分块格式：读取清单，动画方案按需加载
+            store = ChunkedProjectStore(file_path)
+            if store.open() is not None:
+                return store.load(self)
+
             with open(file_path, 'r', encoding='utf-8') as f:
                 project_data = json.load(f)
 
@@ -1145,6 +1248,7 @@ class ProjectManager:
             if element.parent_id and element.parent_id not in project.elements:
                 logger.warning(f"元素 {element.name} 的父元素不存在，已清除父元素引用")
                 element.parent_id = None
+                project.mark_dirty("elements", element_id)
 
     def _repair_project_data(self, project: Project):
         """修复项目数据问题"""
@@ -0,0 +1,367 @@
+"""
+AI Animation Studio - 分块项目存储
+以"清单 + 内容寻址数据块"的格式保存项目，增量保存只写入发生变化的数据块
+"""
+
+import os
+import json
+import uuid
+import shutil
+import hashlib
+from collections.abc import MutableMapping
+from pathlib import Path
+from typing import Dict, Any, Optional, List, Iterator, Set
+
+from .logger import get_logger
+
+logger = get_logger("project_store")
+
+# 分块格式的版本号（旧的单文件JSON格式为1）
+CHUNKED_FORMAT_VERSION = 2
+
+# 同一目录下的所有清单共享一个数据块目录，相同内容只存储一次
+CHUNK_DIR_NAME = ".aas_chunks"
+
+
+def _atomic_write_bytes(path: Path, data: bytes):
+    """原子写入文件（先写临时文件再替换）"""
+    tmp_path = path.with_name(f"{path.name}.{os.getpid()}.tmp")
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+class LazyChunkMap(MutableMapping):
+    """按需加载数据块的映射
+
+    加载项目时只记录键到数据块摘要的对应关系，首次访问某个键时才读取并解码数据块。
+    未被访问过的条目保存时直接复用原摘要，无需解码（保存到其他数据块目录时只复制数据块文件）。
+    """
+
+    def __init__(self, store: 'ChunkedProjectStore', digests: Dict[str, str], decoder):
+        self._store = store
+        self._digests = dict(digests)
+        self._decoder = decoder
+        self._loaded: Dict[str, Any] = {}
+
+    def __getitem__(self, key):
+        if key in self._loaded:
+            return self._loaded[key]
+        if key not in self._digests:
+            raise KeyError(key)
+        value = self._decoder(self._store.read_chunk(self._digests[key]))
+        self._loaded[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._loaded[key] = value
+        self._digests.pop(key, None)
+
+    def __delitem__(self, key):
+        if key not in self._loaded and key not in self._digests:
+            raise KeyError(key)
+        self._loaded.pop(key, None)
+        self._digests.pop(key, None)
+
+    def __iter__(self) -> Iterator:
+        yield from self._loaded
+        for key in list(self._digests):
+            if key not in self._loaded:
+                yield key
+
+    def __len__(self) -> int:
+        return len(self._loaded.keys() | self._digests.keys())
+
+    def __repr__(self) -> str:
+        return f"LazyChunkMap(loaded={len(self._loaded)}, total={len(self)})"
+
+    @property
+    def store(self) -> 'ChunkedProjectStore':
+        """条目所在的存储"""
+        return self._store
+
+    def get_unloaded_digest(self, key) -> Optional[str]:
+        """如果条目尚未加载，返回其原摘要"""
+        if key in self._loaded or key not in self._digests:
+            return None
+        return self._digests[key]
+
+
+class ChunkedProjectStore:
+    """分块项目存储
+
+    磁盘布局::
+
+        <dir>/<name>.aas                 清单（JSON，仅包含项目属性和数据块摘要）
+        <dir>/.aas_chunks/ab/abcd...json 数据块（每个元素、时间段、方案列表一个）
+
+    数据块以内容摘要命名且不可变，保存时已存在的数据块直接跳过写入。
+    """
+
+    def __init__(self, manifest_path: Path):
+        self.manifest_path = Path(manifest_path)
+        self.chunk_dir = self.manifest_path.parent / CHUNK_DIR_NAME
+        self._manifest: Optional[Dict[str, Any]] = None
+        self._written_count = 0
+
+    # ==================== 清单 ====================
+
+    @staticmethod
+    def is_chunked_manifest(data: Dict[str, Any]) -> bool:
+        """判断JSON数据是否为分块格式的清单"""
+        return isinstance(data, dict) and data.get("format_version", 1) >= CHUNKED_FORMAT_VERSION \
+            and "chunks" in data
+
+    def open(self) -> Optional[Dict[str, Any]]:
+        """打开清单（不读取任何数据块）"""
+        if self._manifest is not None:
+            return self._manifest
+
+        if not self.manifest_path.exists():
+            return None
+
+        try:
+            with open(self.manifest_path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+        except Exception as e:
+            logger.warning(f"读取项目清单失败 {self.manifest_path}: {e}")
+            return None
+
+        if not self.is_chunked_manifest(data):
+            return None
+
+        # 清单可以引用其他目录中的数据块（例如版本备份）
+        chunk_dir = data.get("chunk_dir")
+        if chunk_dir:
+            self.chunk_dir = (self.manifest_path.parent / chunk_dir)
+
+        self._manifest = data
+        return data
+
+    def _write_manifest(self, manifest: Dict[str, Any]):
+        """原子写入清单"""
+        data = json.dumps(manifest, ensure_ascii=False, separators=(',', ':'), default=str)
+        _atomic_write_bytes(self.manifest_path, data.encode('utf-8'))
+        self._manifest = manifest
+
+    def copy_manifest(self, target_path: Path) -> bool:
+        """复制清单到其他位置，副本继续引用本存储的数据块目录"""
+        manifest = self.open()
+        if manifest is None:
+            return False
+
+        target_path = Path(target_path)
+        copied = dict(manifest)
+        copied["chunk_dir"] = os.path.relpath(self.chunk_dir, target_path.parent)
+        ChunkedProjectStore(target_path)._write_manifest(copied)
+        return True
+
+    # ==================== 数据块 ====================
+
+    def _chunk_path(self, digest: str) -> Path:
+        return self.chunk_dir / digest[:2] / f"{digest}.json"
+
+    def write_chunk(self, payload: Any) -> str:
+        """写入数据块，返回内容摘要；内容相同的数据块只写一次"""
+        data = json.dumps(payload, ensure_ascii=False, sort_keys=True,
+                          separators=(',', ':'), default=str).encode('utf-8')
+        digest = hashlib.blake2b(data, digest_size=20).hexdigest()
+
+        chunk_path = self._chunk_path(digest)
+        if not chunk_path.exists():
+            chunk_path.parent.mkdir(parents=True, exist_ok=True)
+            _atomic_write_bytes(chunk_path, data)
+            self._written_count += 1
+
+        return digest
+
+    def import_chunk(self, source: 'ChunkedProjectStore', digest: str):
+        """从其他存储复制数据块文件（不解码）；目录相同时无需复制"""
+        chunk_path = self._chunk_path(digest)
+        if not chunk_path.exists():
+            chunk_path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = chunk_path.with_name(f"{chunk_path.name}.{os.getpid()}.tmp")
+            shutil.copyfile(source._chunk_path(digest), tmp_path)
+            os.replace(tmp_path, chunk_path)
+            self._written_count += 1
+
+    def read_chunk(self, digest: str) -> Any:
+        """读取数据块"""
+        with open(self._chunk_path(digest), 'r', encoding='utf-8') as f:
+            return json.load(f)
+
+    # ==================== 保存 ====================
+
+    def save(self, project, codec, incremental: bool = True,
+             base: Optional['ChunkedProjectStore'] = None) -> Dict[str, int]:
+        """保存项目
+
+        增量保存时，如果磁盘上的清单是由当前项目保存或加载的（保存令牌是项目
+        变更日志中的检查点），则只序列化自该检查点以来变更日志记录过的实体。
+
+        Args:
+            project: 要保存的项目
+            codec: 提供 project_meta_to_dict / element_to_dict / segment_to_dict /
+                solutions_to_list 的序列化器（通常为 ProjectManager）
+            incremental: 为False时重新序列化所有实体
+            base: 本清单没有可用的检查点时作为增量基准的其他清单（例如自动保存时的项目文件），
+                复用的数据块从其目录复制
+
+        Returns:
+            保存统计：序列化的实体数和新写入的数据块数
+        """
+        self._written_count = 0
+        serialized = 0
+
+        dirty: Dict[str, Set[str]] = {}
+        previous, previous_store = None, self
+        for candidate in ((self, base) if incremental else ()):
+            manifest = candidate.open() if candidate is not None else None
+            base_generation = project.journal.get_checkpoint(manifest.get("save_token")) if manifest else None
+            if base_generation is not None and manifest.get("project_id") == project.project_id:
+                previous, previous_store = manifest, candidate
+                dirty = project.changes_since(base_generation)
+                break
+        previous_chunks = previous["chunks"] if previous else {}
+
+        containers = {
+            "elements": project.elements,
+            "time_segments": {segment.segment_id: segment for segment in project.time_segments},
+            "animation_solutions": project.animation_solutions,
+        }
+        lazy_store = project.animation_solutions.store \
+            if isinstance(project.animation_solutions, LazyChunkMap) else None
+
+        def resolve(kind: str, entity_id: str, encode) -> str:
+            nonlocal serialized
+            # 未修改的实体直接复用上次保存的摘要
+            old_digest = previous_chunks.get(kind, {}).get(entity_id)
+            if old_digest and entity_id not in dirty.get(kind, ()):
+                if previous_store is not self:
+                    self.import_chunk(previous_store, old_digest)
+                return old_digest
+
+            # 从未加载过的延迟条目无需解码
+            container = containers[kind]
+            if isinstance(container, LazyChunkMap):
+                digest = container.get_unloaded_digest(entity_id)
+                if digest:
+                    if lazy_store is not self:
+                        self.import_chunk(lazy_store, digest)
+                    return digest
+
+            serialized += 1
+            return self.write_chunk(encode(container[entity_id]))
+
+        chunks = {
+            "elements": {
+                element_id: resolve("elements", element_id, codec.element_to_dict)
+                for element_id in project.elements
+            },
+            "time_segments": {
+                segment.segment_id: resolve("time_segments", segment.segment_id, codec.segment_to_dict)
+                for segment in project.time_segments
+            },
+            "animation_solutions": {
+                segment_id: resolve("animation_solutions", segment_id, codec.solutions_to_list)
+                for segment_id in project.animation_solutions
+            },
+        }
+
+        save_token = uuid.uuid4().hex
+        manifest = codec.project_meta_to_dict(project)
+        manifest.update({
+            "format_version": CHUNKED_FORMAT_VERSION,
+            "save_token": save_token,
+            "segment_order": [segment.segment_id for segment in project.time_segments],
+            "chunks": chunks,
+        })
+        if self.chunk_dir != self.manifest_path.parent / CHUNK_DIR_NAME:
+            manifest["chunk_dir"] = os.path.relpath(self.chunk_dir, self.manifest_path.parent)
+
+        self._write_manifest(manifest)
+        project.journal.add_checkpoint(save_token)
+
+        stats = {"serialized": serialized, "chunks_written": self._written_count}
+        logger.debug(f"分块保存完成 {self.manifest_path.name}: {stats}")
+        return stats
+
+    # ==================== 加载 ====================
+
+    def load_element(self, element_id: str, codec):
+        """按需加载单个元素"""
+        manifest = self.open()
+        digest = manifest["chunks"]["elements"][element_id] if manifest else None
+        if digest is None:
+            return None
+        return codec.element_from_dict(self.read_chunk(digest))
+
+    def load(self, codec, lazy_solutions: bool = True):
+        """加载项目
+
+        元素和时间段立即加载（舞台和时间轴打开即需要），
+        动画方案列表（包含大段HTML代码）默认按需加载。
+        """
+        manifest = self.open()
+        if manifest is None:
+            return None
+
+        project = codec.project_meta_from_dict(manifest)
+        chunks = manifest["chunks"]
+
+        for element_id, digest in chunks.get("elements", {}).items():
+            project.elements[element_id] = codec.element_from_dict(self.read_chunk(digest))
+
+        segment_chunks = chunks.get("time_segments", {})
+        for segment_id in manifest.get("segment_order", list(segment_chunks)):
+            digest = segment_chunks.get(segment_id)
+            if digest:
+                project.time_segments.append(codec.segment_from_dict(self.read_chunk(digest)))
+
+        solution_chunks = chunks.get("animation_solutions", {})
+        if lazy_solutions:
+            project.animation_solutions = LazyChunkMap(self, solution_chunks, codec.solutions_from_list)
+        else:
+            for segment_id, digest in solution_chunks.items():
+                project.animation_solutions[segment_id] = codec.solutions_from_list(self.read_chunk(digest))
+
+        # 刚加载的项目与清单一致，后续保存回该清单可以增量进行
+        if manifest.get("save_token"):
+            project.journal.add_checkpoint(manifest["save_token"])
+        return project
+
+    # ==================== 维护 ====================
+
+    @staticmethod
+    def collect_garbage(directory: Path) -> int:
+        """删除目录中不再被任何清单引用的数据块
+
+        扫描该目录及其 *_versions 子目录中的所有清单。
+        """
+        directory = Path(directory)
+        chunk_dir = directory / CHUNK_DIR_NAME
+        if not chunk_dir.exists():
+            return 0
+
+        referenced: Set[str] = set()
+        manifests: List[Path] = list(directory.glob("*.aas")) + list(directory.glob("*_versions/*.aas"))
+        for manifest_path in manifests:
+            store = ChunkedProjectStore(manifest_path)
+            manifest = store.open()
+            if manifest is None or store.chunk_dir.resolve() != chunk_dir.resolve():
+                continue
+            for digests in manifest["chunks"].values():
+                referenced.update(digests.values())
+
+        removed = 0
+        for chunk_file in chunk_dir.glob("*/*.json"):
+            if chunk_file.stem not in referenced:
+                try:
+                    chunk_file.unlink()
+                    removed += 1
+                except OSError as e:
+                    logger.warning(f"删除数据块失败 {chunk_file}: {e}")
+
+        if removed:
+            logger.info(f"清理未引用的数据块: {removed} 个")
+        return removed
@@ -0,0 +1,426 @@
+"""
+AI Animation Studio - 场景光栅化
+不启动浏览器，直接用 QPainter 按元素的位置、变换（Transform）和样式（ElementStyle）把项目某一时刻的画面
+绘制到 QImage，用于项目/模板缩略图、导航器小地图和拖动时间轴时的快速预览。
+
+QImage 和 QPainter 可以在工作线程中使用，但进程中必须已经存在 QGuiApplication（提供字体数据库）；
+没有图形界面的进程可先在主线程调用 ensure_gui_application()。每个线程应使用自己的 SceneRasterizer 实例。
+"""
+
+import re
+import threading
+from bisect import bisect_right
+from dataclasses import fields, replace
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import Qt, QPointF, QRectF
+from PyQt6.QtGui import (
+    QBrush, QColor, QFont, QFontMetricsF, QGuiApplication, QImage, QLinearGradient,
+    QPainter, QPen, QPolygonF
+)
+
+from core.data_structures import Element, ElementStyle, ElementType, Point, Project, Transform
+from core.logger import get_logger
+
+logger = get_logger("scene_rasterizer")
+
+try:
+    from PyQt6.QtSvg import QSvgRenderer
+    SVG_AVAILABLE = True
+except ImportError:
+    SVG_AVAILABLE = False
+
+# 宽高为 auto 时各类元素的默认尺寸（画布像素）；文本按内容测量
+DEFAULT_ELEMENT_SIZES = {
+    ElementType.IMAGE: (200, 150),
+    ElementType.SVG: (150, 150),
+    ElementType.SHAPE: (100, 100),
+    ElementType.RECTANGLE: (100, 100),
+    ElementType.CIRCLE: (100, 100),
+    ElementType.VIDEO: (320, 180),
+}
+# 不产生可见内容的元素类型
+NON_VISUAL_TYPES = {ElementType.AUDIO, ElementType.GROUP}
+
+DEFAULT_FONT_SIZE = 16.0
+DEFAULT_TEXT_COLOR = "#000000"
+DEFAULT_SHAPE_COLOR = "#4a90e2"
+
+_RGB_PATTERN = re.compile(r'rgba?\(\s*([\d.]+)\s*,\s*([\d.]+)\s*,\s*([\d.]+)\s*(?:,\s*([\d.]+)\s*)?\)')
+_LENGTH_PATTERN = re.compile(r'^\s*(-?[\d.]+)\s*(px|pt|em|rem|%)?\s*$')
+
+_gui_application = None
+_gui_lock = threading.Lock()
+
+
+def ensure_gui_application():
+    """没有 QGuiApplication 时创建一个离屏实例（只能在主线程调用）"""
+    global _gui_application
+    with _gui_lock:
+        app = QGuiApplication.instance()
+        if app is None:
+            _gui_application = QGuiApplication(["ai_animation_studio", "-platform", "offscreen"])
+            app = _gui_application
+        return app
+
+
+def parse_length(value: Any, reference: float = 0.0, default: Optional[float] = None) -> Optional[float]:
+    """解析CSS长度（px、pt、em、%）；auto/inherit 等返回 default"""
+    if isinstance(value, (int, float)):
+        return float(value)
+    match = _LENGTH_PATTERN.match(str(value or ""))
+    if not match:
+        return default
+
+    number = float(match.group(1))
+    unit = match.group(2) or "px"
+    if unit == "%":
+        return reference * number / 100
+    if unit in ("em", "rem"):
+        return number * DEFAULT_FONT_SIZE
+    if unit == "pt":
+        return number * 4 / 3
+    return number
+
+
+def parse_color(value: Any, default: Optional[str] = None) -> Optional[QColor]:
+    """解析CSS颜色；transparent/none/inherit 返回 default 对应的颜色（default为None时返回None）"""
+    text = str(value or "").strip().lower()
+    if text in ("", "transparent", "none", "inherit", "initial", "auto"):
+        return QColor(default) if default else None
+
+    match = _RGB_PATTERN.match(text)
+    if match:
+        r, g, b = (int(float(match.group(i))) for i in range(1, 4))
+        alpha = float(match.group(4)) if match.group(4) is not None else 1.0
+        color = QColor(r, g, b)
+        color.setAlphaF(max(0.0, min(1.0, alpha)))
+        return color
+
+    color = QColor(text)
+    if color.isValid():
+        return color
+    return QColor(default) if default else None
+
+
+def parse_border(value: Any) -> Tuple[float, Optional[QColor]]:
+    """解析CSS border 简写，返回 (宽度, 颜色)"""
+    width, color = 0.0, None
+    for part in re.findall(r'rgba?\([^)]*\)|\S+', str(value or "")):
+        length = parse_length(part)
+        if length is not None:
+            width = length
+        elif part not in ("solid", "dashed", "dotted", "double", "none"):
+            color = parse_color(part)
+    if color is None and width > 0:
+        color = QColor(DEFAULT_TEXT_COLOR)
+    return width, color
+
+
+def _lerp_transform(a: Transform, b: Transform, t: float) -> Transform:
+    return Transform(**{f.name: getattr(a, f.name) + (getattr(b, f.name) - getattr(a, f.name)) * t
+                        for f in fields(Transform)})
+
+
+def resolve_element_states(project: Project, time: float) -> Dict[str, Tuple[Transform, ElementStyle]]:
+    """按项目时间解析各元素的变换和样式
+
+    取该时刻所在时间段的推荐方案（没有推荐时取第一个方案）中的元素状态，在相邻两个状态之间线性插值变换和透明度。
+    状态时间戳都不超过时间段时长时视为相对时间段开始的时间，否则视为项目时间。
+    """
+    segment = project.get_segment_at_time(time)
+    if segment is None:
+        return {}
+
+    solutions = project.animation_solutions.get(segment.segment_id) or []
+    solution = next((s for s in solutions if s.recommended), solutions[0] if solutions else None)
+    if solution is None or not solution.element_states:
+        return {}
+
+    states_by_element: Dict[str, List] = {}
+    for state in solution.element_states:
+        states_by_element.setdefault(state.element_id, []).append(state)
+
+    resolved = {}
+    for element_id, states in states_by_element.items():
+        states.sort(key=lambda s: s.timestamp)
+        timestamps = [s.timestamp for s in states]
+        local_time = time - segment.start_time if timestamps[-1] <= segment.duration else time
+
+        index = bisect_right(timestamps, local_time)
+        if index == 0:
+            resolved[element_id] = (states[0].transform, states[0].style)
+        elif index == len(states):
+            resolved[element_id] = (states[-1].transform, states[-1].style)
+        else:
+            before, after = states[index - 1], states[index]
+            span = after.timestamp - before.timestamp
+            t = (local_time - before.timestamp) / span if span > 0 else 1.0
+            style = replace(before.style,
+                            opacity=before.style.opacity + (after.style.opacity - before.style.opacity) * t)
+            resolved[element_id] = (_lerp_transform(before.transform, after.transform, t), style)
+
+    return resolved
+
+
+class SceneRasterizer:
+    """把舞台元素绘制到 QImage"""
+
+    def __init__(self, canvas_width: int = 1920, canvas_height: int = 1080, background: Any = "#ffffff"):
+        self.canvas_width = canvas_width
+        self.canvas_height = canvas_height
+        self.background = background
+        self._images: Dict[str, QImage] = {}  # 图片元素缓存
+
+    @classmethod
+    def for_project(cls, project: Project) -> 'SceneRasterizer':
+        background = (project.settings or {}).get("background", "#ffffff")
+        return cls(project.canvas_width, project.canvas_height, background)
+
+    def render_project(self, project: Project, time: float = 0.0,
+                       width: Optional[int] = None, height: Optional[int] = None) -> Optional[QImage]:
+        """渲染项目在指定时刻的画面"""
+        return self.render(project.elements, width, height, resolve_element_states(project, time))
+
+    def render(self, elements: Dict[str, Element], width: Optional[int] = None, height: Optional[int] = None,
+               states: Optional[Dict[str, Tuple[Transform, ElementStyle]]] = None) -> Optional[QImage]:
+        """渲染元素，画布等比缩放并居中到 width x height"""
+        if QGuiApplication.instance() is None:
+            logger.warning("没有 QGuiApplication，无法光栅化场景")
+            return None
+
+        width = width or self.canvas_width
+        height = height or self.canvas_height
+        image = QImage(width, height, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(Qt.GlobalColor.transparent)
+
+        painter = QPainter(image)
+        try:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            painter.setRenderHint(QPainter.RenderHint.SmoothPixmapTransform)
+            painter.setRenderHint(QPainter.RenderHint.TextAntialiasing)
+
+            scale = min(width / self.canvas_width, height / self.canvas_height)
+            painter.translate((width - self.canvas_width * scale) / 2,
+                              (height - self.canvas_height * scale) / 2)
+            painter.scale(scale, scale)
+
+            canvas = QRectF(0, 0, self.canvas_width, self.canvas_height)
+            painter.setClipRect(canvas)
+            self._draw_background(painter, canvas)
+
+            states = states or {}
+            for element in self._paint_order(elements):
+                transform, style = states.get(element.element_id, (element.transform, element.style))
+                try:
+                    self._draw_element(painter, element, element.get_absolute_position(elements),
+                                       transform, style)
+                except Exception as e:
+                    logger.warning(f"光栅化元素失败 {element.element_id}: {e}")
+        finally:
+            painter.end()
+
+        return image
+
+    def render_element(self, element: Element, size: int) -> Optional[QImage]:
+        """单个元素居中的 size x size 预览图"""
+        style = element.style
+        width, height = self._element_size(element, style)
+        preview = replace(element, position=Point(0, 0), parent_id=None, visible=True,
+                          transform=replace(element.transform, translate_x=0.0, translate_y=0.0))
+
+        rasterizer = SceneRasterizer(max(1, int(width)), max(1, int(height)), None)
+        rasterizer._images = self._images
+        content = rasterizer.render({preview.element_id: preview}, size, size)
+        if content is None:
+            return None
+
+        image = QImage(size, size, QImage.Format.Format_ARGB32_Premultiplied)
+        image.fill(QColor("#f8f9fa"))
+        painter = QPainter(image)
+        painter.drawImage(0, 0, content)
+        painter.end()
+        return image
+
+    @staticmethod
+    def _paint_order(elements: Dict[str, Element]) -> List[Element]:
+        """按 z-index 排序，相同时保持插入顺序"""
+        visible = [element for element in elements.values()
+                   if element.visible and element.element_type not in NON_VISUAL_TYPES]
+        return sorted(visible, key=lambda element: getattr(element.style, "z_index", 1))
+
+    def _draw_background(self, painter: QPainter, canvas: QRectF):
+        background = self.background
+        if not background:
+            return
+
+        colors = None
+        if isinstance(background, dict):
+            colors = background.get("colors") if background.get("type") == "gradient" else None
+            background = background.get("color", "#ffffff")
+        elif isinstance(background, (list, tuple)):
+            colors = background
+
+        if colors:
+            gradient = QLinearGradient(canvas.topLeft(), canvas.bottomRight())
+            for i, color in enumerate(colors):
+                gradient.setColorAt(i / max(1, len(colors) - 1), parse_color(color, "#ffffff"))
+            painter.fillRect(canvas, QBrush(gradient))
+        else:
+            color = parse_color(background)
+            if color is not None:
+                painter.fillRect(canvas, color)
+
+    def _font(self, style: ElementStyle) -> QFont:
+        font = QFont()
+        family = str(style.font_family or "").split(",")[0].strip().strip("'\"")
+        if family and family != "inherit":
+            font.setFamily(family)
+        font.setPixelSize(max(1, int(parse_length(style.font_size, DEFAULT_FONT_SIZE, DEFAULT_FONT_SIZE))))
+        weight = str(style.font_weight)
+        if weight in ("bold", "bolder") or (weight.isdigit() and int(weight) >= 600):
+            font.setBold(True)
+        return font
+
+    def _element_size(self, element: Element, style: ElementStyle) -> Tuple[float, float]:
+        width = parse_length(style.width, self.canvas_width)
+        height = parse_length(style.height, self.canvas_height)
+        if width is not None and height is not None:
+            return width, height
+
+        if element.element_type == ElementType.TEXT:
+            metrics = QFontMetricsF(self._font(style))
+            text = element.content or element.name
+            if width is None:
+                width = max((metrics.horizontalAdvance(line) for line in text.split("\n")), default=0.0)
+            if height is None:
+                bounds = metrics.boundingRect(QRectF(0, 0, max(width, 1.0), 1e6),
+                                              int(Qt.TextFlag.TextWordWrap), text)
+                height = bounds.height()
+            return width, height
+
+        default_width, default_height = DEFAULT_ELEMENT_SIZES.get(element.element_type, (100, 100))
+        return (width if width is not None else default_width,
+                height if height is not None else default_height)
+
+    def _draw_element(self, painter: QPainter, element: Element, position, transform: Transform,
+                      style: ElementStyle):
+        opacity = max(0.0, min(1.0, float(style.opacity)))
+        if opacity <= 0:
+            return
+
+        width, height = self._element_size(element, style)
+        rect = QRectF(0, 0, width, height)
+
+        painter.save()
+        painter.setOpacity(opacity)
+        painter.translate(position.x + transform.translate_x, position.y + transform.translate_y)
+
+        # CSS transform-origin 默认为元素中心
+        painter.translate(width / 2, height / 2)
+        painter.rotate(transform.rotate_z)
+        painter.scale(transform.scale_x, transform.scale_y)
+        painter.translate(-width / 2, -height / 2)
+
+        element_type = element.element_type
+        radius = parse_length(style.border_radius, min(width, height), 0.0)
+        if element_type == ElementType.CIRCLE or (element_type == ElementType.SHAPE
+                                                   and element.content in ("circle", "ellipse")):
+            radius = None  # 椭圆
+
+        border_width, border_color = parse_border(style.border)
+        if element_type in (ElementType.SHAPE, ElementType.RECTANGLE, ElementType.CIRCLE):
+            fill = parse_color(style.background_color, DEFAULT_SHAPE_COLOR)
+        else:
+            fill = parse_color(style.background_color)
+
+        painter.setPen(QPen(border_color, border_width) if border_color is not None and border_width > 0
+                       else Qt.PenStyle.NoPen)
+        painter.setBrush(QBrush(fill) if fill is not None else Qt.BrushStyle.NoBrush)
+        if element_type == ElementType.SHAPE and element.content == "triangle":
+            painter.drawPolygon(QPolygonF([QPointF(width / 2, 0), QPointF(width, height), QPointF(0, height)]))
+        elif radius is None:
+            painter.drawEllipse(rect)
+        elif fill is not None or border_color is not None:
+            painter.drawRoundedRect(rect, radius, radius)
+
+        if element_type == ElementType.TEXT:
+            self._draw_text(painter, element, style, rect)
+        elif element_type == ElementType.IMAGE:
+            self._draw_image(painter, element.content, rect)
+        elif element_type == ElementType.SVG:
+            self._draw_svg(painter, element.content, rect)
+        elif element_type == ElementType.VIDEO:
+            self._draw_video_placeholder(painter, rect)
+
+        painter.restore()
+
+    def _draw_text(self, painter: QPainter, element: Element, style: ElementStyle, rect: QRectF):
+        painter.setFont(self._font(style))
+        painter.setPen(parse_color(style.color, DEFAULT_TEXT_COLOR))
+        align = {
+            "center": Qt.AlignmentFlag.AlignHCenter,
+            "right": Qt.AlignmentFlag.AlignRight,
+            "end": Qt.AlignmentFlag.AlignRight,
+        }.get(str(style.text_align), Qt.AlignmentFlag.AlignLeft)
+        painter.drawText(rect, int(align | Qt.AlignmentFlag.AlignTop) | int(Qt.TextFlag.TextWordWrap),
+                         element.content or element.name)
+
+    def _load_image(self, path: str) -> Optional[QImage]:
+        if path not in self._images:
+            image = QImage(path) if path and Path(path).is_file() else QImage()
+            self._images[path] = image
+        image = self._images[path]
+        return image if not image.isNull() else None
+
+    def _draw_image(self, painter: QPainter, path: str, rect: QRectF):
+        image = self._load_image(path)
+        if image is not None:
+            painter.drawImage(rect, image)
+        else:
+            self._draw_missing(painter, rect)
+
+    def _draw_svg(self, painter: QPainter, content: str, rect: QRectF):
+        if SVG_AVAILABLE and content:
+            source = content.encode('utf-8') if content.lstrip().startswith("<") else content
+            renderer = QSvgRenderer(source)
+            if renderer.isValid():
+                renderer.render(painter, rect)
+                return
+        self._draw_missing(painter, rect)
+
+    @staticmethod
+    def _draw_missing(painter: QPainter, rect: QRectF):
+        """缺失资源的占位图"""
+        painter.setBrush(QBrush(QColor("#eceff1")))
+        painter.setPen(QPen(QColor("#b0bec5"), 1))
+        painter.drawRect(rect)
+        painter.drawLine(rect.topLeft(), rect.bottomRight())
+        painter.drawLine(rect.topRight(), rect.bottomLeft())
+
+    @staticmethod
+    def _draw_video_placeholder(painter: QPainter, rect: QRectF):
+        painter.fillRect(rect, QColor("#263238"))
+        size = min(rect.width(), rect.height()) / 4
+        center = rect.center()
+        painter.setPen(Qt.PenStyle.NoPen)
+        painter.setBrush(QBrush(QColor(255, 255, 255, 200)))
+        painter.drawPolygon(QPolygonF([
+            QPointF(center.x() - size / 2, center.y() - size / 2),
+            QPointF(center.x() + size / 2, center.y()),
+            QPointF(center.x() - size / 2, center.y() + size / 2),
+        ]))
+
+
+def save_project_thumbnail(project: Project, output_path: Path, width: int = 320, height: int = 180,
+                           time: float = 0.0) -> bool:
+    """把项目在指定时刻的画面保存为PNG缩略图"""
+    try:
+        image = SceneRasterizer.for_project(project).render_project(project, time, width, height)
+        if image is None:
+            return False
+        return image.save(str(output_path), "PNG")
+    except Exception as e:
+        logger.error(f"生成项目缩略图失败: {e}")
+        return False
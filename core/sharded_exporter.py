@@ -0,0 +1,318 @@
+"""
+AI Animation Studio - 分片并行视频导出
+把时间轴切分为若干帧区间，由多个无界面工作进程并行渲染，再用FFmpeg concat无损拼接
+"""
+
+import os
+import sys
+import json
+import shutil
+import tempfile
+import threading
+import subprocess
+from dataclasses import dataclass, field
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from PyQt6.QtCore import QThread, pyqtSignal
+
+from core.logger import get_logger
+
+logger = get_logger("sharded_exporter")
+
+# 各格式的编码参数；所有分片使用完全相同的参数，因此可以直接 -c copy 拼接
+FORMAT_CODEC_ARGS: Dict[str, List[str]] = {
+    "mp4": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", "18", "-preset", "medium"],
+    "mov": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", "18", "-preset", "medium"],
+    "mkv": ["-c:v", "libx264", "-pix_fmt", "yuv420p", "-crf", "18", "-preset", "medium"],
+    "webm": ["-c:v", "libvpx-vp9", "-pix_fmt", "yuv420p", "-crf", "32", "-b:v", "0", "-row-mt", "1"],
+    "avi": ["-c:v", "mpeg4", "-pix_fmt", "yuv420p", "-q:v", "3"],
+}
+
+
+@dataclass
+class ExportVariant:
+    """一路导出输出（分辨率 + 格式）"""
+    output_path: str
+    width: int
+    height: int
+    format_ext: str = "mp4"
+    codec_args: List[str] = field(default_factory=list)
+
+    def get_codec_args(self) -> List[str]:
+        return self.codec_args or FORMAT_CODEC_ARGS.get(self.format_ext, FORMAT_CODEC_ARGS["mp4"])
+
+    @property
+    def aspect_ratio(self) -> float:
+        return self.width / self.height
+
+
+def group_variants_by_aspect(variants: List[ExportVariant], tolerance: float = 0.01) -> List[List[ExportVariant]]:
+    """按宽高比分组（相对误差不超过 tolerance 视为相同，如1366x768与1920x1080）
+
+    同组变体可以由一次渲染缩放得到；不同宽高比必须各自渲染，否则画面会被拉伸。
+    """
+    groups: List[List[ExportVariant]] = []
+    for variant in variants:
+        for group in groups:
+            if abs(variant.aspect_ratio / group[0].aspect_ratio - 1.0) <= tolerance:
+                group.append(variant)
+                break
+        else:
+            groups.append([variant])
+    return groups
+
+
+def render_size(variants: List[ExportVariant]) -> Tuple[int, int]:
+    """渲染分辨率：取一组变体中最大的一个，其余由FFmpeg缩放"""
+    largest = max(variants, key=lambda v: v.width * v.height)
+    return largest.width, largest.height
+
+
+def plan_shards(total_frames: int, max_workers: int, min_shard_frames: int = 30) -> List[Tuple[int, int]]:
+    """把 [0, total_frames) 均匀切分为帧区间
+
+    每个分片至少 min_shard_frames 帧，避免工作进程启动开销超过渲染本身。
+    """
+    if total_frames <= 0:
+        return []
+
+    shard_count = max(1, min(max_workers, total_frames // max(min_shard_frames, 1)))
+    base, remainder = divmod(total_frames, shard_count)
+
+    shards = []
+    start = 0
+    for index in range(shard_count):
+        end = start + base + (1 if index < remainder else 0)
+        shards.append((start, end))
+        start = end
+    return shards
+
+
+def build_fanout_args(variants: List[ExportVariant], segment_paths: List[str]) -> List[str]:
+    """构建一次渲染、多路缩放编码的FFmpeg输出参数
+
+    variants 应为 group_variants_by_aspect 分出的同一组，缩放时不保持宽高比。
+    """
+    count = len(variants)
+    split_labels = "".join(f"[s{i}]" for i in range(count))
+    graph = [f"[0:v]split={count}{split_labels}"]
+    for i, variant in enumerate(variants):
+        graph.append(f"[s{i}]scale={variant.width}:{variant.height}:flags=lanczos[v{i}]")
+
+    args = ["-filter_complex", ";".join(graph)]
+    for i, (variant, segment_path) in enumerate(zip(variants, segment_paths)):
+        args += ["-map", f"[v{i}]", *variant.get_codec_args(), segment_path]
+    return args
+
+
+def concat_segments(segment_paths: List[str], output_path: str, work_dir: Path) -> bool:
+    """使用FFmpeg concat分离器无损拼接分片"""
+    if len(segment_paths) == 1:
+        shutil.move(segment_paths[0], output_path)
+        return True
+
+    list_file = work_dir / f"{Path(output_path).stem}_concat.txt"
+    with open(list_file, 'w', encoding='utf-8') as f:
+        for segment_path in segment_paths:
+            escaped = Path(segment_path).resolve().as_posix().replace("'", r"'\''")
+            f.write(f"file '{escaped}'\n")
+
+    command = [
+        "ffmpeg", "-y", "-loglevel", "error",
+        "-f", "concat", "-safe", "0",
+        "-i", str(list_file),
+        "-c", "copy",
+        output_path,
+    ]
+    result = subprocess.run(command, capture_output=True, text=True)
+    if result.returncode != 0:
+        logger.error(f"拼接分片失败 {output_path}: {result.stderr}")
+        return False
+    return True
+
+
+def launch_export_worker(spec_file: Path) -> subprocess.Popen:
+    """启动无界面渲染工作进程（core.export_worker），标准输出为JSON进度行"""
+    env = os.environ.copy()
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    project_root = Path(__file__).resolve().parent.parent
+
+    return subprocess.Popen(
+        [sys.executable, "-m", "core.export_worker", str(spec_file)],
+        cwd=str(project_root),
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.STDOUT,
+        text=True,
+        encoding='utf-8',
+        errors='replace',
+    )
+
+
+class ShardedExportThread(QThread):
+    """分片并行导出线程
+
+    每个分片由一个 core.export_worker 工作进程通过 renderAtTime 契约渲染。
+    输出变体（分辨率 × 格式）按宽高比分组，每组以组内最大分辨率渲染一遍，
+    工作进程在这一次渲染中同时编码组内所有变体。
+    """
+
+    progress_update = pyqtSignal(str)  # 进度消息
+    progress_changed = pyqtSignal(int)  # 总进度百分比
+    export_complete = pyqtSignal(bool, str)  # 成功, 消息
+
+    def __init__(self, html_content: str, variants: List[ExportVariant],
+                 duration: float = 10.0, fps: int = 30,
+                 max_workers: Optional[int] = None, min_shard_frames: int = 30,
+                 render_html: Optional[Dict[Tuple[int, int], str]] = None):
+        super().__init__()
+        self.html_content = html_content
+        self.variants = variants
+        self.duration = duration
+        self.fps = fps
+        self.max_workers = max_workers or os.cpu_count() or 1
+        self.min_shard_frames = min_shard_frames
+        # 按渲染分辨率准备的HTML；缺少某个分辨率时使用 html_content
+        self.render_html = render_html or {}
+
+        self._processes: List[subprocess.Popen] = []
+        self._cancelled = False
+        self._shard_progress: Dict[Tuple[int, int], int] = {}
+        self._lock = threading.Lock()
+        self._total_frames = 1
+
+    def cancel(self):
+        """取消导出"""
+        self._cancelled = True
+        for process in self._processes:
+            if process.poll() is None:
+                process.kill()
+
+    def run(self):
+        work_dir = Path(tempfile.mkdtemp(prefix="aas_sharded_export_"))
+        try:
+            success, message = self._run_export(work_dir)
+            self.export_complete.emit(success, message)
+        except Exception as e:
+            logger.error(f"分片导出失败: {e}")
+            self.export_complete.emit(False, f"分片导出失败: {e}")
+        finally:
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def _run_export(self, work_dir: Path) -> Tuple[bool, str]:
+        if not self.variants:
+            return False, "没有导出目标"
+
+        total_frames = int(round(self.duration * self.fps))
+        shards = plan_shards(total_frames, self.max_workers, self.min_shard_frames)
+        groups = group_variants_by_aspect(self.variants)
+        self._total_frames = (total_frames * len(groups)) or 1
+
+        self.progress_update.emit(
+            f"分片导出: {total_frames} 帧, {len(shards)} 个工作进程, "
+            f"{len(self.variants)} 路输出（{len(groups)} 种宽高比）"
+        )
+
+        # 各宽高比分组依次渲染，每组内的分片并行
+        for group_index, group in enumerate(groups):
+            message = self._render_group(group_index, group, shards, work_dir)
+            if message:
+                return False, message
+
+        outputs = "\n".join(variant.output_path for variant in self.variants)
+        return True, f"已导出 {len(self.variants)} 个视频:\n{outputs}"
+
+    def _render_group(self, group_index: int, group: List[ExportVariant],
+                      shards: List[Tuple[int, int]], work_dir: Path) -> Optional[str]:
+        """渲染并拼接一组同宽高比的变体，失败时返回错误消息"""
+        render_width, render_height = render_size(group)
+        html_file = work_dir / f"animation_{render_width}x{render_height}.html"
+        html_file.write_text(self.render_html.get((render_width, render_height), self.html_content),
+                             encoding='utf-8')
+
+        # 启动本组的工作进程
+        segments: Dict[int, List[str]] = {}
+        processes = []
+        readers = []
+        for index, (start_frame, end_frame) in enumerate(shards):
+            if self._cancelled:
+                break
+            segment_paths = [
+                str(work_dir / f"group{group_index}_variant{v}_shard{index:04d}.{variant.format_ext}")
+                for v, variant in enumerate(group)
+            ]
+            segments[index] = segment_paths
+
+            spec = {
+                "html_file": str(html_file),
+                "fps": self.fps,
+                "duration": self.duration,
+                "width": render_width,
+                "height": render_height,
+                "start_frame": start_frame,
+                "end_frame": end_frame,
+                "codec_args": build_fanout_args(group, segment_paths),
+            }
+            spec_file = work_dir / f"group{group_index}_shard{index:04d}.json"
+            spec_file.write_text(json.dumps(spec, ensure_ascii=False), encoding='utf-8')
+
+            process = self._launch_worker(spec_file)
+            processes.append(process)
+            self._processes.append(process)
+            self._shard_progress[(group_index, index)] = 0
+
+            reader = threading.Thread(target=self._read_worker_output,
+                                      args=((group_index, index), process), daemon=True)
+            reader.start()
+            readers.append(reader)
+
+        # 等待本组所有分片完成
+        failed = []
+        for index, process in enumerate(processes):
+            return_code = process.wait()
+            readers[index].join()
+            if return_code != 0:
+                failed.append(index)
+
+        if self._cancelled:
+            return "导出已取消"
+        if failed:
+            return f"分片渲染失败 ({render_width}x{render_height}): {', '.join(str(i) for i in failed)}"
+
+        # 按变体拼接分片
+        self.progress_update.emit(f"正在拼接视频分片 ({render_width}x{render_height})...")
+        for v, variant in enumerate(group):
+            Path(variant.output_path).parent.mkdir(parents=True, exist_ok=True)
+            ordered = [segments[index][v] for index in range(len(shards))]
+            if not concat_segments(ordered, variant.output_path, work_dir):
+                return f"拼接失败: {variant.output_path}"
+        return None
+
+    def _launch_worker(self, spec_file: Path) -> subprocess.Popen:
+        """启动无界面渲染工作进程"""
+        return launch_export_worker(spec_file)
+
+    def _read_worker_output(self, index: Tuple[int, int], process: subprocess.Popen):
+        """读取工作进程输出的进度行；index 为 (宽高比分组, 分片)"""
+        label = f"分组{index[0]}/分片{index[1]}"
+        for line in process.stdout:
+            line = line.strip()
+            if not line.startswith("{"):
+                if line:
+                    logger.debug(f"[{label}] {line}")
+                continue
+
+            try:
+                message = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+            if message.get("type") == "progress":
+                with self._lock:
+                    self._shard_progress[index] = message.get("frames", 0)
+                    done = sum(self._shard_progress.values())
+                self.progress_changed.emit(int(done * 100 / self._total_frames))
+            elif message.get("type") == "error":
+                logger.error(f"[{label}] {message.get('message')}")
+                self.progress_update.emit(f"{label} 出错: {message.get('message')}")
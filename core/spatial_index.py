@@ -0,0 +1,176 @@
+"""
+AI Animation Studio - 空间索引
+舞台元素边界的均匀网格索引：点选、框选、对齐吸附和视口裁剪只检查查询区域覆盖的网格单元，
+代价与该区域内的元素数量相关，而不是与场景中的元素总数相关
+"""
+
+import math
+from bisect import bisect_left, bisect_right
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+Bounds = Tuple[float, float, float, float]  # x, y, width, height
+
+# 网格单元边长（画布坐标）
+DEFAULT_CELL_SIZE = 128
+# 覆盖超过此数量单元的元素（例如全屏背景）单独存放，每次查询都检查
+MAX_ELEMENT_CELLS = 256
+
+
+class SpatialIndex:
+    """元素边界的均匀网格索引
+
+    每个元素记录边界和插入序号；查询结果按插入序号（即绘制顺序）排列。
+    """
+
+    def __init__(self, cell_size: float = DEFAULT_CELL_SIZE):
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], Set[str]] = {}
+        self.bounds: Dict[str, Bounds] = {}
+        self.order: Dict[str, int] = {}
+        self.oversized: Set[str] = set()
+        self._item_cells: Dict[str, List[Tuple[int, int]]] = {}
+        self._next_order = 0
+
+        # 按左边界 / 上边界排序的坐标，用于同行同列的对齐查询
+        self._edges = {"x": ([], []), "y": ([], [])}  # 轴 -> (坐标, 元素ID)
+
+    def __len__(self) -> int:
+        return len(self.bounds)
+
+    def __contains__(self, item_id: str) -> bool:
+        return item_id in self.bounds
+
+    def _cell_range(self, x: float, y: float, width: float, height: float):
+        size = self.cell_size
+        return (math.floor(x / size), math.floor(y / size),
+                math.floor((x + max(width, 0)) / size), math.floor((y + max(height, 0)) / size))
+
+    def insert(self, item_id: str, x: float, y: float, width: float, height: float):
+        """插入或更新元素边界（更新时保留原绘制顺序）"""
+        bounds = (x, y, width, height)
+        if self.bounds.get(item_id) == bounds:
+            return
+        if item_id in self.bounds:
+            self._unlink(item_id)
+        else:
+            self.order[item_id] = self._next_order
+            self._next_order += 1
+
+        self.bounds[item_id] = bounds
+        self._add_edge("x", x, item_id)
+        self._add_edge("y", y, item_id)
+
+        x0, y0, x1, y1 = self._cell_range(x, y, width, height)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > MAX_ELEMENT_CELLS:
+            self.oversized.add(item_id)
+            return
+
+        item_cells = []
+        for cx in range(x0, x1 + 1):
+            for cy in range(y0, y1 + 1):
+                self.cells.setdefault((cx, cy), set()).add(item_id)
+                item_cells.append((cx, cy))
+        self._item_cells[item_id] = item_cells
+
+    def _add_edge(self, axis: str, value: float, item_id: str):
+        keys, ids = self._edges[axis]
+        i = bisect_right(keys, value)
+        keys.insert(i, value)
+        ids.insert(i, item_id)
+
+    def _remove_edge(self, axis: str, value: float, item_id: str):
+        keys, ids = self._edges[axis]
+        for i in range(bisect_left(keys, value), bisect_right(keys, value)):
+            if ids[i] == item_id:
+                del keys[i]
+                del ids[i]
+                return
+
+    def _unlink(self, item_id: str):
+        x, y = self.bounds[item_id][:2]
+        self._remove_edge("x", x, item_id)
+        self._remove_edge("y", y, item_id)
+        self.oversized.discard(item_id)
+        for cell in self._item_cells.pop(item_id, ()):
+            items = self.cells.get(cell)
+            if items is not None:
+                items.discard(item_id)
+                if not items:
+                    del self.cells[cell]
+
+    def remove(self, item_id: str):
+        if item_id not in self.bounds:
+            return
+        self._unlink(item_id)
+        del self.bounds[item_id]
+        del self.order[item_id]
+
+    def clear(self):
+        self.cells.clear()
+        self.bounds.clear()
+        self.order.clear()
+        self.oversized.clear()
+        self._item_cells.clear()
+        for keys, ids in self._edges.values():
+            keys.clear()
+            ids.clear()
+
+    def _candidates(self, x: float, y: float, width: float, height: float) -> Set[str]:
+        x0, y0, x1, y1 = self._cell_range(x, y, width, height)
+        candidates = set(self.oversized)
+        if (x1 - x0 + 1) * (y1 - y0 + 1) > len(self.cells):
+            # 查询区域比已占用的单元还多时直接遍历已占用单元
+            for (cx, cy), items in self.cells.items():
+                if x0 <= cx <= x1 and y0 <= cy <= y1:
+                    candidates.update(items)
+        else:
+            for cx in range(x0, x1 + 1):
+                for cy in range(y0, y1 + 1):
+                    items = self.cells.get((cx, cy))
+                    if items:
+                        candidates.update(items)
+        return candidates
+
+    def _sorted(self, item_ids: Iterable[str]) -> List[str]:
+        return sorted(item_ids, key=self.order.__getitem__)
+
+    def query_point(self, x: float, y: float) -> List[str]:
+        """包含该点的元素，按绘制顺序排列（最上层在最后）"""
+        hits = []
+        for item_id in self._candidates(x, y, 0, 0):
+            bx, by, bw, bh = self.bounds[item_id]
+            if bx <= x <= bx + bw and by <= y <= by + bh:
+                hits.append(item_id)
+        return self._sorted(hits)
+
+    def query_rect(self, x: float, y: float, width: float, height: float) -> List[str]:
+        """与矩形相交的元素，按绘制顺序排列"""
+        hits = []
+        for item_id in self._candidates(x, y, width, height):
+            bx, by, bw, bh = self.bounds[item_id]
+            if not (bx + bw < x or x + width < bx or by + bh < y or y + height < by):
+                hits.append(item_id)
+        return self._sorted(hits)
+
+    def query_near(self, x: float, y: float, width: float, height: float,
+                   distance: float, exclude: Optional[str] = None) -> List[str]:
+        """边界距矩形不超过 distance 的元素（用于对齐吸附）"""
+        return [item_id for item_id in self.query_rect(x - distance, y - distance,
+                                                       width + 2 * distance, height + 2 * distance)
+                if item_id != exclude]
+
+    def query_aligned(self, axis: str, value: float, distance: float,
+                      exclude: Optional[str] = None) -> Optional[Tuple[float, str]]:
+        """左边界（axis="x"）或上边界（axis="y"）距 value 最近且不超过 distance 的元素
+
+        Returns:
+            (对齐坐标, 元素ID)，没有时返回None
+        """
+        keys, ids = self._edges[axis]
+        best = None
+        for i in range(bisect_left(keys, value - distance), bisect_right(keys, value + distance)):
+            if ids[i] == exclude:
+                continue
+            if best is None or abs(keys[i] - value) < abs(best[0] - value):
+                best = (keys[i], ids[i])
+        return best
@@ -129,7 +129,7 @@ class TemplateManager:
                 timestamp=int(self.templates_dir.stat().st_mtime) if self.templates_dir.exists() else 0
             )
 
-            cached_templates = project_cache.get(cache_key)
+            cached_templates = project_cache.get(cache_key, namespace="templates")
             if cached_templates:
                 self.templates = cached_templates
                 logger.info(f"从缓存加载 {len(self.templates)} 个模板")
@@ -146,7 +146,7 @@ class TemplateManager:
                             self.templates[template.id] = template
 
             # 缓存结果
-            project_cache.put(cache_key, self.templates.copy())
+            project_cache.put(cache_key, self.templates, namespace="templates")
 
             logger.info(f"已加载 {len(self.templates)} 个模板")
             performance_monitor.end_operation(perf_context, success=True)
@@ -624,8 +624,12 @@ class TemplateManager:
             thumbnail_path = self.templates_dir / template.id / "thumbnail.png"
 
             if not thumbnail_path.exists():
-                # 从示例HTML生成缩略图
-                if template.example_html:
+                thumbnail_path.parent.mkdir(parents=True, exist_ok=True)
+
+                # 优先直接光栅化模板预设元素，其次从示例HTML生成
+                if template.elements and self._render_template_thumbnail(template, thumbnail_path):
+                    pass
+                elif template.example_html:
                     self._generate_thumbnail_from_html(template.example_html, thumbnail_path)
                 else:
                     # 生成默认缩略图
@@ -637,6 +641,56 @@ class TemplateManager:
         except Exception as e:
             logger.warning(f"生成缩略图失败: {e}")
 
+    def _render_template_thumbnail(self, template: ProjectTemplate, output_path: Path) -> bool:
+        """用场景光栅化器渲染模板预设元素（200x150）"""
+        try:
+            from core.data_structures import Element, ElementStyle, ElementType, Point
+            from core.scene_rasterizer import SceneRasterizer
+
+            resolution = template.config.get("resolution", {})
+            canvas_width = resolution.get("width", 1920)
+            canvas_height = resolution.get("height", 1080)
+            style_keys = {
+                "fontSize": "font_size", "fontWeight": "font_weight", "fontFamily": "font_family",
+                "color": "color", "textAlign": "text_align", "backgroundColor": "background_color",
+                "opacity": "opacity", "borderRadius": "border_radius", "border": "border",
+                "width": "width", "height": "height",
+            }
+
+            elements = {}
+            for data in template.elements:
+                try:
+                    element_type = ElementType(data.get("type", "text"))
+                except ValueError:
+                    continue
+
+                style = ElementStyle(**{style_keys[key]: value
+                                        for key, value in data.get("style", {}).items() if key in style_keys})
+                x = data.get("position", {}).get("x", 0)
+                y = data.get("position", {}).get("y", 0)
+                if style.text_align == "center" and style.width == "auto":
+                    # 模板中居中文本的位置是中心点
+                    half_width = max(1, min(x, canvas_width - x))
+                    style.width = f"{half_width * 2}px"
+                    x -= half_width
+
+                element = Element(element_id=data.get("id", str(len(elements))), element_type=element_type,
+                                  content=data.get("content", ""), position=Point(x, y), style=style)
+                elements[element.element_id] = element
+
+            rasterizer = SceneRasterizer(canvas_width, canvas_height,
+                                         template.config.get("background", "#ffffff"))
+            image = rasterizer.render(elements, 200, 150)
+            if image is None or not image.save(str(output_path), "PNG"):
+                return False
+
+            logger.debug(f"模板元素缩略图已生成: {output_path}")
+            return True
+
+        except Exception as e:
+            logger.warning(f"渲染模板缩略图失败: {e}")
+            return False
+
     def _generate_thumbnail_from_html(self, html_content: str, output_path: Path):
         """从HTML内容生成缩略图"""
         try:
@@ -3,6 +3,7 @@
 支持图片、视频、音频、文档等多种格式的缩略图生成
 """
 
+import io
 import os
 import subprocess
 from pathlib import Path
@@ -33,10 +34,13 @@ class ThumbnailGenerator:
         'unknown': '#6B7280'     # 灰色
     }
     
-    def __init__(self, cache_dir: Path):
+    def __init__(self, cache_dir: Path, pyramid: bool = True):
         self.cache_dir = cache_dir
         self.cache_dir.mkdir(parents=True, exist_ok=True)
         
+        # 金字塔模式：图片/视频/矢量图只解码一次，所有尺寸由最大尺寸的缩小结果派生
+        self.pyramid = pyramid
+        
         # 检查外部工具
         self.ffmpeg_available = self._check_ffmpeg()
         self.imagemagick_available = self._check_imagemagick()
@@ -65,6 +69,11 @@ class ThumbnailGenerator:
     
     def generate_thumbnails(self, file_path: str, asset_type: str, asset_id: str) -> Dict[str, Optional[str]]:
         """生成所有尺寸的缩略图"""
+        if self.pyramid and asset_type in ('image', 'video', 'vector'):
+            thumbnails = self._generate_pyramid(file_path, asset_type, asset_id)
+            if thumbnails is not None:
+                return thumbnails
+        
         thumbnails = {}
         
         for size_name, size in self.SIZES.items():
@@ -77,6 +86,94 @@ class ThumbnailGenerator:
         
         return thumbnails
     
+    def _generate_pyramid(self, file_path: str, asset_type: str,
+                          asset_id: str) -> Optional[Dict[str, Optional[str]]]:
+        """一次解码生成所有尺寸；失败时返回None，由调用方逐个尺寸回退"""
+        outputs = {name: self._get_thumbnail_path(asset_id, name) for name in self.SIZES}
+        try:
+            if asset_type == 'image':
+                with Image.open(file_path) as img:
+                    self._save_pyramid(self._decode_for_thumbnail(img, self._largest_size()), outputs)
+            elif asset_type == 'video':
+                if not self._generate_video_pyramid(file_path, outputs):
+                    return None
+            elif asset_type == 'vector':
+                if not file_path.lower().endswith('.svg'):
+                    return None
+                try:
+                    from cairosvg import svg2png
+                except ImportError:
+                    return None
+                width, height = self._largest_size()
+                png_data = svg2png(url=file_path, output_width=width, output_height=height)
+                with Image.open(io.BytesIO(png_data)) as img:
+                    self._save_pyramid(self._decode_for_thumbnail(img, self._largest_size()), outputs)
+            
+            return {f'{name}_path': str(path) for name, path in outputs.items()}
+            
+        except Exception as e:
+            logger.warning(f"金字塔缩略图生成失败，逐个尺寸回退 {file_path}: {e}")
+            return None
+    
+    def _largest_size(self) -> Tuple[int, int]:
+        return max(self.SIZES.values(), key=lambda size: size[0] * size[1])
+    
+    def _decode_for_thumbnail(self, img: "Image.Image", size: Tuple[int, int]) -> "Image.Image":
+        """以尽量小的代价解码到不小于 size 的RGB图像"""
+        if img.format == 'JPEG':
+            # JPEG可在解码时按 1/2、1/4、1/8 缩小，大图只解码所需的分辨率
+            img.draft('RGB', size)
+        
+        # 转换为RGB（处理RGBA、P等模式）
+        if img.mode in ('RGBA', 'LA', 'P'):
+            img = img.convert('RGBA')
+            background = Image.new('RGB', img.size, (255, 255, 255))
+            background.paste(img, mask=img.split()[-1])
+            img = background
+        elif img.mode != 'RGB':
+            img = img.convert('RGB')
+        else:
+            img = img.copy()
+        
+        img.thumbnail(size, Image.Resampling.LANCZOS)
+        return img
+    
+    def _save_pyramid(self, largest: "Image.Image", outputs: Dict[str, Path]):
+        """从最大尺寸开始逐级缩小并保存"""
+        current = largest
+        for size_name, size in sorted(self.SIZES.items(), key=lambda item: -item[1][0]):
+            if current.width > size[0] or current.height > size[1]:
+                current = current.copy()
+                current.thumbnail(size, Image.Resampling.LANCZOS)
+            
+            # 创建正方形画布并居中放置
+            thumbnail = Image.new('RGB', size, (255, 255, 255))
+            thumbnail.paste(current, ((size[0] - current.width) // 2, (size[1] - current.height) // 2))
+            thumbnail.save(outputs[size_name], 'PNG', optimize=True)
+    
+    def _generate_video_pyramid(self, file_path: str, outputs: Dict[str, Path]) -> bool:
+        """一次FFmpeg调用：解码第一帧后分流缩放到各个尺寸输出"""
+        if not self.ffmpeg_available:
+            return False
+        
+        names = list(self.SIZES)
+        split = f"[0:v]split={len(names)}" + "".join(f"[s{i}]" for i in range(len(names)))
+        chains = [
+            f"[s{i}]scale={w}:{h}:force_original_aspect_ratio=decrease,"
+            f"pad={w}:{h}:(ow-iw)/2:(oh-ih)/2:white[o{i}]"
+            for i, (w, h) in enumerate(self.SIZES[name] for name in names)
+        ]
+        cmd = ['ffmpeg', '-i', file_path, '-filter_complex', ";".join([split] + chains)]
+        for i, name in enumerate(names):
+            cmd += ['-map', f'[o{i}]', '-frames:v', '1', '-y', str(outputs[name])]
+        
+        result = subprocess.run(cmd, capture_output=True, text=True)
+        if result.returncode == 0 and all(path.exists() for path in outputs.values()):
+            return True
+        
+        logger.warning(f"FFmpeg提取视频帧失败: {result.stderr}")
+        return False
+    
     def _get_thumbnail_path(self, asset_id: str, size_name: str) -> Path:
         """获取缩略图路径"""
         return self.cache_dir / f"{asset_id}_{size_name}.png"
@@ -360,3 +457,16 @@ class ThumbnailGenerator:
         except Exception as e:
             logger.error(f"生成默认缩略图失败: {e}")
             return False
+
+
+# 每个工作进程复用一个生成器（避免重复检测外部工具）
+_process_generators: Dict[str, ThumbnailGenerator] = {}
+
+
+def generate_thumbnails_job(cache_dir: str, file_path: str, asset_type: str,
+                            asset_id: str) -> Dict[str, Optional[str]]:
+    """在进程池中生成缩略图的入口（参数和返回值均可序列化）"""
+    generator = _process_generators.get(cache_dir)
+    if generator is None:
+        generator = _process_generators[cache_dir] = ThumbnailGenerator(Path(cache_dir))
+    return generator.generate_thumbnails(file_path, asset_type, asset_id)
@@ -0,0 +1,379 @@
+"""
+AI Animation Studio - 缩略图服务
+首次请求时在后台线程池中按需生成素材缩略图；小尺寸缩略图打包进内存映射的图集文件（固定大小槽位，
+超出磁盘预算时按LRU淘汰），界面从内存LRU缓存直接取得解码好的QImage，滚动素材面板时不再逐个读取PNG文件。
+服务生成的缩略图只存放在图集中，不会在缓存目录留下额外的PNG文件
+"""
+
+import os
+import json
+import atexit
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from PyQt6.QtCore import QObject, Qt, QTimer, pyqtSignal
+from PyQt6.QtGui import QColor, QImage, QImageReader, QPainter
+
+from core.logger import get_logger
+from core.frame_stream import qimage_to_rgba_bytes
+
+logger = get_logger("thumbnail_service")
+
+# 图集中的缩略图边长；界面请求的尺寸向上取最接近的一档
+ATLAS_TILE_SIZES = (64, 128, 256)
+DEFAULT_DISK_BUDGET_MB = 256
+DEFAULT_MEMORY_BUDGET_MB = 64
+# 图集文件每次扩容的槽位数
+ATLAS_GROW_SLOTS = 256
+# 槽位表延迟保存的时间（毫秒）
+INDEX_SAVE_DELAY_MS = 2000
+
+
+class ThumbnailAtlas:
+    """内存映射的缩略图图集
+
+    文件由固定大小的RGBA槽位组成（tile_size x tile_size x 4 字节），槽位表保存在同名 .json 中。
+    槽位数达到上限时淘汰最久未访问的条目并复用它的槽位。
+    """
+
+    def __init__(self, path: Path, tile_size: int, max_bytes: int):
+        self.path = Path(path)
+        self.index_path = self.path.with_suffix(".json")
+        self.tile_size = tile_size
+        self.slot_bytes = tile_size * tile_size * 4
+        self.max_slots = max(1, max_bytes // self.slot_bytes)
+
+        # key -> (槽位, 源文件签名)，按最近访问顺序排列（最旧的在前）
+        self.entries: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+        self.free_slots: List[int] = []
+        self.slot_count = 0
+        self._data: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._dirty = False
+
+        self._load()
+
+    def _load(self):
+        try:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            file_slots = self.path.stat().st_size // self.slot_bytes if self.path.exists() else 0
+            self.slot_count = min(file_slots, self.max_slots)
+
+            if self.index_path.exists():
+                with open(self.index_path, 'r', encoding='utf-8') as f:
+                    index = json.load(f)
+                if index.get("tile_size") == self.tile_size:
+                    for key, slot, signature in index.get("entries", []):
+                        if slot < self.slot_count:
+                            self.entries[key] = (slot, signature)
+
+            used = {slot for slot, _ in self.entries.values()}
+            self.free_slots = [slot for slot in range(self.slot_count - 1, -1, -1) if slot not in used]
+            if self.slot_count:
+                self._map()
+
+        except (OSError, ValueError) as e:
+            logger.warning(f"加载缩略图图集失败 {self.path}: {e}")
+            self.entries.clear()
+            self.free_slots = []
+            self.slot_count = 0
+            self._data = None
+
+    def _map(self):
+        self._data = np.memmap(self.path, dtype=np.uint8, mode='r+',
+                               shape=(self.slot_count, self.slot_bytes))
+
+    def _grow(self) -> bool:
+        """扩容图集文件；已达上限时返回False"""
+        if self.slot_count >= self.max_slots:
+            return False
+
+        new_count = min(self.max_slots, self.slot_count + ATLAS_GROW_SLOTS)
+        if self._data is not None:
+            self._data.flush()
+            self._data = None
+        with open(self.path, 'ab') as f:
+            f.truncate(new_count * self.slot_bytes)
+
+        self.free_slots.extend(range(new_count - 1, self.slot_count - 1, -1))
+        self.slot_count = new_count
+        self._map()
+        return True
+
+    def get(self, key: str, signature: str) -> Optional[bytes]:
+        """读取缩略图的RGBA数据；不存在或源文件已变化时返回None"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                return None
+            slot, stored_signature = entry
+            if stored_signature != signature:
+                del self.entries[key]
+                self.free_slots.append(slot)
+                self._dirty = True
+                return None
+
+            self.entries.move_to_end(key)
+            self._dirty = True
+            return self._data[slot].tobytes()
+
+    def put(self, key: str, signature: str, rgba: bytes):
+        """写入缩略图，必要时淘汰最久未访问的条目"""
+        if len(rgba) != self.slot_bytes:
+            raise ValueError(f"缩略图数据大小不符: {len(rgba)} != {self.slot_bytes}")
+
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                slot = entry[0]
+            elif self.free_slots or self._grow():
+                slot = self.free_slots.pop()
+            else:
+                _, (slot, _) = self.entries.popitem(last=False)
+
+            self._data[slot] = np.frombuffer(rgba, dtype=np.uint8)
+            self.entries[key] = (slot, signature)
+            self._dirty = True
+
+    def remove(self, key: str):
+        with self._lock:
+            entry = self.entries.pop(key, None)
+            if entry is not None:
+                self.free_slots.append(entry[0])
+                self._dirty = True
+
+    def save(self):
+        """刷新图集数据并原子写入槽位表"""
+        with self._lock:
+            if not self._dirty:
+                return
+            try:
+                if self._data is not None:
+                    self._data.flush()
+                temp_path = self.index_path.with_name(self.index_path.name + ".tmp")
+                with open(temp_path, 'w', encoding='utf-8') as f:
+                    json.dump({
+                        "tile_size": self.tile_size,
+                        "entries": [[key, slot, signature]
+                                    for key, (slot, signature) in self.entries.items()]
+                    }, f)
+                os.replace(temp_path, self.index_path)
+                self._dirty = False
+            except OSError as e:
+                logger.error(f"保存缩略图图集失败 {self.index_path}: {e}")
+
+
+class ThumbnailService(QObject):
+    """按需缩略图服务
+
+    request() 只查内存缓存和内存映射图集，都未命中时把生成任务交给后台线程池并立即返回None；
+    生成完成后发出 thumbnail_ready 信号，界面再次请求即可取得QImage。
+    """
+
+    thumbnail_ready = pyqtSignal(str, int)  # asset_id, 图集尺寸
+
+    # 后台线程生成完成后通知主线程
+    _tile_generated = pyqtSignal(str, int, object)  # asset_id, 图集尺寸, QImage
+    _tile_failed = pyqtSignal(str, int)  # asset_id, 图集尺寸
+
+    def __init__(self, asset_manager, disk_budget_mb: int = DEFAULT_DISK_BUDGET_MB,
+                 memory_budget_mb: int = DEFAULT_MEMORY_BUDGET_MB, max_workers: int = 4):
+        super().__init__()
+        self.asset_manager = asset_manager
+        self.atlas_dir = asset_manager.cache_dir / "thumbnail_atlas"
+
+        # 按槽位大小分配磁盘预算，使各档图集容纳相同数量的缩略图
+        bytes_per_asset = sum(size * size * 4 for size in ATLAS_TILE_SIZES)
+        slots = max(1, disk_budget_mb * 1024 * 1024 // bytes_per_asset)
+        self.atlases: Dict[int, ThumbnailAtlas] = {
+            size: ThumbnailAtlas(self.atlas_dir / f"atlas_{size}.bin", size, slots * size * size * 4)
+            for size in ATLAS_TILE_SIZES
+        }
+
+        self.memory_budget = memory_budget_mb * 1024 * 1024
+        self.memory_cache: "OrderedDict[Tuple[str, int], QImage]" = OrderedDict()
+        self.memory_bytes = 0
+
+        self._pool = ThreadPoolExecutor(max_workers)
+        self._pending: Dict[Tuple[str, int], Future] = {}
+
+        self._save_timer = QTimer(self)
+        self._save_timer.setSingleShot(True)
+        self._save_timer.setInterval(INDEX_SAVE_DELAY_MS)
+        self._save_timer.timeout.connect(self.flush)
+
+        self._tile_generated.connect(self._on_tile_generated)
+        self._tile_failed.connect(self._on_tile_failed)
+        atexit.register(self.flush)
+
+    @staticmethod
+    def tile_size_for(display_size: int) -> int:
+        """不小于显示尺寸的最小图集尺寸"""
+        for size in ATLAS_TILE_SIZES:
+            if size >= display_size:
+                return size
+        return ATLAS_TILE_SIZES[-1]
+
+    @staticmethod
+    def _signature(asset) -> str:
+        return f"{asset.metadata.file_size}:{asset.modified_at.timestamp()}:{asset.metadata.file_hash}"
+
+    def request(self, asset, display_size: int) -> Optional[QImage]:
+        """获取缩略图；尚未生成时安排后台生成并返回None"""
+        size = self.tile_size_for(display_size)
+        key = (asset.asset_id, size)
+
+        image = self.memory_cache.get(key)
+        if image is not None:
+            self.memory_cache.move_to_end(key)
+            return image
+
+        rgba = self.atlases[size].get(asset.asset_id, self._signature(asset))
+        if rgba is not None:
+            image = QImage(rgba, size, size, size * 4, QImage.Format.Format_RGBA8888).copy()
+            self._remember(key, image)
+            return image
+
+        if key not in self._pending:
+            self._pending[key] = self._pool.submit(
+                self._generate_tile, asset.asset_id, asset.file_path, asset.asset_type.value,
+                self._source_paths(asset), size, self._signature(asset)
+            )
+        return None
+
+    def cancel_pending(self, keep_asset_ids: Iterable[str]):
+        """取消尚未开始、且不在可见范围内的生成任务"""
+        keep = set(keep_asset_ids)
+        for key, future in list(self._pending.items()):
+            if key[0] not in keep and future.cancel():
+                del self._pending[key]
+
+    def invalidate(self, asset_id: str):
+        """丢弃素材的缩略图（源文件改变或素材被删除）"""
+        for size, atlas in self.atlases.items():
+            atlas.remove(asset_id)
+            image = self.memory_cache.pop((asset_id, size), None)
+            if image is not None:
+                self.memory_bytes -= image.sizeInBytes()
+        self._save_timer.start()
+
+    def _source_paths(self, asset) -> List[Optional[str]]:
+        """按尺寸从小到大排列的已有缩略图文件"""
+        return [asset.thumbnail.small_path, asset.thumbnail.medium_path, asset.thumbnail.large_path]
+
+    def _generate_tile(self, asset_id: str, file_path: str, asset_type: str,
+                       source_paths: List[Optional[str]], size: int, signature: str):
+        """后台线程：生成一档缩略图并写入图集
+
+        无论成功与否都会通知主线程，使该任务从 _pending 中移除，之后的请求可以重新生成
+        """
+        try:
+            source = self._pick_source(source_paths, size)
+            if source is not None:
+                image = QImage(source)
+            elif asset_type == "image":
+                image = self._decode_scaled(file_path, size)
+            else:
+                image = self._decode_via_generator(file_path, asset_type, asset_id, size)
+
+            if image is None or image.isNull():
+                logger.warning(f"无法生成缩略图 {file_path}")
+                self._tile_failed.emit(asset_id, size)
+                return
+
+            tile = self._render_tile(image, size)
+            self.atlases[size].put(asset_id, signature, qimage_to_rgba_bytes(tile, size, size))
+            self._tile_generated.emit(asset_id, size, tile)
+
+        except Exception as e:
+            logger.error(f"生成缩略图失败 {file_path}: {e}")
+            self._tile_failed.emit(asset_id, size)
+
+    @staticmethod
+    def _decode_scaled(file_path: str, size: int) -> Optional[QImage]:
+        """直接从原图解码；支持的格式（如JPEG）在解码时就缩小到图块尺寸"""
+        reader = QImageReader(file_path)
+        reader.setAutoTransform(True)
+        source_size = reader.size()
+        if source_size.isValid() and min(source_size.width(), source_size.height()) > size:
+            reader.setScaledSize(source_size.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatioByExpanding))
+        image = reader.read()
+        return None if image.isNull() else image
+
+    def _decode_via_generator(self, file_path: str, asset_type: str, asset_id: str,
+                              size: int) -> Optional[QImage]:
+        """视频、矢量图等借助缩略图生成器解码；读入内存后立即删除生成器写出的中间PNG"""
+        generated = self.asset_manager.thumbnail_generator.generate_thumbnails(file_path, asset_type, asset_id)
+        paths = [generated.get('small_path'), generated.get('medium_path'), generated.get('large_path')]
+        try:
+            source = self._pick_source(paths, size)
+            return QImage(source) if source else None
+        finally:
+            for path in paths:
+                if path:
+                    Path(path).unlink(missing_ok=True)
+
+    @staticmethod
+    def _pick_source(paths: List[Optional[str]], size: int) -> Optional[str]:
+        """选择边长不小于目标尺寸的最小缩略图文件"""
+        existing = [path for path in paths if path and Path(path).exists()]
+        for path in existing:
+            image_size = QImage(path).size()
+            if min(image_size.width(), image_size.height()) >= size:
+                return path
+        return existing[-1] if existing else None
+
+    @staticmethod
+    def _render_tile(image: QImage, size: int) -> QImage:
+        """等比缩放并居中到正方形图块"""
+        tile = QImage(size, size, QImage.Format.Format_RGBA8888)
+        tile.fill(QColor("white"))
+        if image.isNull():
+            return tile
+
+        scaled = image.scaled(size, size, Qt.AspectRatioMode.KeepAspectRatio,
+                              Qt.TransformationMode.SmoothTransformation)
+        painter = QPainter(tile)
+        painter.drawImage((size - scaled.width()) // 2, (size - scaled.height()) // 2, scaled)
+        painter.end()
+        return tile
+
+    def _on_tile_generated(self, asset_id: str, size: int, tile: QImage):
+        """主线程：缓存图块并通知界面"""
+        self._pending.pop((asset_id, size), None)
+        self._remember((asset_id, size), tile)
+        self._save_timer.start()
+        self.thumbnail_ready.emit(asset_id, size)
+
+    def _on_tile_failed(self, asset_id: str, size: int):
+        """主线程：生成失败，移除任务以便之后重试"""
+        self._pending.pop((asset_id, size), None)
+
+    def _remember(self, key: Tuple[str, int], image: QImage):
+        previous = self.memory_cache.pop(key, None)
+        if previous is not None:
+            self.memory_bytes -= previous.sizeInBytes()
+
+        self.memory_cache[key] = image
+        self.memory_bytes += image.sizeInBytes()
+        while self.memory_bytes > self.memory_budget and len(self.memory_cache) > 1:
+            _, evicted = self.memory_cache.popitem(last=False)
+            self.memory_bytes -= evicted.sizeInBytes()
+
+    def flush(self):
+        """保存图集槽位表"""
+        for atlas in self.atlases.values():
+            atlas.save()
+
+    def shutdown(self):
+        """停止后台任务并保存"""
+        # 取消尚未开始的任务（Python 3.8 的 shutdown 不支持 cancel_futures）
+        for future in self._pending.values():
+            future.cancel()
+        self._pending.clear()
+        self._pool.shutdown(wait=False)
+        self.flush()
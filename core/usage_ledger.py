@@ -0,0 +1,175 @@
+"""
+AI Animation Studio - AI使用量账本
+每次API调用只向账本文件追加一行记录，内存中维护按日/按月的聚合，限额检查为O(1)字典查找；
+记录累积到一定数量后压缩为快照（沿用 ai_usage_stats.json 的格式）并清空账本
+"""
+
+import json
+import os
+import threading
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from core.logger import get_logger
+
+logger = get_logger("usage_ledger")
+
+# 账本累积多少条记录后压缩一次
+COMPACT_EVERY = 500
+
+
+def _empty_usage() -> Dict[str, Any]:
+    return {"requests": 0, "tokens": 0, "cost": 0.0}
+
+
+class UsageLedger:
+    """追加写入的AI使用量账本
+
+    快照文件保存截至 last_seq 的聚合结果，账本文件每行一条带序号的使用记录。
+    加载时只重放序号大于 last_seq 的记录，因此压缩过程中途中断也不会重复计数。
+    """
+
+    def __init__(self, snapshot_file: str = "ai_usage_stats.json",
+                 ledger_file: str = "ai_usage_ledger.jsonl"):
+        self.snapshot_file = snapshot_file
+        self.ledger_file = ledger_file
+
+        self.daily_usage: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.monthly_usage: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        self.total_requests = 0
+        self.total_tokens = 0
+        self.last_seq = 0
+
+        self._pending = 0  # 上次压缩后账本中的记录数
+        self._lock = threading.Lock()
+
+        self.load()
+
+    def load(self):
+        """加载快照并重放账本"""
+        with self._lock:
+            try:
+                snapshot_seq = 0
+                if os.path.exists(self.snapshot_file):
+                    with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                        snapshot = json.load(f)
+                    self.daily_usage = snapshot.get("daily_usage", {})
+                    self.monthly_usage = snapshot.get("monthly_usage", {})
+                    self.total_requests = snapshot.get("total_requests", 0)
+                    self.total_tokens = snapshot.get("total_tokens", 0)
+                    snapshot_seq = snapshot.get("last_seq", 0)
+                self.last_seq = snapshot_seq
+
+                if os.path.exists(self.ledger_file):
+                    with open(self.ledger_file, 'r', encoding='utf-8') as f:
+                        for line in f:
+                            try:
+                                record = json.loads(line)
+                            except json.JSONDecodeError:
+                                # 进程崩溃时可能留下不完整的最后一行
+                                continue
+                            if record["seq"] <= snapshot_seq:
+                                continue
+                            self._apply(record)
+                            self._pending += 1
+
+            except Exception as e:
+                logger.error(f"加载使用量账本失败: {e}")
+
+    def _apply(self, record: Dict[str, Any]):
+        """把一条记录计入内存聚合"""
+        timestamp = datetime.fromtimestamp(record["time"])
+        service = record["service"]
+
+        for buckets, period in ((self.daily_usage, timestamp.strftime("%Y-%m-%d")),
+                                (self.monthly_usage, timestamp.strftime("%Y-%m"))):
+            usage = buckets.setdefault(period, {}).setdefault(service, _empty_usage())
+            usage["requests"] += 1
+            usage["tokens"] += record["tokens"]
+            usage["cost"] += record["cost"]
+
+        self.total_requests += 1
+        self.total_tokens += record["tokens"]
+        self.last_seq = max(self.last_seq, record["seq"])
+
+    def record_usage(self, service: str, tokens: int, cost: float = 0.0,
+                     timestamp: Optional[float] = None):
+        """记录一次API调用"""
+        with self._lock:
+            try:
+                record = {
+                    "seq": self.last_seq + 1,
+                    "time": timestamp if timestamp is not None else datetime.now().timestamp(),
+                    "service": service,
+                    "tokens": tokens,
+                    "cost": cost,
+                }
+                with open(self.ledger_file, 'a', encoding='utf-8') as f:
+                    f.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+                self._apply(record)
+                self._pending += 1
+
+                if self._pending >= COMPACT_EVERY:
+                    self._compact()
+
+            except Exception as e:
+                logger.error(f"记录使用量失败: {e}")
+
+    def compact(self):
+        """把账本压缩进快照"""
+        with self._lock:
+            self._compact()
+
+    def _compact(self):
+        try:
+            temp_file = f"{self.snapshot_file}.tmp"
+            with open(temp_file, 'w', encoding='utf-8') as f:
+                json.dump(self.to_dict(), f, ensure_ascii=False, indent=2)
+            os.replace(temp_file, self.snapshot_file)
+
+            # 快照已包含全部记录，截断账本
+            open(self.ledger_file, 'w', encoding='utf-8').close()
+            self._pending = 0
+            logger.debug(f"使用量账本已压缩 (last_seq={self.last_seq})")
+
+        except Exception as e:
+            logger.error(f"压缩使用量账本失败: {e}")
+
+    def get_daily_usage(self, date: str = None) -> Dict[str, Any]:
+        """获取日使用量 {服务: {requests, tokens, cost}}"""
+        if date is None:
+            date = datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            return {service: dict(usage) for service, usage in self.daily_usage.get(date, {}).items()}
+
+    def get_monthly_usage(self, month: str = None) -> Dict[str, Any]:
+        """获取月使用量 {服务: {requests, tokens, cost}}"""
+        if month is None:
+            month = datetime.now().strftime("%Y-%m")
+        with self._lock:
+            return {service: dict(usage) for service, usage in self.monthly_usage.get(month, {}).items()}
+
+    def get_service_usage(self, service: str, period: str = "daily") -> Dict[str, Any]:
+        """获取单个服务当日或当月的使用量"""
+        if period == "monthly":
+            buckets, key = self.monthly_usage, datetime.now().strftime("%Y-%m")
+        else:
+            buckets, key = self.daily_usage, datetime.now().strftime("%Y-%m-%d")
+        with self._lock:
+            return dict(buckets.get(key, {}).get(service, _empty_usage()))
+
+    def to_dict(self) -> Dict[str, Any]:
+        """与旧版 ai_usage_stats.json 兼容的数据结构"""
+        return {
+            "daily_usage": self.daily_usage,
+            "monthly_usage": self.monthly_usage,
+            "total_requests": self.total_requests,
+            "total_tokens": self.total_tokens,
+            "cost_tracking": {},
+            "last_seq": self.last_seq,
+        }
+
+
+# 全局使用量账本实例
+usage_ledger = UsageLedger()
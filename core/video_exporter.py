@@ -8,10 +8,11 @@ import json
 import tempfile
 import subprocess
 from pathlib import Path
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Tuple
 from PyQt6.QtCore import QThread, pyqtSignal
 
 from core.logger import get_logger
+from core.sharded_exporter import ShardedExportThread, ExportVariant, FORMAT_CODEC_ARGS, launch_export_worker
 
 logger = get_logger("video_exporter")
 
@@ -23,7 +24,8 @@ class VideoExportThread(QThread):
     
     def __init__(self, html_content: str, output_path: str, 
                  duration: float = 10.0, fps: int = 30, 
-                 width: int = 1920, height: int = 1080):
+                 width: int = 1920, height: int = 1080,
+                 streaming: bool = True):
         super().__init__()
         self.html_content = html_content
         self.output_path = output_path
@@ -31,6 +33,10 @@ class VideoExportThread(QThread):
         self.fps = fps
         self.width = width
         self.height = height
+        # 流式模式：帧缓冲直接通过管道送入FFmpeg，不再写PNG临时文件
+        self.streaming = streaming
+        self.worker_process: Optional[subprocess.Popen] = None
+        self._cancelled = False
     
     def run(self):
         """执行视频导出"""
@@ -337,77 +343,66 @@ const path = require('path');
             return False
     
     def export_with_webengine(self, html_file: str) -> bool:
-        """使用WebEngine截图导出"""
-        try:
-            from PyQt6.QtWebEngineWidgets import QWebEngineView
-            from PyQt6.QtWidgets import QApplication
-            from PyQt6.QtCore import QUrl, QTimer
-            from PyQt6.QtGui import QPixmap
-            import tempfile
-            import os
+        """使用WebEngine截图导出
+
+        QWebEngineView 只能在主线程创建，导出线程也没有事件循环，因此与分片导出一样，
+        由 core.export_worker 工作进程按虚拟时钟逐帧驱动 renderAtTime(t) 并截图。
+        流式模式下帧直接送入FFmpeg，否则写入临时目录后再合成。
+        """
+        if not self.check_ffmpeg():
+            self.progress_update.emit("FFmpeg未安装或不可用")
+            return False
 
+        work_dir = Path(tempfile.mkdtemp(prefix="aas_export_"))
+        try:
             self.progress_update.emit("开始WebEngine导出...")
 
-            # 创建临时目录
-            temp_dir = tempfile.mkdtemp()
-            frames_dir = os.path.join(temp_dir, "frames")
-            os.makedirs(frames_dir, exist_ok=True)
-
-            # 创建WebEngine视图
-            web_view = QWebEngineView()
-            web_view.resize(self.width, self.height)
-
-            # 加载HTML文件
-            web_view.load(QUrl.fromLocalFile(html_file))
-
-            # 等待页面加载完成
-            page_loaded = False
-            def on_load_finished(success):
-                nonlocal page_loaded
-                page_loaded = success
-
-            web_view.loadFinished.connect(on_load_finished)
-
-            # 等待加载完成
-            app = QApplication.instance()
-            while not page_loaded:
-                app.processEvents()
-
-            if not page_loaded:
-                self.progress_update.emit("页面加载失败")
+            total_frames = int(round(self.duration * self.fps))
+            format_ext = Path(self.output_path).suffix.lstrip('.').lower()
+            spec = {
+                "html_file": html_file,
+                "fps": self.fps,
+                "duration": self.duration,
+                "width": self.width,
+                "height": self.height,
+                "start_frame": 0,
+                "end_frame": total_frames,
+                "codec_args": [*FORMAT_CODEC_ARGS.get(format_ext, FORMAT_CODEC_ARGS["mp4"]), self.output_path],
+            }
+            frames_dir = None
+            if not self.streaming:
+                frames_dir = work_dir / "frames"
+                frames_dir.mkdir()
+                spec["frames_dir"] = str(frames_dir)
+
+            spec_file = work_dir / "export.json"
+            spec_file.write_text(json.dumps(spec, ensure_ascii=False), encoding='utf-8')
+
+            self.worker_process = launch_export_worker(spec_file)
+            for line in self.worker_process.stdout:
+                line = line.strip()
+                if not line.startswith("{"):
+                    continue
+                try:
+                    message = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+
+                if message.get("type") == "progress":
+                    percent = message.get("frames", 0) * 100 // max(total_frames, 1)
+                    self.progress_update.emit(f"截图进度: {int(percent * 0.8)}%")  # 截图占80%进度
+                elif message.get("type") == "error":
+                    logger.error(f"帧捕获失败: {message.get('message')}")
+                    self.progress_update.emit(f"帧捕获失败: {message.get('message')}")
+
+            return_code = self.worker_process.wait()
+            if self._cancelled or return_code != 0:
                 return False
 
-            self.progress_update.emit("页面加载完成，开始截图...")
-
-            # 计算帧数和间隔
-            total_frames = int(self.duration * self.fps)
-            frame_interval = 1000 / self.fps  # 毫秒
-
-            current_frame = 0
-
-            def capture_frame():
-                nonlocal current_frame
-
-                if current_frame >= total_frames:
-                    # 截图完成，开始合成视频
-                    self.compose_video_from_frames(frames_dir)
-                    return
-
-                # 截取当前帧
-                pixmap = web_view.grab()
-                frame_path = os.path.join(frames_dir, f"frame_{current_frame:06d}.png")
-                pixmap.save(frame_path, "PNG")
-
-                current_frame += 1
-                progress = int((current_frame / total_frames) * 80)  # 截图占80%进度
-                self.progress_update.emit(f"截图进度: {progress}%")
-
-                # 设置下一帧的定时器
-                QTimer.singleShot(int(frame_interval), capture_frame)
-
-            # 开始截图
-            capture_frame()
+            if frames_dir is not None:
+                return self.compose_video_from_frames(str(frames_dir))
 
+            self.progress_update.emit("视频合成完成")
             return True
 
         except Exception as e:
@@ -415,6 +410,19 @@ const path = require('path');
             self.progress_update.emit(f"WebEngine导出失败: {str(e)}")
             return False
 
+        finally:
+            if self.worker_process and self.worker_process.poll() is None:
+                self.worker_process.kill()
+                self.worker_process.wait()
+            import shutil
+            shutil.rmtree(work_dir, ignore_errors=True)
+
+    def cancel(self):
+        """取消导出：结束渲染工作进程"""
+        self._cancelled = True
+        if self.worker_process and self.worker_process.poll() is None:
+            self.worker_process.kill()
+
     def compose_video_from_frames(self, frames_dir: str) -> bool:
         """从帧图片合成视频"""
         try:
@@ -466,11 +474,13 @@ class VideoExporter:
     
     def __init__(self):
         self.export_thread = None
+        self.sharded_thread = None
     
     def export_video(self, html_content: str, output_path: str, 
                     duration: float = 10.0, fps: int = 30,
                     width: int = 1920, height: int = 1080,
-                    progress_callback=None, complete_callback=None):
+                    progress_callback=None, complete_callback=None,
+                    streaming: bool = True):
         """导出视频"""
         
         if self.export_thread and self.export_thread.isRunning():
@@ -479,7 +489,7 @@ class VideoExporter:
         
         # 创建导出线程
         self.export_thread = VideoExportThread(
-            html_content, output_path, duration, fps, width, height
+            html_content, output_path, duration, fps, width, height, streaming
         )
         
         # 连接信号
@@ -492,13 +502,49 @@ class VideoExporter:
         self.export_thread.start()
         return True
     
+    def export_video_sharded(self, html_content: str, variants: List[ExportVariant],
+                             duration: float = 10.0, fps: int = 30,
+                             max_workers: Optional[int] = None,
+                             progress_callback=None, complete_callback=None,
+                             percent_callback=None,
+                             render_html: Optional[Dict[Tuple[int, int], str]] = None) -> bool:
+        """分片并行导出视频
+
+        时间轴被切分为多个帧区间，由独立的无界面工作进程并行渲染，
+        每种宽高比渲染一遍并同时编码该宽高比的所有输出变体，最后无损拼接。
+        render_html 按渲染分辨率提供HTML，缺省时都使用 html_content。
+        """
+        if self.is_exporting():
+            logger.warning("视频导出正在进行中")
+            return False
+
+        self.sharded_thread = ShardedExportThread(
+            html_content, variants, duration, fps, max_workers, render_html=render_html
+        )
+
+        if progress_callback:
+            self.sharded_thread.progress_update.connect(progress_callback)
+        if complete_callback:
+            self.sharded_thread.export_complete.connect(complete_callback)
+        if percent_callback:
+            self.sharded_thread.progress_changed.connect(percent_callback)
+
+        self.sharded_thread.start()
+        return True
+
     def is_exporting(self) -> bool:
         """检查是否正在导出"""
-        return self.export_thread and self.export_thread.isRunning()
+        if self.sharded_thread and self.sharded_thread.isRunning():
+            return True
+        return bool(self.export_thread and self.export_thread.isRunning())
     
     def cancel_export(self):
         """取消导出"""
+        if self.sharded_thread and self.sharded_thread.isRunning():
+            self.sharded_thread.cancel()
+            self.sharded_thread.wait()
         if self.export_thread and self.export_thread.isRunning():
+            self.export_thread.cancel()
             self.export_thread.terminate()
             self.export_thread.wait()
     
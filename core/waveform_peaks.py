@@ -0,0 +1,311 @@
+"""
+AI Animation Studio - 波形峰值金字塔
+为音频文件预先计算多分辨率的 min/max 峰值（类似DAW的峰值文件），保存在音频文件旁并以内存映射方式读取，
+绘制和缩放时只需按像素数读取合适的层级
+"""
+
+import os
+import struct
+import hashlib
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from core.logger import get_logger
+
+logger = get_logger("waveform_peaks")
+
+PEAK_FILE_SUFFIX = ".aaspeaks"
+PEAK_FILE_MAGIC = b"AASPEAKS"
+PEAK_FILE_VERSION = 2
+
+# 文件头: 魔数, 版本, 采样率, 样本数, 基础块大小, 层数, 源文件大小, 源文件修改时间(ns), 源声道数
+_HEADER_STRUCT = struct.Struct("<8sIIQIIQqI")
+_HEADER_SIZE = 64
+
+DEFAULT_BLOCK_SIZE = 128
+# 最粗层级的最少块数
+MIN_LEVEL_BLOCKS = 16
+
+FALLBACK_PEAK_DIR = Path.home() / ".ai_animation_studio" / "peaks"
+
+
+def _level_lengths(sample_count: int, block_size: int) -> List[int]:
+    """由样本数推导各层级的块数；每升一级分辨率减半"""
+    lengths = [max(1, -(-sample_count // block_size))]
+    while lengths[-1] > MIN_LEVEL_BLOCKS:
+        lengths.append(-(-lengths[-1] // 2))
+    return lengths
+
+
+def _halve_level(level: np.ndarray) -> np.ndarray:
+    """两两合并上一层级的 min/max"""
+    pairs = len(level) // 2
+    merged = np.empty((-(-len(level) // 2), 2), dtype=np.float32)
+    if pairs:
+        body = level[:pairs * 2].reshape(pairs, 2, 2)
+        merged[:pairs, 0] = body[:, :, 0].min(axis=1)
+        merged[:pairs, 1] = body[:, :, 1].max(axis=1)
+    if len(level) % 2:
+        merged[-1] = level[-1]
+    return merged
+
+
+def _normalize_samples(samples: np.ndarray) -> np.ndarray:
+    """转为单声道 float32，整数样本缩放到 [-1, 1]"""
+    samples = np.asarray(samples)
+    if samples.ndim > 1:
+        samples = samples.mean(axis=1)
+    if np.issubdtype(samples.dtype, np.integer):
+        return samples.astype(np.float32) / float(np.iinfo(samples.dtype).max)
+    return samples.astype(np.float32, copy=False)
+
+
+def peak_file_path(audio_path: str) -> Path:
+    """音频文件对应的峰值文件路径（与音频文件同目录）"""
+    return Path(f"{audio_path}{PEAK_FILE_SUFFIX}")
+
+
+def _fallback_peak_file_path(audio_path: str) -> Path:
+    """音频目录不可写时使用的峰值文件路径"""
+    digest = hashlib.md5(str(Path(audio_path).resolve()).encode('utf-8')).hexdigest()
+    return FALLBACK_PEAK_DIR / f"{digest}{PEAK_FILE_SUFFIX}"
+
+
+def _source_signature(audio_path: Optional[str]) -> Tuple[int, int]:
+    if not audio_path:
+        return 0, 0
+    stat = os.stat(audio_path)
+    return stat.st_size, stat.st_mtime_ns
+
+
+class WaveformPeaks:
+    """多分辨率波形峰值
+
+    第0层每 block_size 个样本保存一对 (min, max)，第k层每块覆盖 block_size * 2^k 个样本。
+    从文件打开时各层都是只读内存映射，不会把整个金字塔读进内存。
+    """
+
+    def __init__(self, levels: List[np.ndarray], sample_rate: int, sample_count: int,
+                 block_size: int = DEFAULT_BLOCK_SIZE, file_path: Optional[Path] = None,
+                 channels: int = 1):
+        self.levels = levels
+        self.sample_rate = sample_rate
+        self.sample_count = sample_count
+        self.block_size = block_size
+        self.file_path = file_path
+        # 源音频声道数（峰值本身已混为单声道）
+        self.channels = channels
+
+    @property
+    def duration(self) -> float:
+        return self.sample_count / self.sample_rate if self.sample_rate else 0.0
+
+    @classmethod
+    def from_samples(cls, samples: np.ndarray, sample_rate: int,
+                     block_size: int = DEFAULT_BLOCK_SIZE) -> "WaveformPeaks":
+        """从内存中的样本构建（不落盘）"""
+        builder = WaveformPeaksBuilder(sample_rate, block_size)
+        builder.add_samples(samples)
+        return builder.finish()
+
+    @classmethod
+    def open(cls, path: Path, audio_path: Optional[str] = None) -> Optional["WaveformPeaks"]:
+        """以内存映射方式打开峰值文件；文件无效或已过期时返回None"""
+        try:
+            with open(path, 'rb') as f:
+                header = f.read(_HEADER_SIZE)
+            if len(header) < _HEADER_STRUCT.size:
+                return None
+
+            (magic, version, sample_rate, sample_count, block_size,
+             level_count, source_size, source_mtime, channels) = _HEADER_STRUCT.unpack_from(header)
+            if magic != PEAK_FILE_MAGIC or version != PEAK_FILE_VERSION:
+                return None
+
+            if audio_path and (source_size, source_mtime) != _source_signature(audio_path):
+                logger.debug(f"峰值文件已过期: {path}")
+                return None
+
+            lengths = _level_lengths(sample_count, block_size)
+            if len(lengths) != level_count:
+                return None
+
+            data = np.memmap(path, dtype=np.float32, mode='r', offset=_HEADER_SIZE,
+                             shape=(sum(lengths), 2))
+            levels = []
+            offset = 0
+            for length in lengths:
+                levels.append(data[offset:offset + length])
+                offset += length
+
+            return cls(levels, sample_rate, sample_count, block_size, Path(path), max(channels, 1))
+
+        except (OSError, ValueError, struct.error) as e:
+            logger.warning(f"打开峰值文件失败 {path}: {e}")
+            return None
+
+    def save(self, path: Path, audio_path: Optional[str] = None) -> bool:
+        """原子写入峰值文件"""
+        try:
+            path = Path(path)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            source_size, source_mtime = _source_signature(audio_path)
+            header = _HEADER_STRUCT.pack(
+                PEAK_FILE_MAGIC, PEAK_FILE_VERSION, self.sample_rate, self.sample_count,
+                self.block_size, len(self.levels), source_size, source_mtime, self.channels
+            ).ljust(_HEADER_SIZE, b"\0")
+
+            temp_path = path.with_name(path.name + ".tmp")
+            with open(temp_path, 'wb') as f:
+                f.write(header)
+                for level in self.levels:
+                    f.write(np.ascontiguousarray(level, dtype=np.float32).tobytes())
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(temp_path, path)
+            self.file_path = path
+            return True
+
+        except OSError as e:
+            logger.warning(f"保存峰值文件失败 {path}: {e}")
+            return False
+
+    def level_for(self, samples_per_pixel: float) -> int:
+        """选择每块样本数不超过每像素样本数的最粗层级"""
+        level = 0
+        while (level + 1 < len(self.levels)
+               and self.block_size * (2 ** (level + 1)) <= samples_per_pixel):
+            level += 1
+        return level
+
+    def get_columns(self, start_sample: float, end_sample: float,
+                    columns: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """计算每个像素列的 (min, max)
+
+        Returns:
+            (mins, maxs, valid)，valid 标记该列是否落在音频范围内
+        """
+        empty = np.zeros(0, dtype=np.float32)
+        if columns <= 0 or end_sample <= start_sample or not self.levels:
+            return empty, empty, np.zeros(0, dtype=bool)
+
+        samples_per_pixel = (end_sample - start_sample) / columns
+        level = self.level_for(samples_per_pixel)
+        data = self.levels[level]
+        block = self.block_size * (2 ** level)
+
+        edges = start_sample + np.arange(columns + 1) * samples_per_pixel
+        valid = (edges[:-1] < self.sample_count) & (edges[1:] > 0)
+
+        last_block = len(data) - 1
+        starts = np.clip((edges[:-1] // block).astype(np.int64), 0, last_block)
+        # 每列最后一个（可能只覆盖一部分的）块
+        ends = np.clip((np.ceil(edges[1:]) - 1) // block, 0, last_block).astype(np.int64)
+        ends = np.maximum(ends, starts)
+
+        # reduceat 的最后一段会一直延伸到数组末尾，先截取可见范围
+        low = int(starts[0])
+        window = np.asarray(data[low:int(ends[-1]) + 1])
+        starts -= low
+        ends -= low
+
+        mins = np.minimum(np.minimum.reduceat(window[:, 0], starts), window[ends, 0])
+        maxs = np.maximum(np.maximum.reduceat(window[:, 1], starts), window[ends, 1])
+        return mins, maxs, valid
+
+    def get_time_columns(self, start_time: float, end_time: float,
+                         columns: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """按时间范围计算每个像素列的 (min, max)"""
+        return self.get_columns(start_time * self.sample_rate,
+                                end_time * self.sample_rate, columns)
+
+    def pixel_lines(self, start_time: float, end_time: float, width: int,
+                    center_y: int, amplitude: float) -> np.ndarray:
+        """计算波形绘制用的竖线 (x, y_max, y_min)，每个有效像素列一条"""
+        mins, maxs, valid = self.get_time_columns(start_time, end_time, width)
+        if len(valid) == 0:
+            return np.zeros((0, 3), dtype=np.int32)
+
+        xs = np.flatnonzero(valid)
+        lines = np.empty((len(xs), 3), dtype=np.int32)
+        lines[:, 0] = xs
+        lines[:, 1] = center_y - (maxs[xs] * amplitude).astype(np.int32)
+        lines[:, 2] = center_y - (mins[xs] * amplitude).astype(np.int32)
+        return lines
+
+
+class WaveformPeaksBuilder:
+    """增量构建峰值金字塔，可边解码边输入样本块"""
+
+    def __init__(self, sample_rate: int, block_size: int = DEFAULT_BLOCK_SIZE):
+        self.sample_rate = sample_rate
+        self.block_size = block_size
+        self.sample_count = 0
+        self.channels = 1
+        self._blocks: List[np.ndarray] = []
+        self._carry = np.zeros(0, dtype=np.float32)
+
+    def add_samples(self, samples: np.ndarray):
+        """输入一块样本（任意长度，可为多声道或整数格式）"""
+        if np.ndim(samples) > 1:
+            self.channels = max(self.channels, np.shape(samples)[1])
+        samples = _normalize_samples(samples)
+        if len(samples) == 0:
+            return
+
+        self.sample_count += len(samples)
+        if len(self._carry):
+            samples = np.concatenate([self._carry, samples])
+
+        full = len(samples) // self.block_size
+        if full:
+            body = samples[:full * self.block_size].reshape(full, self.block_size)
+            peaks = np.empty((full, 2), dtype=np.float32)
+            peaks[:, 0] = body.min(axis=1)
+            peaks[:, 1] = body.max(axis=1)
+            self._blocks.append(peaks)
+
+        self._carry = samples[full * self.block_size:].copy()
+
+    def finish(self) -> WaveformPeaks:
+        """生成峰值金字塔"""
+        blocks = list(self._blocks)
+        if len(self._carry) or not blocks:
+            tail = self._carry if len(self._carry) else np.zeros(1, dtype=np.float32)
+            blocks.append(np.array([[tail.min(), tail.max()]], dtype=np.float32))
+
+        levels = [np.concatenate(blocks)]
+        while len(levels[-1]) > MIN_LEVEL_BLOCKS:
+            levels.append(_halve_level(levels[-1]))
+
+        return WaveformPeaks(levels, self.sample_rate, max(self.sample_count, 1), self.block_size,
+                             channels=self.channels)
+
+
+def load_peaks(audio_path: str) -> Optional[WaveformPeaks]:
+    """加载音频文件已有且未过期的峰值文件"""
+    for path in (peak_file_path(audio_path), _fallback_peak_file_path(audio_path)):
+        if path.exists():
+            peaks = WaveformPeaks.open(path, audio_path)
+            if peaks:
+                return peaks
+    return None
+
+
+def store_peaks(peaks: WaveformPeaks, audio_path: str) -> Optional[WaveformPeaks]:
+    """把峰值保存到音频文件旁（不可写时保存到用户目录），并返回内存映射版本"""
+    for path in (peak_file_path(audio_path), _fallback_peak_file_path(audio_path)):
+        if peaks.save(path, audio_path):
+            return WaveformPeaks.open(path, audio_path) or peaks
+    return peaks
+
+
+def load_or_build_peaks(audio_path: str, samples: np.ndarray,
+                        sample_rate: int) -> WaveformPeaks:
+    """优先复用峰值文件，否则由样本构建并保存"""
+    peaks = load_peaks(audio_path)
+    if peaks and peaks.sample_rate == sample_rate:
+        return peaks
+    return store_peaks(WaveformPeaks.from_samples(samples, sample_rate), audio_path)
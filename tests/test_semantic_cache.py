@@ -0,0 +1,87 @@
+"""
+近似提示词缓存：只有实词相同的描述可以命中，颜色、数量等只差一个词的描述必须未命中
+"""
+
+import tempfile
+import unittest
+
+from core.ai_service_manager import AICache, AIRequest, AIResponse, AIServiceType
+
+
+def make_request(description: str) -> AIRequest:
+    return AIRequest(prompt=f"生成HTML动画：{description}\n只输出代码", service=AIServiceType.GEMINI,
+                     model="gemini-2.5-flash")
+
+
+class SemanticCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = AICache(self._tmp.name)
+        self.cached = "a red circle moves from left to right and bounces three times"
+        request = make_request(self.cached)
+        response = AIResponse(content="<html>red</html>", service=request.service, model=request.model,
+                              tokens_used=10, cost=0.0, response_time=1.0)
+        self.cache.put(request, response, self.cached)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def lookup(self, description: str):
+        return self.cache.get(make_request(description), description, allow_similar=True)
+
+    def test_stopword_case_and_punctuation_changes_hit(self):
+        for description in (
+            "A red circle moves from left to right, and bounces three times.",
+            "the red circle moves from left to right and then bounces three times",
+        ):
+            with self.subTest(description=description):
+                response = self.lookup(description)
+                self.assertIsNotNone(response)
+                self.assertEqual(response.content, "<html>red</html>")
+
+    def test_single_content_word_change_misses(self):
+        for description in (
+            "a blue circle moves from left to right and bounces three times",
+            "a red circle moves from left to right and bounces five times",
+            "a red circle moves from right to left and bounces three times",
+            "a red square moves from left to right and bounces three times",
+            "a red circle bounces three times and moves from left to right",
+        ):
+            with self.subTest(description=description):
+                self.assertIsNone(self.lookup(description))
+
+
+class CJKSemanticCacheTest(unittest.TestCase):
+
+    def setUp(self):
+        self._tmp = tempfile.TemporaryDirectory()
+        self.cache = AICache(self._tmp.name)
+        self.cached = "一个地球在旋转，然后，慢慢放大"
+        request = make_request(self.cached)
+        response = AIResponse(content="<html>earth</html>", service=request.service, model=request.model,
+                              tokens_used=10, cost=0.0, response_time=1.0)
+        self.cache.put(request, response, self.cached)
+
+    def tearDown(self):
+        self._tmp.cleanup()
+
+    def lookup(self, description: str):
+        return self.cache.get(make_request(description), description, allow_similar=True)
+
+    def test_standalone_particle_and_punctuation_changes_hit(self):
+        response = self.lookup("一个地球在旋转。慢慢放大！")
+        self.assertIsNotNone(response)
+        self.assertEqual(response.content, "<html>earth</html>")
+
+    def test_character_inside_word_is_not_a_stopword(self):
+        for description in (
+            "一个球在旋转，然后，慢慢放大",
+            "一个地球在旋转，然后，慢慢缩小",
+        ):
+            with self.subTest(description=description):
+                self.assertIsNone(self.lookup(description))
+
+
+if __name__ == "__main__":
+    unittest.main()
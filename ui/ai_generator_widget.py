@@ -12,7 +12,7 @@ from PyQt6.QtWidgets import (
     QRadioButton, QDialog, QDialogButtonBox, QTableWidget, QTableWidgetItem
 )
 from PyQt6.QtCore import Qt, pyqtSignal, QThread, QTimer, QPropertyAnimation, QEasingCurve
-from PyQt6.QtGui import QFont, QPixmap, QPainter, QColor, QLinearGradient, QAction
+from PyQt6.QtGui import QFont, QPixmap, QPainter, QColor, QLinearGradient, QAction, QTextCursor
 
 from core.data_structures import AnimationSolution, TechStack
 from core.logger import get_logger
@@ -22,6 +22,36 @@ from ai.gemini_generator import GeminiGenerator
 
 logger = get_logger("ai_generator_widget")
 
+
+class AnimationCodeWorker(QThread):
+    """在后台线程调用AI服务管理器，逐段转发生成的HTML"""
+
+    chunk_received = pyqtSignal(str)  # 流式输出片段
+    response_ready = pyqtSignal(object)  # AIResponse，生成失败时为None
+    error_occurred = pyqtSignal(str)  # 错误信息
+
+    def __init__(self, prompt: str, service, description: str = None):
+        super().__init__()
+        self.prompt = prompt
+        self.service = service
+        self.description = description
+
+    def run(self):
+        """运行生成任务"""
+        try:
+            from core.ai_service_manager import ai_service_manager
+
+            response = ai_service_manager.generate_animation_code(
+                self.prompt, self.service, description=self.description,
+                chunk_callback=self.chunk_received.emit
+            )
+            self.response_ready.emit(response)
+
+        except Exception as e:
+            logger.error(f"AI生成线程失败: {e}")
+            self.error_occurred.emit(str(e))
+
+
 class AIGeneratorWidget(QWidget):
     """AI生成器组件"""
 
@@ -29,6 +59,9 @@ class AIGeneratorWidget(QWidget):
     solution_selected = pyqtSignal(AnimationSolution)  # 方案选择信号
     template_applied = pyqtSignal(str)  # 模板应用信号
     batch_generation_completed = pyqtSignal(list)  # 批量生成完成信号
+    generation_stream_started = pyqtSignal()  # 开始流式输出
+    generation_chunk = pyqtSignal(str)  # 流式输出的HTML片段
+    generation_stream_finished = pyqtSignal(str)  # 流式输出结束（完整HTML）
 
     def __init__(self):
         super().__init__()
@@ -36,6 +69,8 @@ class AIGeneratorWidget(QWidget):
         self.current_solutions = []
         self.generator_thread = None
         self.selected_solution = None
+        self.generation_service = None
+        self.streamed_chunks = []
 
         # 模板管理
         self.prompt_templates = {}
@@ -1029,9 +1064,40 @@ class AIGeneratorWidget(QWidget):
             # 清空之前的结果
             self.current_solutions = []
             self.solutions_list.clear()
+            self.code_preview.clear()
+            self.streamed_chunks = []
+            self.generation_service = preferred_service
+
+            # 在后台线程中生成，片段到达时立即显示
+            self.generator_thread = AnimationCodeWorker(prompt, preferred_service, description)
+            self.generator_thread.chunk_received.connect(self.on_generation_chunk)
+            self.generator_thread.response_ready.connect(self.on_generation_response)
+            self.generator_thread.error_occurred.connect(self.on_generation_failed)
+            self.generation_stream_started.emit()
+            self.generator_thread.start()
+
+        except Exception as e:
+            logger.error(f"生成动画失败: {e}")
+            self.on_generation_error(f"生成动画失败: {str(e)}")
 
-            # 使用AI服务管理器生成
-            response = ai_service_manager.generate_animation_code(prompt, preferred_service)
+    def on_generation_chunk(self, chunk: str):
+        """收到流式片段：追加到代码预览末尾并转发"""
+        self.streamed_chunks.append(chunk)
+        cursor = self.code_preview.textCursor()
+        cursor.movePosition(QTextCursor.MoveOperation.End)
+        cursor.insertText(chunk)
+        self.generation_chunk.emit(chunk)
+
+    def on_generation_failed(self, error_message: str):
+        """生成线程出错"""
+        self.generation_stream_finished.emit("".join(self.streamed_chunks))
+        self.on_generation_error(f"生成动画失败: {error_message}")
+
+    def on_generation_response(self, response):
+        """生成线程完成"""
+        try:
+            preferred_service = self.generation_service
+            self.generation_stream_finished.emit(response.content if response else "".join(self.streamed_chunks))
 
             if response:
                 # 创建解决方案对象
@@ -722,6 +722,17 @@ class SmartSnapSystem:
         snapped_pos = QPointF(pos)
         min_distance = self.snap_threshold
 
+        # 舞台画布提供空间索引时只查询阈值范围内的边界
+        spatial_index = getattr(self.stage_canvas, 'spatial_index', None)
+        if spatial_index is not None:
+            aligned_x = spatial_index.query_aligned("x", pos.x(), min_distance, exclude=element_id)
+            if aligned_x:
+                snapped_pos.setX(aligned_x[0])
+            aligned_y = spatial_index.query_aligned("y", pos.y(), min_distance, exclude=element_id)
+            if aligned_y:
+                snapped_pos.setY(aligned_y[0])
+            return snapped_pos
+
         for other_id, other_element in self.stage_canvas.elements.items():
             if other_id == element_id:
                 continue
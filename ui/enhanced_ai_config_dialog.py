@@ -18,84 +18,33 @@ from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QThread
 from PyQt6.QtGui import QFont, QColor, QPixmap, QIcon
 
 from core.logger import get_logger
+from core.usage_ledger import usage_ledger
 
 logger = get_logger("enhanced_ai_config")
 
 
 class APIUsageMonitor:
-    """API使用量监控器"""
+    """API使用量监控器（读取 core.usage_ledger 中的全局使用量账本）"""
     
     def __init__(self):
-        self.usage_file = "ai_usage_stats.json"
-        self.usage_data = self.load_usage_data()
+        self.ledger = usage_ledger
     
-    def load_usage_data(self) -> Dict[str, Any]:
-        """加载使用量数据"""
-        try:
-            if os.path.exists(self.usage_file):
-                with open(self.usage_file, 'r', encoding='utf-8') as f:
-                    return json.load(f)
-            return {
-                "daily_usage": {},
-                "monthly_usage": {},
-                "total_requests": 0,
-                "total_tokens": 0,
-                "cost_tracking": {}
-            }
-        except Exception as e:
-            logger.error(f"加载使用量数据失败: {e}")
-            return {}
-    
-    def save_usage_data(self):
-        """保存使用量数据"""
-        try:
-            with open(self.usage_file, 'w', encoding='utf-8') as f:
-                json.dump(self.usage_data, f, ensure_ascii=False, indent=2)
-        except Exception as e:
-            logger.error(f"保存使用量数据失败: {e}")
+    @property
+    def usage_data(self) -> Dict[str, Any]:
+        """使用量数据"""
+        return self.ledger.to_dict()
     
     def record_usage(self, service: str, tokens: int, cost: float = 0.0):
         """记录使用量"""
-        today = datetime.now().strftime("%Y-%m-%d")
-        month = datetime.now().strftime("%Y-%m")
-        
-        # 日使用量
-        if today not in self.usage_data["daily_usage"]:
-            self.usage_data["daily_usage"][today] = {}
-        if service not in self.usage_data["daily_usage"][today]:
-            self.usage_data["daily_usage"][today][service] = {"requests": 0, "tokens": 0, "cost": 0.0}
-        
-        self.usage_data["daily_usage"][today][service]["requests"] += 1
-        self.usage_data["daily_usage"][today][service]["tokens"] += tokens
-        self.usage_data["daily_usage"][today][service]["cost"] += cost
-        
-        # 月使用量
-        if month not in self.usage_data["monthly_usage"]:
-            self.usage_data["monthly_usage"][month] = {}
-        if service not in self.usage_data["monthly_usage"][month]:
-            self.usage_data["monthly_usage"][month][service] = {"requests": 0, "tokens": 0, "cost": 0.0}
-        
-        self.usage_data["monthly_usage"][month][service]["requests"] += 1
-        self.usage_data["monthly_usage"][month][service]["tokens"] += tokens
-        self.usage_data["monthly_usage"][month][service]["cost"] += cost
-        
-        # 总计
-        self.usage_data["total_requests"] += 1
-        self.usage_data["total_tokens"] += tokens
-        
-        self.save_usage_data()
+        self.ledger.record_usage(service, tokens, cost)
     
     def get_daily_usage(self, date: str = None) -> Dict[str, Any]:
         """获取日使用量"""
-        if date is None:
-            date = datetime.now().strftime("%Y-%m-%d")
-        return self.usage_data["daily_usage"].get(date, {})
+        return self.ledger.get_daily_usage(date)
     
     def get_monthly_usage(self, month: str = None) -> Dict[str, Any]:
         """获取月使用量"""
-        if month is None:
-            month = datetime.now().strftime("%Y-%m")
-        return self.usage_data["monthly_usage"].get(month, {})
+        return self.ledger.get_monthly_usage(month)
 
 
 class ModelTester(QThread):
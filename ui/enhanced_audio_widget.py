@@ -12,13 +12,15 @@ from PyQt6.QtWidgets import (
     QScrollArea, QFrame, QSplitter, QProgressBar, QToolButton, QMenu,
     QColorDialog, QMessageBox, QInputDialog
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QThread, QPropertyAnimation
+from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QThread, QPropertyAnimation, QLine
 from PyQt6.QtGui import (
     QPainter, QPen, QBrush, QColor, QFont, QLinearGradient, QPolygon,
     QPixmap, QFontMetrics, QAction, QCursor
 )
 
 from core.logger import get_logger
+from core import audio_analysis
+from core.waveform_peaks import WaveformPeaks, load_or_build_peaks
 
 logger = get_logger("enhanced_audio_widget")
 
@@ -29,10 +31,14 @@ class AudioAnalyzer(QThread):
     analysis_complete = pyqtSignal(dict)  # 分析完成信号
     progress_updated = pyqtSignal(int)    # 进度更新信号
     
-    def __init__(self, audio_data: np.ndarray, sample_rate: int):
+    SPECTRUM_WINDOW_SIZE = 2048
+    MAX_SPECTRUM_FRAMES = 4096  # 频谱最多保留的帧数
+    
+    def __init__(self, audio_data: np.ndarray, sample_rate: int, source_path: Optional[str] = None):
         super().__init__()
         self.audio_data = audio_data
         self.sample_rate = sample_rate
+        self.source_path = source_path  # 提供时峰值金字塔会缓存到音频文件旁
         self.should_stop = False
     
     def run(self):
@@ -50,6 +56,7 @@ class AudioAnalyzer(QThread):
             # 波形数据（降采样用于显示）
             downsample_factor = max(1, len(self.audio_data) // 2000)
             result['waveform'] = self.audio_data[::downsample_factor]
+            result['peaks'] = self.build_peaks()
             
             self.progress_updated.emit(30)
             
@@ -64,7 +71,7 @@ class AudioAnalyzer(QThread):
             self.progress_updated.emit(80)
             
             # 节拍检测
-            result['beats'] = self.detect_beats()
+            result['beats'] = self.detect_beats(result['envelope'])
             
             self.progress_updated.emit(100)
             
@@ -73,24 +80,27 @@ class AudioAnalyzer(QThread):
         except Exception as e:
             logger.error(f"音频分析失败: {e}")
     
+    def build_peaks(self) -> Optional[WaveformPeaks]:
+        """构建波形峰值金字塔"""
+        try:
+            if self.source_path:
+                return load_or_build_peaks(self.source_path, self.audio_data, self.sample_rate)
+            return WaveformPeaks.from_samples(self.audio_data, self.sample_rate)
+            
+        except Exception as e:
+            logger.error(f"构建波形峰值失败: {e}")
+            return None
+    
     def analyze_spectrum(self) -> np.ndarray:
         """分析频谱"""
         try:
-            # 使用FFT进行频谱分析
-            window_size = 2048
-            hop_size = window_size // 4
-            
-            spectrogram = []
-            for i in range(0, len(self.audio_data) - window_size, hop_size):
-                if self.should_stop:
-                    break
-                
-                window = self.audio_data[i:i + window_size]
-                fft = np.fft.fft(window)
-                magnitude = np.abs(fft[:window_size // 2])
-                spectrogram.append(magnitude)
-            
-            return np.array(spectrogram).T
+            # 分帧视图 + 批量rFFT，长音频自动增大帧移以限制频谱大小
+            return audio_analysis.stft_magnitude(
+                audio_analysis.to_mono(self.audio_data),
+                window_size=self.SPECTRUM_WINDOW_SIZE,
+                max_frames=self.MAX_SPECTRUM_FRAMES,
+                should_stop=lambda: self.should_stop
+            )
             
         except Exception as e:
             logger.error(f"频谱分析失败: {e}")
@@ -100,42 +110,22 @@ class AudioAnalyzer(QThread):
         """计算音量包络"""
         try:
             window_size = self.sample_rate // 10  # 100ms窗口
-            envelope = []
-            
-            for i in range(0, len(self.audio_data), window_size):
-                if self.should_stop:
-                    break
-                
-                window = self.audio_data[i:i + window_size]
-                rms = np.sqrt(np.mean(window ** 2))
-                envelope.append(rms)
-            
-            return np.array(envelope)
+            return audio_analysis.rms_envelope(
+                audio_analysis.to_mono(self.audio_data), window_size,
+                should_stop=lambda: self.should_stop
+            )
             
         except Exception as e:
             logger.error(f"包络计算失败: {e}")
             return np.array([])
     
-    def detect_beats(self) -> List[float]:
-        """检测节拍"""
+    def detect_beats(self, envelope: Optional[np.ndarray] = None) -> List[float]:
+        """检测节拍（可传入已计算的包络以避免重复计算）"""
         try:
             # 简化的节拍检测算法
-            envelope = self.calculate_envelope()
-            if len(envelope) == 0:
-                return []
-            
-            # 寻找峰值
-            beats = []
-            threshold = np.mean(envelope) + np.std(envelope)
-            
-            for i in range(1, len(envelope) - 1):
-                if (envelope[i] > envelope[i-1] and 
-                    envelope[i] > envelope[i+1] and 
-                    envelope[i] > threshold):
-                    time = i * (len(self.audio_data) / len(envelope)) / self.sample_rate
-                    beats.append(time)
-            
-            return beats
+            if envelope is None:
+                envelope = self.calculate_envelope()
+            return audio_analysis.detect_beats(envelope, len(self.audio_data), self.sample_rate)
             
         except Exception as e:
             logger.error(f"节拍检测失败: {e}")
@@ -171,6 +161,7 @@ class EnhancedWaveformWidget(QWidget):
         
         # 音频数据
         self.audio_data = np.array([])
+        self.waveform_peaks: Optional[WaveformPeaks] = None
         self.spectrum_data = np.array([])
         self.envelope_data = np.array([])
         self.beats = []
@@ -213,6 +204,7 @@ class EnhancedWaveformWidget(QWidget):
         """设置音频分析数据"""
         try:
             self.audio_data = analysis_data.get('waveform', np.array([]))
+            self.waveform_peaks = analysis_data.get('peaks')
             self.spectrum_data = analysis_data.get('spectrum', np.array([]))
             self.envelope_data = analysis_data.get('envelope', np.array([]))
             self.beats = analysis_data.get('beats', [])
@@ -304,7 +296,11 @@ class EnhancedWaveformWidget(QWidget):
     
     def draw_waveform(self, painter: QPainter, rect, start_time: float, end_time: float):
         """绘制波形"""
-        if len(self.audio_data) == 0:
+        if self.waveform_peaks is None and len(self.audio_data) > 0 and self.duration > 0:
+            # 只有降采样波形时，按其等效采样率构建峰值
+            sample_rate = max(1, int(round(len(self.audio_data) / self.duration)))
+            self.waveform_peaks = WaveformPeaks.from_samples(self.audio_data, sample_rate)
+        if self.waveform_peaks is None:
             return
         
         painter.setPen(QPen(self.waveform_color, 1))
@@ -312,34 +308,10 @@ class EnhancedWaveformWidget(QWidget):
         center_y = rect.height() // 2
         max_amplitude = rect.height() // 4
         
-        # 计算数据范围
-        total_samples = len(self.audio_data)
-        start_sample = int((start_time / self.duration) * total_samples)
-        end_sample = int((end_time / self.duration) * total_samples)
-        
-        if start_sample >= total_samples or end_sample <= 0:
-            return
-        
-        start_sample = max(0, start_sample)
-        end_sample = min(total_samples, end_sample)
-        
-        # 绘制波形
-        samples_per_pixel = max(1, (end_sample - start_sample) / rect.width())
-        
-        for x in range(rect.width()):
-            sample_start = int(start_sample + x * samples_per_pixel)
-            sample_end = int(start_sample + (x + 1) * samples_per_pixel)
-            
-            if sample_start < total_samples and sample_end <= total_samples:
-                segment = self.audio_data[sample_start:sample_end]
-                if len(segment) > 0:
-                    max_val = np.max(segment)
-                    min_val = np.min(segment)
-                    
-                    y1 = center_y - int(max_val * max_amplitude)
-                    y2 = center_y - int(min_val * max_amplitude)
-                    
-                    painter.drawLine(x, y1, x, y2)
+        # 从峰值金字塔中选取合适层级，每个像素列一条竖线
+        lines = self.waveform_peaks.pixel_lines(start_time, end_time, rect.width(),
+                                                center_y, max_amplitude)
+        painter.drawLines([QLine(int(x), int(y1), int(x), int(y2)) for x, y1, y2 in lines])
     
     def draw_spectrum(self, painter: QPainter, rect, start_time: float, end_time: float):
         """绘制频谱"""
@@ -878,6 +850,19 @@ class AudioControlPanel(QWidget):
             self.analyze_btn.setEnabled(True)
             logger.info("音频分析完成")
 
+    def on_decode_started(self):
+        """音频开始解码（复用分析进度条）"""
+        self.analysis_progress.setValue(0)
+        self.analysis_progress.setVisible(True)
+
+    def on_decode_progress(self, progress: int):
+        """音频解码进度更新"""
+        self.analysis_progress.setValue(progress)
+
+    def on_decode_finished(self):
+        """音频解码结束（成功或失败）"""
+        self.analysis_progress.setVisible(False)
+
     def on_analysis_complete(self, analysis_data: dict):
         """分析完成事件"""
         self.on_analysis_progress(100)
@@ -19,6 +19,7 @@ from PyQt6.QtGui import (
 )
 
 from core.logger import get_logger
+from core.html_stream import HTMLStreamBuffer
 
 logger = get_logger("enhanced_code_viewer")
 
@@ -434,6 +435,7 @@ class EnhancedCodeViewer(QWidget):
     # 信号定义
     content_changed = pyqtSignal(str)  # 内容改变
     search_performed = pyqtSignal(str, int)  # 搜索执行
+    stream_preview_ready = pyqtSignal(str)  # 流式输出到达可预览边界
     
     def __init__(self, parent=None):
         super().__init__(parent)
@@ -441,6 +443,9 @@ class EnhancedCodeViewer(QWidget):
         self.current_language = "html"
         self.search_results = []
         self.current_search_index = -1
+
+        # 流式输出缓冲
+        self.stream_buffer: Optional[HTMLStreamBuffer] = None
         
         self.setup_ui()
         self.setup_shortcuts()
@@ -643,6 +648,46 @@ class EnhancedCodeViewer(QWidget):
         except Exception as e:
             logger.error(f"加载代码内容失败: {e}")
 
+    def begin_stream(self):
+        """开始接收流式输出"""
+        self.stream_buffer = HTMLStreamBuffer()
+        self.html_editor.clear()
+        self.css_editor.clear()
+        self.js_editor.clear()
+        self.full_editor.clear()
+        self.code_tabs.setCurrentWidget(self.full_editor)
+
+    def append_stream_chunk(self, chunk: str):
+        """追加一个流式片段：只在末尾插入文本，已有内容不重新布局和高亮"""
+        try:
+            if self.stream_buffer is None:
+                self.begin_stream()
+
+            # 用户没有向上翻看时保持滚动到末尾
+            scroll_bar = self.full_editor.verticalScrollBar()
+            follow_tail = scroll_bar.value() >= scroll_bar.maximum() - 4
+
+            cursor = QTextCursor(self.full_editor.document())
+            cursor.movePosition(QTextCursor.MoveOperation.End)
+            cursor.insertText(chunk)
+
+            if follow_tail:
+                scroll_bar.setValue(scroll_bar.maximum())
+
+            if self.stream_buffer.feed(chunk):
+                self.stream_preview_ready.emit(self.stream_buffer.preview_html)
+
+        except Exception as e:
+            logger.error(f"追加流式内容失败: {e}")
+
+    def end_stream(self, final_content: Optional[str] = None):
+        """结束流式输出，按完整内容刷新各标签页和结构树"""
+        buffer = self.stream_buffer
+        self.stream_buffer = None
+        if final_content is None:
+            final_content = buffer.html if buffer else self.get_content()
+        self.load_content(final_content)
+
     def parse_html_content(self, html_content: str) -> Tuple[str, str, str]:
         """解析HTML内容，分离HTML、CSS、JavaScript"""
         try:
@@ -18,6 +18,7 @@ from PyQt6.QtGui import (
 )
 
 from core.data_structures import TimeSegment, AnimationType
+from core.interval_index import IntervalIndex
 from core.logger import get_logger
 
 logger = get_logger("enhanced_timeline_manager")
@@ -87,6 +88,10 @@ class VisualTimelineWidget(QWidget):
         self.total_duration = 30.0
         self.current_time = 0.0
         self.selected_segment = None
+
+        # 时间段区间索引，segments 被替换、增删或时间段被拖动后重建
+        self._segment_index: Optional[IntervalIndex] = None
+        self._segment_index_key = None
         
         # 显示设置
         self.pixels_per_second = 50
@@ -125,16 +130,35 @@ class VisualTimelineWidget(QWidget):
         """添加时间段"""
         segment.track_index = track_index
         self.segments.append(segment)
+        self.invalidate_segment_index()
         self.update()
         logger.debug(f"添加时间段: {segment.name}")
     
     def remove_segment(self, segment_id: int):
         """移除时间段"""
         self.segments = [s for s in self.segments if s.id != segment_id]
+        self.invalidate_segment_index()
         if self.selected_segment == segment_id:
             self.selected_segment = None
         self.update()
     
+    def invalidate_segment_index(self):
+        """时间段的开始或结束时间被直接修改后调用"""
+        self._segment_index = None
+
+    @property
+    def segment_index(self) -> IntervalIndex:
+        """时间段区间索引"""
+        key = (id(self.segments), len(self.segments))
+        if self._segment_index is None or self._segment_index_key != key:
+            self._segment_index = IntervalIndex(self.segments)
+            self._segment_index_key = key
+        return self._segment_index
+
+    def segments_at_time(self, time: float) -> List[TimelineSegment]:
+        """包含指定时间的所有段"""
+        return self.segment_index.at(time)
+
     def get_segment_by_id(self, segment_id: int) -> Optional[TimelineSegment]:
         """根据ID获取时间段"""
         for segment in self.segments:
@@ -385,6 +409,7 @@ class VisualTimelineWidget(QWidget):
             if new_end_time <= self.total_duration:
                 self.dragging_segment.start_time = new_start_time
                 self.dragging_segment.end_time = new_end_time
+                self.invalidate_segment_index()
                 self.update()
         
         elif self.resizing_segment:
@@ -398,6 +423,7 @@ class VisualTimelineWidget(QWidget):
                 new_end_time = min(self.total_duration, max(time, self.resizing_segment.start_time + 0.1))
                 self.resizing_segment.end_time = new_end_time
             
+            self.invalidate_segment_index()
             self.update()
         
         else:
@@ -495,9 +521,8 @@ class VisualTimelineWidget(QWidget):
         time = pos.x() / self.pixels_per_second
         track_index = (pos.y() - self.ruler_height) // (self.track_height + self.track_spacing)
         
-        for segment in self.segments:
-            if (segment.contains_time(time) and 
-                getattr(segment, 'track_index', 0) == track_index):
+        for segment in self.segment_index.at(time):
+            if getattr(segment, 'track_index', 0) == track_index:
                 return segment
         
         return None
@@ -972,6 +997,7 @@ class TimeSegmentManager(QWidget):
                 self.current_segment.start_time = start_time
                 self.current_segment.end_time = end_time
                 self.duration_label.setText(f"{end_time - start_time:.1f}s")
+                self.visual_timeline.invalidate_segment_index()
                 self.visual_timeline.update()
 
     def choose_color(self):
@@ -17743,6 +17743,11 @@ class MainWindow(QMainWindow):
             self.ai_generator_widget.solutions_generated.connect(self.on_solutions_generated)
             # 连接AI生成器和预览器
             self.ai_generator_widget.solutions_generated.connect(self.preview_first_solution)
+            # 流式生成的HTML实时显示到代码查看器，并在闭合标签处刷新预览
+            if hasattr(self, 'preview_widget') and hasattr(self.ai_generator_widget, 'generation_chunk'):
+                self.ai_generator_widget.generation_stream_started.connect(self.preview_widget.begin_html_stream)
+                self.ai_generator_widget.generation_chunk.connect(self.preview_widget.append_html_chunk)
+                self.ai_generator_widget.generation_stream_finished.connect(self.preview_widget.finish_html_stream)
         if hasattr(self, 'stage_widget'):
             self.stage_widget.element_selected.connect(self.on_element_selected)
         if hasattr(self, 'elements_widget'):
@@ -18316,6 +18321,13 @@ class MainWindow(QMainWindow):
                     # 添加项目文件
                     zipf.write(project_file, "project.aas")
 
+                    # 分块格式的项目还需要添加数据块
+                    from core.project_store import CHUNK_DIR_NAME
+                    chunk_dir = temp_path / CHUNK_DIR_NAME
+                    if chunk_dir.exists():
+                        for chunk_file in chunk_dir.rglob("*.json"):
+                            zipf.write(chunk_file, f"{CHUNK_DIR_NAME}/{chunk_file.relative_to(chunk_dir).as_posix()}")
+
                     # 添加缩略图（如果存在）
                     thumbnail_path = project_file.parent / f"{project_file.stem}_thumbnail.png"
                     if thumbnail_path.exists():
@@ -18931,69 +18943,67 @@ class MainWindow(QMainWindow):
             batch_formats = options.get("batch_formats", ["MP4"])
             batch_resolutions = options.get("batch_resolutions", ["1920x1080"])
 
-            total_exports = len(batch_formats) * len(batch_resolutions)
-            current_export = 0
-
-            # 更新进度条
-            if hasattr(dialog, 'progress_bar'):
-                dialog.progress_bar.setMaximum(total_exports)
-                dialog.progress_bar.setValue(0)
+            # 每个 格式 × 分辨率 组合是一路输出；所有输出共享一次分片并行渲染
+            from core.sharded_exporter import ExportVariant, group_variants_by_aspect, render_size
 
+            variants = []
             for format_name in batch_formats:
                 for resolution in batch_resolutions:
-                    current_export += 1
-
                     # 解析分辨率
                     width, height = map(int, resolution.split('x'))
 
                     # 构建文件名
                     format_ext = self._get_format_extension(format_name)
                     filename = f"{base_filename}_{resolution}.{format_ext}"
-                    file_path = output_dir / filename
-
-                    # 更新选项
-                    current_options = options.copy()
-                    current_options.update({
-                        "width": width,
-                        "height": height,
-                        "format": format_name,
-                        "filename": filename
-                    })
+                    variants.append(ExportVariant(str(output_dir / filename), width, height, format_ext))
 
-                    # 增强HTML
-                    enhanced_html = self._enhance_html_for_video(solution, current_options)
-
-                    # 进度回调
-                    def on_progress(message, current=current_export, total=total_exports):
-                        progress_msg = f"[{current}/{total}] {message}"
-                        self.status_bar.showMessage(progress_msg, 0)
-                        if hasattr(dialog, 'progress_text'):
-                            dialog.progress_text.append(progress_msg)
-                        logger.info(f"批量导出进度: {progress_msg}")
-
-                    # 导出单个视频
-                    success = self.video_exporter.export_video(
-                        enhanced_html,
-                        str(file_path),
-                        current_options.get("duration", 10.0),
-                        current_options.get("fps", 30),
-                        width, height,
-                        progress_callback=on_progress,
-                        export_options=current_options
-                    )
+            total_exports = len(variants)
+            if not total_exports:
+                return False
 
-                    if not success:
-                        logger.error(f"批量导出失败: {filename}")
-                        continue
+            # 每种宽高比以组内最大分辨率渲染HTML，同组其余分辨率由FFmpeg缩放
+            render_html = {}
+            for group in group_variants_by_aspect(variants):
+                width, height = render_size(group)
+                render_options = options.copy()
+                render_options.update({"width": width, "height": height})
+                render_html[(width, height)] = self._enhance_html_for_video(solution, render_options)
+            enhanced_html = next(iter(render_html.values()))
 
-                    # 更新进度条
-                    if hasattr(dialog, 'progress_bar'):
-                        dialog.progress_bar.setValue(current_export)
+            # 更新进度条
+            if hasattr(dialog, 'progress_bar'):
+                dialog.progress_bar.setMaximum(100)
+                dialog.progress_bar.setValue(0)
 
-            self.status_bar.showMessage("批量导出完成", 3000)
-            QMessageBox.information(self, "批量导出完成", f"已导出 {total_exports} 个视频文件到:\n{output_dir}")
+            def on_progress(message):
+                self.status_bar.showMessage(f"批量导出: {message}", 0)
+                if hasattr(dialog, 'progress_text'):
+                    dialog.progress_text.append(message)
+                logger.info(f"批量导出进度: {message}")
 
-            return True
+            def on_percent(percent):
+                if hasattr(dialog, 'progress_bar'):
+                    dialog.progress_bar.setValue(percent)
+
+            def on_complete(success, message):
+                if success:
+                    self.status_bar.showMessage("批量导出完成", 3000)
+                    QMessageBox.information(self, "批量导出完成", f"已导出 {total_exports} 个视频文件到:\n{output_dir}")
+                else:
+                    self.status_bar.showMessage("批量导出失败", 3000)
+                    QMessageBox.critical(self, "批量导出失败", message)
+
+            output_dir.mkdir(parents=True, exist_ok=True)
+            return self.video_exporter.export_video_sharded(
+                enhanced_html,
+                variants,
+                options.get("duration", 10.0),
+                options.get("fps", 30),
+                progress_callback=on_progress,
+                complete_callback=on_complete,
+                percent_callback=on_percent,
+                render_html=render_html
+            )
 
         except Exception as e:
             logger.error(f"批量视频导出失败: {e}")
@@ -19438,6 +19448,11 @@ class MainWindow(QMainWindow):
         """元素更新处理"""
         logger.info(f"元素已更新: {element.name}")
 
+        # 属性面板原地修改元素，标记为已修改以便增量保存
+        project = self.project_manager.current_project
+        if project and element.element_id in project.elements:
+            project.mark_dirty("elements", element.element_id)
+
         # 更新元素管理器显示
         if hasattr(self.elements_widget, 'update_element'):
             self.elements_widget.update_element(element)
@@ -19530,6 +19545,10 @@ class MainWindow(QMainWindow):
                 event.ignore()
                 return
         
+        # 写入延迟保存的缓存索引
+        from core.project_cache import project_cache
+        project_cache.close()
+        
         event.accept()
 
     # ==================== 撤销重做系统 ====================
@@ -21143,16 +21162,15 @@ class MainWindow(QMainWindow):
     def create_element_preview(self, element_id: str) -> Optional[QPixmap]:
         """创建元素预览图"""
         try:
-            # 这里需要根据元素类型创建预览图
-            # 简化实现，返回一个默认图标
-            pixmap = QPixmap(64, 64)
-            pixmap.fill(Qt.GlobalColor.lightGray)
+            from core.scene_rasterizer import SceneRasterizer
 
-            painter.setFont(QFont("Arial", 10))
-            painter.drawText(pixmap.rect(), Qt.AlignmentFlag.AlignCenter, "元素")
-            painter.end()
+            project = self.project_manager.current_project
+            element = project.elements.get(element_id) if project else None
+            if element is None:
+                return None
 
-            return pixmap
+            image = SceneRasterizer().render_element(element, 64)
+            return QPixmap.fromImage(image) if image is not None else None
 
         except Exception as e:
             logger.error(f"创建元素预览图失败: {e}")
@@ -28,6 +28,7 @@ from PyQt6.QtCore import pyqtSignal
 
 from core.logger import get_logger
 from core.data_structures import TimeSegment, AnimationType
+from core.interval_index import IntervalIndex
 
 logger = get_logger("narration_driven_system")
 
@@ -330,18 +331,11 @@ class TimeSegmentOverlapDetector:
         overlaps = []
         
         try:
-            # 按开始时间排序
-            sorted_segments = sorted(segments, key=lambda s: s.start_time)
-            
-            for i in range(len(sorted_segments)):
-                for j in range(i + 1, len(sorted_segments)):
-                    segment1 = sorted_segments[i]
-                    segment2 = sorted_segments[j]
-                    
-                    # 检查重叠
-                    overlap_duration = self.calculate_overlap(segment1, segment2)
-                    if overlap_duration > self.tolerance:
-                        overlaps.append((segment1.segment_id, segment2.segment_id, overlap_duration))
+            # 扫描线只产出实际相交的时间段对，再按容差过滤
+            for segment1, segment2, _ in IntervalIndex(segments).overlapping_pairs():
+                overlap_duration = self.calculate_overlap(segment1, segment2)
+                if overlap_duration > self.tolerance:
+                    overlaps.append((segment1.segment_id, segment2.segment_id, overlap_duration))
             
             return overlaps
             
@@ -5,8 +5,10 @@ AI Animation Studio - 动画预览组件
 
 import os
 import tempfile
+import time
 from pathlib import Path
 from datetime import datetime
+from typing import Optional
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QLabel, QPushButton,
     QSlider, QDoubleSpinBox, QPlainTextEdit, QTabWidget, QMessageBox,
@@ -15,15 +17,169 @@ from PyQt6.QtWidgets import (
     QScrollArea, QFrame, QToolButton, QMenu, QDialog, QDialogButtonBox,
     QTableWidget, QTableWidgetItem, QLineEdit, QTextEdit
 )
-from PyQt6.QtCore import Qt, QTimer, QUrl, pyqtSignal, QThread, QPropertyAnimation, QEasingCurve
+from PyQt6.QtCore import (
+    Qt, QTimer, QUrl, pyqtSignal, pyqtSlot, QObject, QThread, QPropertyAnimation, QEasingCurve
+)
 from PyQt6.QtWebEngineWidgets import QWebEngineView
 from PyQt6.QtWebEngineCore import QWebEngineSettings, QWebEngineProfile
 from PyQt6.QtGui import QFont, QColor, QPixmap, QPainter, QAction
 
+try:
+    from PyQt6.QtWebChannel import QWebChannel
+    WEB_CHANNEL_AVAILABLE = True
+except ImportError:
+    WEB_CHANNEL_AVAILABLE = False
+
 from core.logger import get_logger
 
 logger = get_logger("preview_widget")
 
+# 页面向Python回报播放位置的最小间隔（毫秒）；没有QWebChannel时按此间隔轮询
+POSITION_REPORT_INTERVAL_MS = 250
+
+# 播放引擎注入失败时，由Python定时器逐帧调用 renderAtTime 的间隔（毫秒）
+FALLBACK_FRAME_INTERVAL_MS = 33
+
+# 页面内的播放引擎：requestAnimationFrame 按显示器刷新率推进时间并调用 renderAtTime，
+# 只按 POSITION_REPORT_INTERVAL_MS 节流后通过 QWebChannel 回报位置和渲染帧数
+PLAYBACK_ENGINE_SCRIPT = """
+(function() {
+    if (window.__aasPlayback) {
+        return true;
+    }
+
+    const engine = {
+        playing: false,
+        time: 0,
+        duration: 10,
+        speed: 1,
+        loop: false,
+        reportInterval: 250,
+        lastTimestamp: null,
+        lastReport: 0,
+        frames: 0,
+        bridge: null,
+
+        render: function(t) {
+            if (typeof window.renderAtTime === 'function') {
+                window.renderAtTime(t);
+            }
+        },
+
+        tick: function(timestamp) {
+            if (!engine.playing) {
+                return;
+            }
+            if (engine.lastTimestamp !== null) {
+                engine.time += (timestamp - engine.lastTimestamp) / 1000 * engine.speed;
+            }
+            engine.lastTimestamp = timestamp;
+
+            let finished = false;
+            if (engine.time >= engine.duration) {
+                if (engine.loop && engine.duration > 0) {
+                    engine.time -= Math.floor(engine.time / engine.duration) * engine.duration;
+                } else {
+                    engine.time = engine.duration;
+                    finished = true;
+                }
+            }
+
+            try {
+                engine.render(engine.time);
+            } catch (error) {
+                console.error('renderAtTime failed:', error);
+            }
+            engine.frames += 1;
+
+            if (finished) {
+                engine.playing = false;
+                engine.report(timestamp);
+                if (engine.bridge) {
+                    engine.bridge.playbackFinished(engine.time);
+                }
+                return;
+            }
+            if (timestamp - engine.lastReport >= engine.reportInterval) {
+                engine.report(timestamp);
+            }
+            requestAnimationFrame(engine.tick);
+        },
+
+        report: function(timestamp) {
+            engine.lastReport = timestamp;
+            if (engine.bridge) {
+                engine.bridge.playbackPosition(engine.time, engine.frames);
+                engine.frames = 0;
+            }
+        },
+
+        play: function(time, duration, speed, loop, reportInterval) {
+            engine.time = time;
+            engine.duration = duration;
+            engine.speed = speed;
+            engine.loop = loop;
+            engine.reportInterval = reportInterval;
+            if (!engine.playing) {
+                engine.playing = true;
+                engine.lastTimestamp = null;
+                requestAnimationFrame(engine.tick);
+            }
+        },
+
+        pause: function() {
+            engine.playing = false;
+            return engine.time;
+        },
+
+        seek: function(time) {
+            engine.time = time;
+            engine.render(time);
+        },
+
+        // 没有QWebChannel时由Python轮询
+        state: function() {
+            const frames = engine.frames;
+            engine.frames = 0;
+            return {time: engine.time, playing: engine.playing, frames: frames};
+        }
+    };
+    window.__aasPlayback = engine;
+
+    if (typeof qt !== 'undefined' && qt.webChannelTransport) {
+        const connect = function() {
+            new QWebChannel(qt.webChannelTransport, function(channel) {
+                engine.bridge = channel.objects.previewBridge;
+            });
+        };
+        if (typeof QWebChannel === 'function') {
+            connect();
+        } else {
+            const script = document.createElement('script');
+            script.src = 'qrc:///qtwebchannel/qwebchannel.js';
+            script.onload = connect;
+            document.head.appendChild(script);
+        }
+    }
+    return true;
+})();
+"""
+
+
+class PlaybackBridge(QObject):
+    """页面播放引擎回报位置的QWebChannel对象"""
+
+    position_changed = pyqtSignal(float, int)  # 时间, 自上次回报以来渲染的帧数
+    finished = pyqtSignal(float)
+
+    @pyqtSlot(float, int)
+    def playbackPosition(self, time: float, frames: int):
+        self.position_changed.emit(time, frames)
+
+    @pyqtSlot(float)
+    def playbackFinished(self, time: float):
+        self.finished.emit(time)
+
 class AnimationPreviewController(QWidget):
     """动画预览控制器 - 基于参考代码"""
     
@@ -36,14 +192,21 @@ class AnimationPreviewController(QWidget):
         self.current_time = 0.0
         self.page_ready = False  # 页面就绪状态
         self.is_playing = False
-        
+        self.playback_speed = 1.0
+        self.playback_engine_ready = False  # 页面内播放引擎已注入
+        self._timer_playback = False  # 本次播放由定时器驱动（播放引擎不可用）
+        self._seek_generation = 0  # 每次跳转递增，丢弃跳转前发出的位置回报
+        self._last_position_report = 0.0
+
         self.setup_ui()
         self.setup_web_engine()
-        
-        # 播放定时器
+        self.setup_playback_bridge()
+
+        # 播放由页面内的 requestAnimationFrame 驱动；此定时器只在收不到QWebChannel回报时轮询位置，
+        # 播放引擎不可用时改为逐帧推进时间
         self.play_timer = QTimer()
         self.play_timer.timeout.connect(self.advance_time)
-        self.play_timer.setInterval(50)  # 20fps预览
+        self.play_timer.setInterval(POSITION_REPORT_INTERVAL_MS)
 
         # 性能监控
         self.fps_counter = 0
@@ -75,6 +238,19 @@ class AnimationPreviewController(QWidget):
 
         logger.info("✅ WebEngine配置完成：启用WebGL、Canvas2D、JavaScript")
 
+    def setup_playback_bridge(self):
+        """注册页面播放引擎回报位置用的QWebChannel对象"""
+        self.playback_bridge = PlaybackBridge(self)
+        self.playback_bridge.position_changed.connect(self.on_playback_position)
+        self.playback_bridge.finished.connect(self.on_playback_finished)
+
+        if WEB_CHANNEL_AVAILABLE:
+            self.web_channel = QWebChannel(self)
+            self.web_channel.registerObject("previewBridge", self.playback_bridge)
+            self.web_view.page().setWebChannel(self.web_channel)
+        else:
+            logger.warning("QtWebChannel不可用，播放位置改为定时轮询")
+
     def setup_ui(self):
         """设置用户界面"""
         layout = QVBoxLayout(self)
@@ -229,6 +405,7 @@ class AnimationPreviewController(QWidget):
         """加载HTML文件"""
         self.html_file = html_file
         self.page_ready = False
+        self.playback_engine_ready = False
 
         if html_file and os.path.exists(html_file):
             # 断开之前的连接
@@ -318,6 +495,7 @@ class AnimationPreviewController(QWidget):
                     self.page_ready = True
                     self.status_label.setText("✅ 页面就绪")
                     self.debug_log("✅ renderAtTime函数已就绪")
+                    self.install_playback_engine()
 
                     # 初始渲染
                     QTimer.singleShot(100, lambda: self.reset_animation())
@@ -331,6 +509,17 @@ class AnimationPreviewController(QWidget):
         # 延迟检查，给库一些加载时间
         QTimer.singleShot(1000, lambda: self.web_view.page().runJavaScript(check_script, check_result))
 
+    def install_playback_engine(self):
+        """向页面注入播放引擎"""
+        def engine_installed(result):
+            self.playback_engine_ready = bool(result)
+            if self.playback_engine_ready:
+                self.debug_log("✅ 播放引擎已注入")
+            else:
+                self.debug_log("⚠️ 播放引擎注入失败")
+
+        self.web_view.page().runJavaScript(PLAYBACK_ENGINE_SCRIPT, engine_installed)
+
     def test_render_function(self):
         """测试渲染函数"""
         if not self.page_ready:
@@ -380,6 +569,13 @@ class AnimationPreviewController(QWidget):
         if not self.page_ready or not self.html_file:
             return
 
+        self._seek_generation += 1
+        if self.playback_engine_ready:
+            # 播放中跳转时，播放引擎从新位置继续
+            self.web_view.page().runJavaScript(f"window.__aasPlayback.seek({t});")
+            self.time_changed.emit(t)
+            return
+
         js_code = f"""
         (function() {{
             try {{
@@ -423,6 +619,21 @@ class AnimationPreviewController(QWidget):
             return
 
         self.is_playing = True
+        if self.current_time >= self.duration:
+            self.current_time = 0.0
+
+        self._timer_playback = not self.playback_engine_ready
+        if self._timer_playback:
+            self.play_timer.setInterval(FALLBACK_FRAME_INTERVAL_MS)
+            self.debug_log("⚠️ 播放引擎不可用，改用定时器逐帧渲染")
+        else:
+            loop = 'true' if getattr(self, 'loop_enabled', False) else 'false'
+            self.web_view.page().runJavaScript(
+                f"window.__aasPlayback && window.__aasPlayback.play({self.current_time}, {self.duration}, "
+                f"{self.playback_speed}, {loop}, {POSITION_REPORT_INTERVAL_MS});"
+            )
+            self.play_timer.setInterval(POSITION_REPORT_INTERVAL_MS)
+        self._last_position_report = time.monotonic()
         self.play_timer.start()
 
         # 更新按钮状态
@@ -437,9 +648,23 @@ class AnimationPreviewController(QWidget):
 
     def pause_animation(self):
         """暂停动画 - 统一实现"""
+        was_playing = self.is_playing
         self.is_playing = False
         self.play_timer.stop()
 
+        # 无论界面状态如何都暂停页面内的播放引擎（例如停止时 is_playing 已先被清除）
+        if self.playback_engine_ready:
+            generation = self._seek_generation
+
+            def sync_position(t):
+                # 暂停后的准确位置；期间发生过跳转则以跳转为准
+                if was_playing and isinstance(t, (int, float)) and generation == self._seek_generation:
+                    self.set_position(t)
+
+            self.web_view.page().runJavaScript(
+                "window.__aasPlayback ? window.__aasPlayback.pause() : null;", sync_position
+            )
+
         # 更新按钮状态
         if hasattr(self, 'play_btn'):
             self.play_btn.setText("▶ 播放")
@@ -488,7 +713,8 @@ class AnimationPreviewController(QWidget):
         self.pause_btn.setEnabled(False)
 
         self.time_slider.setValue(0)
-        self.time_spinbox.setValue(0.0)
+        if hasattr(self, 'time_spinbox'):
+            self.time_spinbox.setValue(0.0)
 
         # 重置到起始状态
         self.reset_animation()
@@ -496,40 +722,87 @@ class AnimationPreviewController(QWidget):
         self.debug_log("⏹️ 停止动画播放")
 
     def advance_time(self):
-        """推进时间（包含性能监控）"""
+        """轮询页面播放位置（QWebChannel没有按时回报时）"""
         try:
             if not self.is_playing:
                 return
 
-            # 计算帧数（性能监控）
-            if hasattr(self, 'count_frame'):
-                self.count_frame()
-
-            # 每次推进0.05秒（20fps）
-            self.current_time += 0.05
+            if self._timer_playback:
+                self.advance_fallback_time()
+                return
 
-            # 检查是否到达结尾
-            if self.current_time >= self.duration:
-                if hasattr(self, 'loop_enabled') and self.loop_enabled:
-                    self.current_time = 0  # 循环播放
-                else:
-                    self.current_time = self.duration
-                    self.stop_animation()
-                    return
+            if time.monotonic() - self._last_position_report < POSITION_REPORT_INTERVAL_MS * 2 / 1000:
+                return
 
-            # 更新界面
-            self.time_slider.setValue(int((self.current_time / self.duration) * 1000))
-            self.time_spinbox.setValue(self.current_time)
+            generation = self._seek_generation
 
-            # 渲染当前帧
-            self.render_at_time(self.current_time)
+            def poll_result(state):
+                if not state or not self.is_playing or generation != self._seek_generation:
+                    return
+                self.on_playback_position(state.get('time', self.current_time), int(state.get('frames', 0)))
+                if not state.get('playing', False):
+                    self.on_playback_finished(self.current_time)
 
-            # 发射时间改变信号
-            self.time_changed.emit(self.current_time)
+            self.web_view.page().runJavaScript(
+                "window.__aasPlayback ? window.__aasPlayback.state() : null;", poll_result
+            )
 
         except Exception as e:
             logger.error(f"推进时间失败: {e}")
 
+    def advance_fallback_time(self):
+        """定时器驱动播放：按实际经过的时间推进并渲染当前帧"""
+        now = time.monotonic()
+        t = self.current_time + (now - self._last_position_report) * self.playback_speed
+        self._last_position_report = now
+
+        if t >= self.duration:
+            if not getattr(self, 'loop_enabled', False) or self.duration <= 0:
+                self.on_playback_finished(self.duration)
+                return
+            t %= self.duration
+
+        self.fps_counter += 1
+        self.set_position(t, notify=False)
+        self.render_at_time(t)
+
+    def set_position(self, t: float, notify: bool = True):
+        """同步播放位置到界面（不触发重新渲染）"""
+        self.current_time = t
+        if self.duration > 0:
+            self.time_slider.blockSignals(True)
+            self.time_slider.setValue(int((t / self.duration) * 1000))
+            self.time_slider.blockSignals(False)
+        self.update_time_display()
+        if notify:
+            self.time_changed.emit(t)
+
+    def on_playback_position(self, t: float, frames: int):
+        """页面播放引擎回报的位置"""
+        if not self.is_playing:
+            return
+
+        self._last_position_report = time.monotonic()
+        self.fps_counter += frames
+        self.set_position(t)
+
+    def on_playback_finished(self, t: float):
+        """页面播放到结尾"""
+        if not self.is_playing:
+            return
+
+        self.set_position(t)
+        self.is_playing = False  # 页面已停止，无需再暂停
+        self.stop_animation()
+
+    def set_playback_speed(self, speed: float):
+        """设置播放速度"""
+        self.playback_speed = speed
+        if self.is_playing:
+            self.web_view.page().runJavaScript(
+                f"window.__aasPlayback && (window.__aasPlayback.speed = {speed});"
+            )
+
     def debug_log(self, message: str):
         """添加调试日志"""
         timestamp = datetime.now().strftime("%H:%M:%S")
@@ -561,12 +834,26 @@ class PreviewWidget(QWidget):
         from ui.enhanced_code_viewer import EnhancedCodeViewer
         self.code_viewer = EnhancedCodeViewer()
         self.code_viewer.load_content("<!-- HTML代码将在这里显示 -->")
+        self.code_viewer.stream_preview_ready.connect(self.preview_controller.load_html_content)
         self.tabs.addTab(self.code_viewer, "📄 代码查看")
     
     def load_html_content(self, html_content: str):
         """加载HTML内容"""
         self.preview_controller.load_html_content(html_content)
         self.code_viewer.load_content(html_content)
+
+    def begin_html_stream(self):
+        """开始流式接收AI生成的HTML"""
+        self.code_viewer.begin_stream()
+
+    def append_html_chunk(self, chunk: str):
+        """追加流式HTML片段；到达 </style>、</script> 等边界时自动刷新预览"""
+        self.code_viewer.append_stream_chunk(chunk)
+
+    def finish_html_stream(self, html_content: Optional[str] = None):
+        """结束流式接收，并以完整内容刷新预览"""
+        self.code_viewer.end_stream(html_content)
+        self.preview_controller.load_html_content(self.code_viewer.get_content())
     
     def load_html_file(self, file_path: str):
         """加载HTML文件"""
@@ -786,12 +1073,9 @@ class PreviewWidget(QWidget):
             # 解析速度值
             speed_value = float(speed_text.replace('x', ''))
 
-            # 更新播放速度
-            if hasattr(self.preview_controller, 'play_timer'):
-                # 调整定时器间隔
-                base_interval = 50  # 基础间隔50ms (20fps)
-                new_interval = int(base_interval / speed_value)
-                self.preview_controller.play_timer.setInterval(new_interval)
+            # 更新播放速度（帧率由页面的 requestAnimationFrame 决定，只调整时间流速）
+            if hasattr(self.preview_controller, 'set_playback_speed'):
+                self.preview_controller.set_playback_speed(speed_value)
 
             logger.info(f"播放速度已设置为: {speed_text}")
 
@@ -10,12 +10,13 @@ from PyQt6.QtWidgets import (
     QMenu, QSlider, QCheckBox, QSpinBox, QProgressBar
 )
 from PyQt6.QtCore import Qt, pyqtSignal, QTimer, QThread, pyqtSlot, QSize
-from PyQt6.QtGui import QPixmap, QIcon, QFont, QPainter, QColor, QAction
+from PyQt6.QtGui import QPixmap, QIcon, QFont, QPainter, QColor, QAction, QImage
 from pathlib import Path
 from typing import List, Optional, Dict, Any
 import logging
 
 from core.asset_management import AssetManager, EnhancedAsset, AssetSearchFilter, AssetType, AssetStatus
+from core.thumbnail_service import ThumbnailService
 from ui.asset_drag_system import DraggableAssetWidget, AssetDragHandler
 
 logger = logging.getLogger(__name__)
@@ -27,14 +28,21 @@ class AssetThumbnailWidget(QFrame):
     double_clicked = pyqtSignal(str)  # asset_id
     context_menu_requested = pyqtSignal(str, object)  # asset_id, position
     
-    def __init__(self, asset: EnhancedAsset, size: int = 128):
+    def __init__(self, asset: EnhancedAsset, size: int = 128,
+                 thumbnail_service: Optional[ThumbnailService] = None):
         super().__init__()
         self.asset = asset
         self.thumbnail_size = size
+        self.thumbnail_service = thumbnail_service
+        self.thumbnail_loaded = False
         self.selected = False
         
         self.setup_ui()
-        self.load_thumbnail()
+        if thumbnail_service:
+            # 由网格视图在组件进入可见区域时加载
+            self.set_default_icon()
+        else:
+            self.load_thumbnail()
     
     def setup_ui(self):
         """设置UI"""
@@ -92,6 +100,15 @@ class AssetThumbnailWidget(QFrame):
     def load_thumbnail(self):
         """加载缩略图"""
         try:
+            if self.thumbnail_service:
+                image = self.thumbnail_service.request(self.asset, self.thumbnail_size)
+                if image is not None:
+                    self.set_thumbnail_image(image)
+                    return
+                # 后台生成完成后通过 thumbnail_ready 再次加载
+                self.set_default_icon()
+                return
+
             thumbnail_path = self.asset.thumbnail.medium_path
             if thumbnail_path and Path(thumbnail_path).exists():
                 pixmap = QPixmap(thumbnail_path)
@@ -103,6 +120,7 @@ class AssetThumbnailWidget(QFrame):
                         Qt.TransformationMode.SmoothTransformation
                     )
                     self.thumbnail_label.setPixmap(scaled_pixmap)
+                    self.thumbnail_loaded = True
                     return
             
             # 使用默认图标
@@ -112,6 +130,18 @@ class AssetThumbnailWidget(QFrame):
             logger.error(f"加载缩略图失败: {e}")
             self.set_default_icon()
     
+    def set_thumbnail_image(self, image: QImage):
+        """显示缩略图服务返回的图像"""
+        pixmap = QPixmap.fromImage(image)
+        if pixmap.width() != self.thumbnail_size:
+            pixmap = pixmap.scaled(
+                self.thumbnail_size, self.thumbnail_size,
+                Qt.AspectRatioMode.KeepAspectRatio,
+                Qt.TransformationMode.SmoothTransformation
+            )
+        self.thumbnail_label.setPixmap(pixmap)
+        self.thumbnail_loaded = True
+
     def set_default_icon(self):
         """设置默认图标"""
         # 创建简单的默认图标
@@ -207,14 +237,26 @@ class AssetGridView(QScrollArea, DraggableAssetWidget):
     asset_double_clicked = pyqtSignal(str)  # asset_id
     assets_selection_changed = pyqtSignal(list)  # selected asset_ids
     
-    def __init__(self):
+    def __init__(self, thumbnail_service: Optional[ThumbnailService] = None):
         QScrollArea.__init__(self)
         DraggableAssetWidget.__init__(self)
         self.asset_widgets: Dict[str, AssetThumbnailWidget] = {}
         self.selected_asset_ids: List[str] = []
         self.thumbnail_size = 128
+        self.thumbnail_service = thumbnail_service
+
+        # 滚动停顿后再加载可见区域的缩略图
+        self._visible_timer = QTimer(self)
+        self._visible_timer.setSingleShot(True)
+        self._visible_timer.setInterval(50)
+        self._visible_timer.timeout.connect(self.request_visible_thumbnails)
 
         self.setup_ui()
+
+        if thumbnail_service:
+            thumbnail_service.thumbnail_ready.connect(self.on_thumbnail_ready)
+            self.verticalScrollBar().valueChanged.connect(self._visible_timer.start)
+            self.horizontalScrollBar().valueChanged.connect(self._visible_timer.start)
     
     def setup_ui(self):
         """设置UI"""
@@ -239,7 +281,7 @@ class AssetGridView(QScrollArea, DraggableAssetWidget):
         columns = max(1, (self.width() - 40) // (self.thumbnail_size + 30))
         
         for i, asset in enumerate(assets):
-            widget = AssetThumbnailWidget(asset, self.thumbnail_size)
+            widget = AssetThumbnailWidget(asset, self.thumbnail_size, self.thumbnail_service)
             widget.clicked.connect(self.on_asset_clicked)
             widget.double_clicked.connect(self.on_asset_double_clicked)
             widget.context_menu_requested.connect(self.on_context_menu_requested)
@@ -249,6 +291,9 @@ class AssetGridView(QScrollArea, DraggableAssetWidget):
             self.grid_layout.addWidget(widget, row, col)
             
             self.asset_widgets[asset.asset_id] = widget
+
+        if self.thumbnail_service:
+            self._visible_timer.start()
     
     def clear_assets(self):
         """清除所有素材"""
@@ -270,6 +315,38 @@ class AssetGridView(QScrollArea, DraggableAssetWidget):
             widget.thumbnail_size = size
             widget.setFixedSize(size + 20, size + 60)
             widget.thumbnail_label.setFixedSize(size, size)
+            if self.thumbnail_service:
+                widget.thumbnail_loaded = False
+            else:
+                widget.load_thumbnail()
+
+        if self.thumbnail_service:
+            self._visible_timer.start()
+
+    def request_visible_thumbnails(self):
+        """只为可见区域内的组件加载缩略图，并取消已滚出视野的生成任务"""
+        if not self.thumbnail_service:
+            return
+
+        viewport = self.viewport().rect().translated(
+            self.horizontalScrollBar().value(), self.verticalScrollBar().value())
+        # 预加载上下各一屏
+        viewport.adjust(0, -viewport.height(), 0, viewport.height())
+
+        visible_ids = []
+        for asset_id, widget in self.asset_widgets.items():
+            if not widget.geometry().intersects(viewport):
+                continue
+            visible_ids.append(asset_id)
+            if not widget.thumbnail_loaded:
+                widget.load_thumbnail()
+
+        self.thumbnail_service.cancel_pending(visible_ids)
+
+    def on_thumbnail_ready(self, asset_id: str, size: int):
+        """后台缩略图生成完成"""
+        widget = self.asset_widgets.get(asset_id)
+        if widget and not widget.thumbnail_loaded:
             widget.load_thumbnail()
     
     def on_asset_clicked(self, asset_id: str):
@@ -311,7 +388,8 @@ class AssetGridView(QScrollArea, DraggableAssetWidget):
         # 重新计算网格布局
         if self.asset_widgets:
             # 这里可以重新排列网格
-            pass
+            if self.thumbnail_service:
+                self._visible_timer.start()
 
 
 class ProfessionalAssetPanel(QWidget):
@@ -327,6 +405,7 @@ class ProfessionalAssetPanel(QWidget):
         self.asset_manager = asset_manager
         self.current_filter = AssetSearchFilter()
         self.current_assets: List[EnhancedAsset] = []
+        self.thumbnail_service = ThumbnailService(asset_manager)
 
         self.setup_ui()
         self.connect_signals()
@@ -454,7 +533,7 @@ class ProfessionalAssetPanel(QWidget):
         layout.setContentsMargins(0, 0, 0, 0)
 
         # 网格视图
-        self.grid_view = AssetGridView()
+        self.grid_view = AssetGridView(self.thumbnail_service)
         layout.addWidget(self.grid_view)
 
         # 列表视图（暂时隐藏）
@@ -594,4 +673,5 @@ class ProfessionalAssetPanel(QWidget):
 
     def remove_asset(self, asset_id: str):
         """移除素材"""
+        self.thumbnail_service.invalidate(asset_id)
         self.refresh_assets()
@@ -10,14 +10,15 @@ from PyQt6.QtWidgets import (
     QToolButton, QButtonGroup, QSplitter, QMenu, QToolBar,
     QStatusBar, QProgressBar, QLineEdit, QDoubleSpinBox
 )
-from PyQt6.QtCore import Qt, pyqtSignal, QRect, QPoint, QTimer, QPropertyAnimation
+from PyQt6.QtCore import Qt, pyqtSignal, QRect, QRectF, QPoint, QTimer, QPropertyAnimation
 from PyQt6.QtGui import (
-    QPainter, QPen, QBrush, QColor, QFont, QPixmap, QCursor,
+    QPainter, QPen, QBrush, QColor, QFont, QPixmap, QCursor, QRegion,
     QMouseEvent, QWheelEvent, QKeyEvent, QPainterPath, QLinearGradient, QAction
 )
 
 from core.data_structures import Element, Point
 from core.logger import get_logger
+from core.spatial_index import SpatialIndex
 
 logger = get_logger("stage_widget")
 
@@ -76,6 +77,7 @@ class StageCanvas(QWidget):
 
         # 元素管理
         self.elements = {}
+        self.spatial_index = SpatialIndex()  # 元素边界索引（画布坐标）
         self.selected_element = None
         self.selected_elements = set()  # 多选支持
 
@@ -96,6 +98,13 @@ class StageCanvas(QWidget):
         self.canvas_border_color = QColor("#333333")
         self.canvas_border_width = 2
 
+        # 图层缓存：静态层（标尺、背景、网格、参考线）和元素层（未选中的元素）
+        self._static_layer = None
+        self._static_layer_key = None
+        self._element_layer = None
+        self._element_layer_key = None
+        self._scene_version = 0  # 元素增删改时递增
+
         # 设置样式
         self.setStyleSheet("background-color: #f0f0f0;")
         self.setMouseTracking(True)  # 启用鼠标跟踪
@@ -332,6 +341,7 @@ class StageCanvas(QWidget):
 
             # 添加元素
             self.elements[element.element_id] = element
+            self.update_element_bounds(element.element_id)
             self.update()
 
             logger.info(f"成功添加元素: {element.element_id}")
@@ -354,6 +364,8 @@ class StageCanvas(QWidget):
 
             # 移除元素
             del self.elements[element_id]
+            self.spatial_index.remove(element_id)
+            self.invalidate_elements()
 
             # 如果移除的是当前选中的元素，清除选择
             if self.selected_element == element_id:
@@ -368,16 +380,56 @@ class StageCanvas(QWidget):
             logger.error(f"移除元素失败: {e}")
             return False
     
+    def update_element_bounds(self, element_id: str):
+        """同步元素在空间索引中的边界（元素位置、尺寸或可见性被原地修改后调用）"""
+        element = self.elements.get(element_id)
+        bounds = self.get_element_bounds_safely(element) if element else None
+        if bounds:
+            self.spatial_index.insert(element_id, bounds['x'], bounds['y'],
+                                      bounds['width'], bounds['height'])
+        else:
+            self.spatial_index.remove(element_id)
+        self.invalidate_elements(element_id)
+
+    def move_element(self, element_id: str, x: float, y: float):
+        """移动元素到画布坐标 (x, y)"""
+        try:
+            element = self.elements.get(element_id)
+            if not element or not hasattr(element, 'position'):
+                return
+
+            # 只重绘移动前后元素所在的区域
+            dirty = self.element_dirty_region(element_id)
+            element.position.x = x
+            element.position.y = y
+            self.update_element_bounds(element_id)
+            self.update(dirty.united(self.element_dirty_region(element_id)))
+
+        except Exception as e:
+            logger.error(f"移动元素失败: {e}")
+
     def select_element(self, element_id: str):
         """选择元素 - 使用安全方法"""
         self.select_element_safely(element_id)
-    
-    def paintEvent(self, event):
-        """绘制舞台"""
-        painter = QPainter(self)
-        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
 
-        # 计算画布在widget中的位置和大小
+    def visible_element_ids(self, canvas_rect: QRect, paint_rect: QRect) -> List[str]:
+        """与重绘区域相交的元素，按绘制顺序排列"""
+        margin = 100  # 与 is_position_visible 一致，允许一定的边界外绘制
+        visible = canvas_rect.adjusted(-margin, -margin, margin, margin).intersected(paint_rect)
+        if visible.isEmpty():
+            return []
+
+        # 元素按固定像素尺寸绘制，左上方再留出一个边距
+        scale = self.scale_factor
+        return self.spatial_index.query_rect(
+            (visible.left() - canvas_rect.left() - margin) / scale,
+            (visible.top() - canvas_rect.top() - margin) / scale,
+            (visible.width() + margin) / scale,
+            (visible.height() + margin) / scale
+        )
+    
+    def get_canvas_rect(self) -> QRect:
+        """画布在组件中的位置和大小"""
         widget_rect = self.rect()
         canvas_w = int(self.canvas_width * self.scale_factor)
         canvas_h = int(self.canvas_height * self.scale_factor)
@@ -391,11 +443,77 @@ class StageCanvas(QWidget):
         available_height = widget_rect.height() - ruler_offset_y
         canvas_x = ruler_offset_x + (available_width - canvas_w) // 2
         canvas_y = ruler_offset_y + (available_height - canvas_h) // 2
-        canvas_rect = QRect(canvas_x, canvas_y, canvas_w, canvas_h)
+        return QRect(canvas_x, canvas_y, canvas_w, canvas_h)
+
+    def paintEvent(self, event):
+        """绘制舞台
+
+        标尺、背景、网格、参考线和未选中的元素分别缓存在静态层和元素层中，只在缩放、设置或场景数据
+        变化时重建；每次重绘只合成脏区域内的缓存，并实时绘制选中元素和选择框。
+        """
+        canvas_rect = self.get_canvas_rect()
+        dirty_rect = event.rect()
+
+        static_layer = self._get_static_layer(canvas_rect)
+        element_layer = self._get_element_layer(canvas_rect)
+
+        painter = QPainter(self)
+        source_rect = self._layer_source_rect(dirty_rect)
+        painter.drawPixmap(QRectF(dirty_rect), static_layer, source_rect)
+        painter.drawPixmap(QRectF(dirty_rect), element_layer, source_rect)
+
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # 绘制选中元素（不在元素层中）
+        selected = self.elements.get(self.selected_element) if self.selected_element else None
+        if selected is not None:
+            self.draw_element(painter, selected, canvas_rect)
+
+        # 绘制选择框
+        if self.selecting and not self.selection_rect.isEmpty():
+            self.draw_selection_rect(painter)
+
+        # 绘制画布信息
+        self.draw_canvas_info(painter, canvas_rect)
+
+    def _new_layer(self) -> QPixmap:
+        """按设备像素比创建透明的图层缓存"""
+        ratio = self.devicePixelRatioF()
+        layer = QPixmap(max(1, round(self.width() * ratio)), max(1, round(self.height() * ratio)))
+        layer.setDevicePixelRatio(ratio)
+        layer.fill(Qt.GlobalColor.transparent)
+        return layer
+
+    def _layer_source_rect(self, rect: QRect) -> QRectF:
+        """组件坐标矩形在图层缓存中的设备像素矩形"""
+        ratio = self.devicePixelRatioF()
+        return QRectF(rect.x() * ratio, rect.y() * ratio, rect.width() * ratio, rect.height() * ratio)
+
+    def _layer_geometry_key(self, canvas_rect: QRect) -> tuple:
+        return (self.width(), self.height(), self.devicePixelRatioF(),
+                canvas_rect.getRect(), self.scale_factor)
+
+    def _get_static_layer(self, canvas_rect: QRect) -> QPixmap:
+        """标尺、画布背景、网格和参考线"""
+        key = self._layer_geometry_key(canvas_rect) + (
+            self.rulers_enabled, self.ruler_size, self.ruler_color.rgba(), self.ruler_text_color.rgba(),
+            self.background_color.rgba(), self.canvas_border_color.rgba(), self.canvas_border_width,
+            self.grid_enabled, self.grid_size, self.grid_color.rgba(), self.grid_style,
+            self.grid_opacity, self.adaptive_grid, self.major_grid_enabled,
+            self.major_grid_interval, self.major_grid_color.rgba(),
+            self.guides_enabled, self.guide_color.rgba(), self.guide_width,
+            tuple(self.horizontal_guides), tuple(self.vertical_guides)
+        )
+        if self._static_layer is not None and self._static_layer_key == key:
+            return self._static_layer
+
+        layer = self._new_layer()
+        painter = QPainter(layer)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
 
         # 绘制标尺
         if self.rulers_enabled:
-            self.draw_rulers(painter, canvas_rect, widget_rect)
+            self.draw_rulers(painter, canvas_rect, self.rect())
 
         # 绘制画布背景
         painter.fillRect(canvas_rect, self.background_color)
@@ -410,17 +528,65 @@ class StageCanvas(QWidget):
         if self.guides_enabled:
             self.draw_guides(painter, canvas_rect)
 
-        # 绘制元素
-        for element_id, element in self.elements.items():
-            self.draw_element(painter, element, canvas_rect)
+        painter.end()
+        self._static_layer = layer
+        self._static_layer_key = key
+        return layer
 
-        # 绘制选择框
-        if self.selecting and not self.selection_rect.isEmpty():
-            self.draw_selection_rect(painter)
+    def _get_element_layer(self, canvas_rect: QRect) -> QPixmap:
+        """除选中元素以外的所有可见元素"""
+        key = self._layer_geometry_key(canvas_rect) + (self._scene_version, self.selected_element)
+        if self._element_layer is not None and self._element_layer_key == key:
+            return self._element_layer
+
+        layer = self._new_layer()
+        painter = QPainter(layer)
+        painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+
+        # 绘制元素（只绘制可见区域内的元素）
+        for element_id in self.visible_element_ids(canvas_rect, self.rect()):
+            element = self.elements.get(element_id)
+            if element is not None and element_id != self.selected_element:
+                self.draw_element(painter, element, canvas_rect)
+
+        painter.end()
+        self._element_layer = layer
+        self._element_layer_key = key
+        return layer
+
+    def invalidate_elements(self, element_id: str = None):
+        """场景数据改变后重建元素层（选中元素不在元素层中，无需重建）"""
+        if element_id is None or element_id != self.selected_element:
+            self._scene_version += 1
+
+    def element_dirty_region(self, element_id: str) -> QRegion:
+        """元素（及其选择框、智能参考线和对齐提示）在组件中占据的区域"""
+        bounds = self.get_element_bounds_safely(self.elements.get(element_id))
+        if not bounds:
+            return QRegion()
+
+        canvas_rect = self.get_canvas_rect()
+        x = canvas_rect.left() + int(bounds['x'] * self.scale_factor)
+        y = canvas_rect.top() + int(bounds['y'] * self.scale_factor)
+        w = max(int(bounds['width']), 10)
+        h = max(int(bounds['height']), 10)
+
+        # 元素按固定像素尺寸绘制，文本最多约20个字符
+        region = QRegion(x - 10, y - 10, max(w, 240) + 20, max(h, 80) + 20)
+
+        if element_id == self.selected_element:
+            # 智能参考线贯穿整个组件
+            for line_x in (x, x + w // 2, x + w):
+                region = region.united(QRect(line_x - 2, 0, 4, self.height()))
+            for line_y in (y, y + h // 2, y + h):
+                region = region.united(QRect(0, line_y - 2, self.width(), 4))
+
+            # 对齐提示信息框
+            info_x = min(x + w + 10, self.width() - 130)
+            region = region.united(QRect(info_x - 2, max(y, 10) - 2, 124, 44))
+
+        return region
 
-        # 绘制画布信息
-        self.draw_canvas_info(painter, canvas_rect)
-    
     def draw_enhanced_grid(self, painter: QPainter, canvas_rect: QRect):
         """绘制增强网格"""
         if not self.grid_enabled:
@@ -891,14 +1057,10 @@ class StageCanvas(QWidget):
             canvas_x = x / self.scale_factor
             canvas_y = y / self.scale_factor
 
-            # 遍历所有元素，查找被点击的元素
-            for element_id, element in self.elements.items():
-                if not self.is_valid_element(element):
-                    continue
-
-                # 获取元素边界
-                bounds = self.get_element_bounds_safely(element)
-                if bounds and self.point_in_bounds(canvas_x, canvas_y, bounds):
+            # 从空间索引中取出包含该点的元素，优先返回最上层的元素
+            for element_id in reversed(self.spatial_index.query_point(canvas_x, canvas_y)):
+                element = self.elements.get(element_id)
+                if element is not None and self.is_valid_element(element):
                     return element_id
 
             return None
@@ -907,6 +1069,23 @@ class StageCanvas(QWidget):
             logger.error(f"查找位置元素失败: {e}")
             return None
 
+    def find_elements_in_rect(self, x: float, y: float, width: float, height: float) -> List[str]:
+        """查找与画布坐标矩形相交的元素（框选）"""
+        try:
+            return [element_id for element_id in self.spatial_index.query_rect(x, y, width, height)
+                    if self.is_valid_element(self.elements.get(element_id))]
+
+        except Exception as e:
+            logger.error(f"查找矩形区域内元素失败: {e}")
+            return []
+
+    def find_elements_near(self, element_id: str, distance: float) -> List[str]:
+        """查找边界与指定元素相距不超过 distance 的其他元素（对齐吸附）"""
+        bounds = self.spatial_index.bounds.get(element_id)
+        if not bounds:
+            return []
+        return self.spatial_index.query_near(*bounds, distance, exclude=element_id)
+
     def is_valid_element(self, element) -> bool:
         """检查元素是否有效"""
         try:
@@ -1837,20 +2016,7 @@ class StageWidget(QWidget):
     def find_elements_in_rect(self, x: float, y: float, width: float, height: float) -> List[str]:
         """查找矩形区域内的元素"""
         try:
-            selected_elements = []
-
-            for element_id, element in self.elements.items():
-                if not self.is_valid_element(element):
-                    continue
-
-                # 获取元素边界
-                bounds = self.get_element_bounds_safely(element)
-                if bounds:
-                    # 检查是否与选择区域相交
-                    if self.rect_intersects(bounds, (x, y, width, height)):
-                        selected_elements.append(element_id)
-
-            return selected_elements
+            return self.stage_canvas.find_elements_in_rect(x, y, width, height)
 
         except Exception as e:
             logger.error(f"查找矩形区域内元素失败: {e}")
@@ -1892,9 +2058,7 @@ class StageWidget(QWidget):
     def delete_element(self, element_id: str):
         """删除元素"""
         try:
-            if element_id in self.elements:
-                del self.elements[element_id]
-                self.update()
+            if self.stage_canvas.remove_element(element_id):
                 logger.info(f"删除元素: {element_id}")
 
         except Exception as e:
@@ -1967,12 +2131,13 @@ class StageWidget(QWidget):
     def move_element(self, element_id: str, delta_x: float, delta_y: float):
         """移动元素"""
         try:
-            if element_id in self.elements:
-                element = self.elements[element_id]
-                if hasattr(element, 'position'):
-                    element.position.x += delta_x / self.scale_factor
-                    element.position.y += delta_y / self.scale_factor
-                    logger.info(f"移动元素 {element_id}: ({delta_x:.1f}, {delta_y:.1f})")
+            canvas = self.stage_canvas
+            element = canvas.elements.get(element_id)
+            if element and hasattr(element, 'position'):
+                canvas.move_element(element_id,
+                                    element.position.x + delta_x / canvas.scale_factor,
+                                    element.position.y + delta_y / canvas.scale_factor)
+                logger.info(f"移动元素 {element_id}: ({delta_x:.1f}, {delta_y:.1f})")
 
         except Exception as e:
             logger.error(f"移动元素失败: {e}")
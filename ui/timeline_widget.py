@@ -5,6 +5,9 @@ AI Animation Studio - 时间轴组件
 
 import os
 from pathlib import Path
+from typing import List, Optional
+
+import numpy as np
 from PyQt6.QtWidgets import (
     QWidget, QVBoxLayout, QHBoxLayout, QGroupBox, QLabel, QPushButton,
     QSlider, QSpinBox, QDoubleSpinBox, QFileDialog, QMessageBox,
@@ -13,12 +16,14 @@ from PyQt6.QtWidgets import (
     QToolButton, QMenu, QLineEdit, QFormLayout, QButtonGroup,
     QRadioButton, QTreeWidget, QTreeWidgetItem, QHeaderView
 )
-from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QUrl, QThread, QPropertyAnimation, QEasingCurve
+from PyQt6.QtCore import Qt, QTimer, pyqtSignal, QUrl, QThread, QPropertyAnimation, QEasingCurve, QLine
 from PyQt6.QtGui import QPainter, QPen, QBrush, QColor, QFont, QPixmap, QLinearGradient, QPolygon, QAction
 from PyQt6.QtMultimedia import QMediaPlayer, QAudioOutput, QAudioFormat
 
 from core.data_structures import TimeSegment, AnimationType
 from core.logger import get_logger
+from core.waveform_peaks import WaveformPeaks
+from core.audio_decoder import AudioDecodeThread, DecodedAudio
 
 logger = get_logger("timeline_widget")
 
@@ -37,11 +42,16 @@ class WaveformWidget(QWidget):
 
         # 音频数据
         self.audio_data = []
+        self.waveform_peaks: Optional[WaveformPeaks] = None
         self.duration = 0.0
         self.current_time = 0.0
         self.time_segments = []
         self.keyframes = []  # 关键帧列表
 
+        # 波形绘制缓存：(宽, 高, 时长) -> 竖线列表，播放头移动时无需重新计算
+        self._waveform_lines_key = None
+        self._waveform_lines = []
+
         # 显示设置
         self.show_waveform = True
         self.show_spectrum = False
@@ -66,7 +76,16 @@ class WaveformWidget(QWidget):
     def set_audio_data(self, audio_data: list, duration: float):
         """设置音频数据"""
         self.audio_data = audio_data
+        sample_rate = max(1, int(round(len(audio_data) / duration))) if duration > 0 else 1
+        peaks = WaveformPeaks.from_samples(np.asarray(audio_data, dtype=np.float32), sample_rate) \
+            if len(audio_data) > 1 else None
+        self.set_waveform_peaks(peaks, duration)
+
+    def set_waveform_peaks(self, peaks: Optional[WaveformPeaks], duration: float):
+        """设置波形峰值金字塔"""
+        self.waveform_peaks = peaks
         self.duration = duration
+        self._waveform_lines_key = None
         self.update()
     
     def set_current_time(self, time: float):
@@ -100,27 +119,9 @@ class WaveformWidget(QWidget):
                 painter.fillRect(segment_rect, QColor("#e3f2fd"))
         
         # 绘制波形
-        if self.audio_data and len(self.audio_data) > 1:
+        if self.waveform_peaks is not None and self.duration > 0:
             painter.setPen(QPen(QColor("#2196F3"), 1))
-            
-            points_per_pixel = len(self.audio_data) / width
-            center_y = height // 2
-            
-            for x in range(width):
-                start_idx = int(x * points_per_pixel)
-                end_idx = int((x + 1) * points_per_pixel)
-                
-                if start_idx < len(self.audio_data) and end_idx <= len(self.audio_data):
-                    # 计算该像素范围内的最大和最小值
-                    segment_data = self.audio_data[start_idx:end_idx]
-                    if segment_data:
-                        max_val = max(segment_data)
-                        min_val = min(segment_data)
-                        
-                        # 绘制波形线
-                        y1 = center_y - int(max_val * center_y * 0.8)
-                        y2 = center_y - int(min_val * center_y * 0.8)
-                        painter.drawLine(x, y1, x, y2)
+            painter.drawLines(self.get_waveform_lines(width, height))
         
         # 绘制时间刻度
         painter.setPen(QPen(QColor("#666666"), 1))
@@ -139,6 +140,17 @@ class WaveformWidget(QWidget):
             painter.setPen(QPen(QColor("#f44336"), 2))
             painter.drawLine(current_x, 0, current_x, height)
     
+    def get_waveform_lines(self, width: int, height: int) -> List[QLine]:
+        """按当前尺寸从峰值金字塔取出每个像素列的波形竖线（带缓存）"""
+        key = (width, height, self.duration)
+        if key != self._waveform_lines_key:
+            center_y = height // 2
+            lines = self.waveform_peaks.pixel_lines(0.0, self.duration, width,
+                                                    center_y, center_y * 0.8)
+            self._waveform_lines = [QLine(int(x), int(y1), int(x), int(y2)) for x, y1, y2 in lines]
+            self._waveform_lines_key = key
+        return self._waveform_lines
+
     def mousePressEvent(self, event):
         """鼠标点击事件"""
         if event.button() == Qt.MouseButton.LeftButton and self.duration > 0:
@@ -169,6 +181,9 @@ class TimelineWidget(QWidget):
         # 音频分析器
         self.audio_analyzer = None
 
+        # 音频解码线程
+        self.audio_decoder = None
+
         # 播放状态
         self.is_playing = False
         self.is_looping = False
@@ -927,8 +942,8 @@ class TimelineWidget(QWidget):
                 self.audio_file_label.setText(f"🎵 {file_name} ({file_size / 1024:.1f}KB)")
                 status_msg = f"音频文件已加载: {file_name}"
 
-            # 生成模拟波形数据
-            self.generate_mock_waveform()
+            # 在后台线程中解码真实波形
+            self.start_audio_decode(file_path)
 
             # 记录成功信息
             logger.info(f"音频文件已加载: {file_path}")
@@ -951,27 +966,72 @@ class TimelineWidget(QWidget):
             if hasattr(self.parent(), 'statusBar'):
                 self.parent().statusBar().showMessage(f"音频加载失败: {Path(file_path).name}", 5000)
 
-    def generate_mock_waveform(self):
-        """生成模拟波形数据"""
-        import random
-        import math
+    def start_audio_decode(self, file_path: str):
+        """在后台线程中分块解码音频，生成波形峰值和精确时长"""
+        if self.audio_decoder and self.audio_decoder.isRunning():
+            self.audio_decoder.stop()
+            self.audio_decoder.wait()
 
-        # 生成30秒的模拟波形数据
-        sample_rate = 1000  # 降低采样率以提高性能
-        duration = 30.0
-        samples = int(sample_rate * duration)
+        self.audio_decoder = AudioDecodeThread(file_path)
+        self.audio_decoder.progress_changed.connect(self.on_audio_decode_progress)
+        self.audio_decoder.decode_finished.connect(self.on_audio_decoded)
+        self.audio_decoder.decode_failed.connect(self.on_audio_decode_failed)
 
-        waveform_data = []
-        for i in range(samples):
-            # 生成模拟的音频波形
-            t = i / sample_rate
-            amplitude = 0.5 * math.sin(2 * math.pi * 2 * t) + 0.3 * random.uniform(-0.5, 0.5)
-            waveform_data.append(amplitude)
+        if hasattr(self, 'audio_control_panel'):
+            self.audio_control_panel.on_decode_started()
+        elif hasattr(self, 'analysis_progress'):
+            self.analysis_progress.setValue(0)
+            self.analysis_progress.setVisible(True)
 
-        self.waveform_widget.set_audio_data(waveform_data, duration)
-        self.duration = duration
+        self.audio_decoder.start()
+
+    def on_audio_decode_progress(self, progress: int):
+        """音频解码进度"""
+        if hasattr(self, 'audio_control_panel'):
+            self.audio_control_panel.on_decode_progress(progress)
+        elif hasattr(self, 'analysis_progress'):
+            self.analysis_progress.setValue(progress)
+
+    def on_audio_decoded(self, decoded: DecodedAudio):
+        """音频解码完成"""
+        if self.sender() is not self.audio_decoder:
+            return  # 已被新的加载请求取代
+
+        if hasattr(self, 'audio_control_panel'):
+            self.audio_control_panel.on_decode_finished()
+        elif hasattr(self, 'analysis_progress'):
+            self.analysis_progress.setVisible(False)
+
+        self.duration = decoded.duration
+        self.waveform_widget.set_waveform_peaks(decoded.peaks, decoded.duration)
         self.update_time_display()
-    
+
+        if hasattr(self, 'audio_control_panel'):
+            self.audio_control_panel.set_audio_info(decoded.duration, decoded.sample_rate, decoded.channels)
+        else:
+            duration_min = int(decoded.duration // 60)
+            duration_sec = decoded.duration % 60
+            if hasattr(self, 'audio_duration_label'):
+                self.audio_duration_label.setText(f"{duration_min:02d}:{duration_sec:06.3f}")
+            if hasattr(self, 'audio_sample_rate_label'):
+                self.audio_sample_rate_label.setText(f"{decoded.sample_rate} Hz")
+
+        logger.info(f"波形已加载: {decoded.file_path} ({decoded.duration:.3f}s)")
+
+    def on_audio_decode_failed(self, error: str):
+        """音频解码失败"""
+        if self.sender() is not self.audio_decoder:
+            return
+
+        if hasattr(self, 'audio_control_panel'):
+            self.audio_control_panel.on_decode_finished()
+        elif hasattr(self, 'analysis_progress'):
+            self.analysis_progress.setVisible(False)
+
+        logger.error(f"音频波形解码失败: {error}")
+        if hasattr(self.parent(), 'statusBar'):
+            self.parent().statusBar().showMessage(f"无法解码音频波形: {error}", 5000)
+
     def play_audio(self):
         """播放音频"""
         if self.media_player.source().isEmpty():
@@ -1425,12 +1485,9 @@ class TimelineWidget(QWidget):
     def get_segments_at_time(self, time: float) -> list:
         """获取指定时间的所有段"""
         try:
-            segments = []
             if hasattr(self, 'segment_manager'):
-                for segment in self.segment_manager.visual_timeline.segments:
-                    if segment.contains_time(time):
-                        segments.append(segment)
-            return segments
+                return self.segment_manager.visual_timeline.segments_at_time(time)
+            return []
 
         except Exception as e:
             logger.error(f"获取时间段失败: {e}")